@@ -6,11 +6,21 @@ from typing import List # noqa
 from .abstract import CorpusReader
 from .gremlin import GremlinCorpus
 from .static import StaticCorpus
-from .get_corpus import get_corpus
+from .indexed import IndexedStaticCorpus
+from .cached import CachedCorpus
+from .get_corpus import get_corpus, load_static_corpus
+from .process_cache import get_cached_corpus, \
+    cached_corpus_version, PROCESS_CORPUS_CACHE
 
 __all__: List[str] = [
     'CorpusReader',
     'GremlinCorpus',
     'StaticCorpus',
+    'IndexedStaticCorpus',
+    'CachedCorpus',
     'get_corpus',
+    'load_static_corpus',
+    'get_cached_corpus',
+    'cached_corpus_version',
+    'PROCESS_CORPUS_CACHE',
 ]  # noqa: WPS410 (the only __variable__ we use)
@@ -7,6 +7,9 @@ class ComponentReader(ABC):
     Abstract interface representing a single component in a corpus.
     """
 
+    # No instance dict, so that slotted implementations stay small.
+    __slots__ = ()
+
     @property
     @abstractmethod
     def name(self) -> str:
@@ -92,7 +95,7 @@ class ComponentReader(ABC):
         """
         Does this component have the given param?
         """
-        for p in self.params():
+        for p in self.params:
             if p['PROP_NAME'] == param_name:
                 return True
         return False
@@ -126,3 +129,9 @@ class CorpusReader(ABC):
         Iterates over a list of all components.
         """
         ...
+
+    def close(self):
+        """
+        Releases any connections the corpus holds, by default does nothing.
+        """
+        pass
@@ -0,0 +1,76 @@
+from attrs import define, frozen, field
+from typing import List, Dict, Any, Iterator, Tuple, Union, Optional, Iterable
+
+from .abstract import *
+from .static import StaticComponent
+
+from simple_uam.util.logging import get_logger
+
+log = get_logger(__name__)
+
+@frozen
+class CachedCorpus(CorpusReader):
+    """
+    Wraps another corpus so that each component is fetched once, with all of
+    its fields, and then served from memory.
+
+    Meant to be short lived, e.g. for the generation of a single set of info
+    files, since it never notices changes in the underlying corpus.
+    """
+
+    corpus : CorpusReader = field()
+    """ The corpus we're caching reads from. """
+
+    _cache : Dict[str,StaticComponent] = field(
+        factory=dict,
+        init=False,
+        eq=False,
+    )
+    """ Components that have already been fetched, keyed by name. """
+
+    def fetch(self, comp : str) -> StaticComponent:
+        """
+        Reads every field of a component from the underlying corpus.
+        """
+        component = self.corpus[comp]
+        if isinstance(component, StaticComponent):
+            return component
+        return StaticComponent.from_component(component)
+
+    def prefetch(self, comps : Iterable[str]):
+        """
+        Ensures that each of the given components is in the cache.
+
+        Arguments:
+          comps: The names of the components to fetch.
+        """
+        missing = [comp for comp in set(comps) if comp not in self._cache]
+
+        if len(missing) > 0 and hasattr(self.corpus, 'fetch_components'):
+            log.debug(
+                "Fetching components into corpus cache in bulk.",
+                components=missing,
+            )
+            for name, rep in self.corpus.fetch_components(missing).items():
+                self._cache[name] = StaticComponent.from_rep(rep)
+
+        for comp in missing:
+            self[comp]
+
+    def __getitem__(self, comp : str) -> StaticComponent:
+        component = self._cache.get(comp)
+        if component is None:
+            log.debug(
+                "Fetching component into corpus cache.",
+                component=comp,
+            )
+            component = self.fetch(comp)
+            self._cache[comp] = component
+        return component
+
+    def __contains__(self, comp : str) -> bool:
+        return comp in self._cache or comp in self.corpus
+
+    @property
+    def components(self) -> Iterator[str]:
+        return self.corpus.components
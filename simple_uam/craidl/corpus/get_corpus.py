@@ -7,14 +7,38 @@ from simple_uam.util.system import backup_file
 
 from .gremlin import GremlinCorpus
 from .static import StaticCorpus
+from .indexed import IndexedStaticCorpus, is_indexed_corpus
 
 from pathlib import Path
+from typing import Union
 import json
 
 import subprocess
 
 log = get_logger(__name__)
 
+def load_static_corpus(static : Union[str,Path]):
+    """
+    Loads a static corpus from file, using the indexed reader if the file is
+    in the indexed format and the plain json reader otherwise.
+
+    Arguments:
+      static: The static corpus file.
+    """
+
+    static = Path(static)
+
+    if is_indexed_corpus(static):
+        return IndexedStaticCorpus.load(static)
+
+    log.info(
+        "Loading static corpus.",
+        corpus_file=str(static),
+    )
+
+    with static.open() as fp:
+        return StaticCorpus.load_json(fp)
+
 def get_corpus(config : CraidlConfig,
                static = None,
                host = None,
@@ -58,15 +82,7 @@ def get_corpus(config : CraidlConfig,
 
         if isinstance(static, bool) and static:
             static = config.static_corpus
-        static = Path(static)
-
-        log.info(
-            "Loading static corpus.",
-            corpus_file=str(static),
-        )
-
-        with static.open() as fp:
-            return StaticCorpus.load_json(fp)
+        return load_static_corpus(static)
 
     else:
 
@@ -1,5 +1,5 @@
 from attrs import define, frozen, field
-from typing import List, Dict, Any, Iterator, Tuple
+from typing import List, Dict, Any, Iterator, Tuple, Optional
 from urllib.parse import urlparse
 
 # All the recommended imports, see
@@ -185,17 +185,161 @@ class GremlinCorpus(CorpusReader):
                 elapsed = elapsed,
                 conn_timeout = self.conn_timeout,
             )
+            self.close()
             self.conn = self.init_conn()
             self.start_time = time.monotonic()
 
         return self.conn.with_('evaluationTimeout', self.eval_timeout)
 
 
+    def close(self):
+        """
+        Closes the connection to the gremlin server.
+        """
+        remote = getattr(self.conn, 'remote_connection', None)
+        if remote:
+            remote.close()
+
     def __getitem__(self, comp : str) -> GremlinComponent:
         return GremlinComponent(self, comp)
 
     def __contains__(self, comp : str) -> bool:
-        return self.g.V().has('[avm]Component','[]Name',comp)
+        return self.g.V().has('[avm]Component','[]Name',comp).hasNext()
+
+    @staticmethod
+    def _prop_list_traversal(traversal):
+        """
+        Finishes a traversal that ends at a property's value with a folded
+        list of 'PROP_NAME', 'PROP_VALUE' dictionaries.
+        """
+        return traversal.as_('PROP_VALUE') \
+            .select('PROP_NAME','PROP_VALUE') \
+            .fold()
+
+    def component_traversal(self, comps : List[str]):
+        """
+        A single traversal that projects out every field of the given
+        components. Each result is a dictionary, see `fetch_components` for
+        how they're turned into static component reps.
+
+        Arguments:
+          comps: The names of the components to fetch.
+        """
+
+        return self.g.V().has('[avm]Component','[]Name',P.within(*comps)) \
+            .project(
+                'name',
+                'conns',
+                'cad_part',
+                'cad_props',
+                'cad_params',
+                'props',
+                'params',
+            ) \
+            .by(__.values('[]Name')) \
+            .by(__.in_('inside').hasLabel('[]Connector') \
+                .project('name','cad') \
+                    .by(__.values('[]Name')) \
+                    .by(__.in_('inside').hasLabel('[]Role') \
+                        .out('port_map').values('[]Name').dedup().fold()) \
+                .fold()) \
+            .by(__.in_('inside').has('VertexLabel','[]DomainModel') \
+                .has('[]Format','Creo').values('[]Name').fold()) \
+            .by(self._prop_list_traversal(
+                __.in_('inside').hasLabel('[]DomainModel') \
+                .has('[]Format','Creo') \
+                .in_('inside').hasLabel('[]Parameter') \
+                .as_('PROP').values('[]Name').as_('PROP_NAME') \
+                .select('PROP').in_('inside').in_('inside') \
+                .out('value_source') \
+                .in_('inside').in_('inside').in_('inside').values('value'))) \
+            .by(self._prop_list_traversal(
+                __.in_('inside').hasLabel('[]DomainModel') \
+                .has('[]Format','Creo') \
+                .in_('inside').hasLabel('[]Parameter').as_('LIB_PROP') \
+                .values('[]Name').as_('PROP_NAME') \
+                .select('LIB_PROP').in_('inside').in_('inside') \
+                .out('value_source') \
+                .in_('inside').in_('inside') \
+                .hasLabel('[]AssignedValue') \
+                .in_('inside').in_('inside').values('value'))) \
+            .by(self._prop_list_traversal(
+                __.in_('inside').hasLabel('[]Property').as_('C_PROP') \
+                .values('[]Name').as_('PROP_NAME').select('C_PROP') \
+                .in_('inside').hasLabel('[]Value').in_('inside') \
+                .in_('inside').in_('inside').values('value'))) \
+            .by(self._prop_list_traversal(
+                __.in_('inside').hasLabel('[]Property').as_('C_PROP') \
+                .values('[]Name').as_('PROP_NAME') \
+                .select('C_PROP').in_('inside').hasLabel('[]Value') \
+                .in_('inside').in_('inside') \
+                .hasLabel('[]AssignedValue').in_('inside') \
+                .in_('inside').values('value')))
+
+    @staticmethod
+    def projection_to_rep(proj : Dict[str,Any]) -> dict:
+        """
+        Converts a single result of `component_traversal` into the same rep
+        that `StaticComponent.component_rep` produces.
+        """
+
+        rep = dict()
+        rep['name'] = proj['name']
+
+        conns = dict()
+        for conn in proj['conns']:
+            conns[conn['name']] = dict()
+            if len(conn['cad']) > 0:
+                conns[conn['name']]['cad'] = conn['cad'][0]
+        rep['conns'] = conns
+
+        if len(proj['cad_part']) > 0:
+            rep['cad_part'] = proj['cad_part'][0]
+
+        for key in ['cad_props', 'cad_params', 'props', 'params']:
+            prop_dict = dict()
+            for item in proj[key]:
+                prop_dict[item['PROP_NAME']] = item['PROP_VALUE']
+            if len(prop_dict) > 0:
+                rep[key] = prop_dict
+
+        return rep
+
+    def fetch_components(self,
+                         comps : List[str],
+                         batch_size : int = 50) -> Dict[str,dict]:
+        """
+        Fetches the full static rep for many components, using one query
+        for each batch of components instead of one query per field.
+
+        Arguments:
+          comps: The names of the components to fetch.
+          batch_size: The max number of components to fetch in a single
+            query.
+
+        Returns:
+          A dictionary from component name to static component rep.
+          Components that aren't in the corpus are omitted.
+        """
+
+        comps = list(comps)
+        reps = dict()
+
+        for start in range(0, len(comps), batch_size):
+            batch = comps[start:start + batch_size]
+
+            log.info(
+                "Fetching batch of components.",
+                batch_start=start,
+                batch_size=len(batch),
+                total=len(comps),
+            )
+
+            for proj in self.component_traversal(batch).toList():
+                rep = self.projection_to_rep(proj)
+                reps[rep['name']] = rep
+
+        return reps
 
     @property
     def components(self) -> Iterator[ComponentReader]:
@@ -0,0 +1,178 @@
+from attrs import define, frozen, field
+from typing import List, Dict, Any, Iterator, Tuple, Union, Optional
+
+from .abstract import *
+from .static import StaticComponent
+
+from simple_uam.util.logging import get_logger
+from simple_uam.util.system import replace_file
+import json
+import mmap
+from pathlib import Path
+
+log = get_logger(__name__)
+
+INDEXED_CORPUS_FORMAT = "simple-uam-indexed-corpus"
+""" Value of the 'format' field in the header of an indexed corpus file. """
+
+INDEXED_CORPUS_VERSION = 1
+""" Current version of the indexed corpus file format. """
+
+def is_indexed_corpus(corpus_file : Union[str,Path]) -> bool:
+    """
+    Checks whether a file is an indexed static corpus, without reading more
+    than its first line.
+
+    Arguments:
+      corpus_file: The file to check.
+    """
+
+    with Path(corpus_file).open('rb') as fp:
+        header = fp.readline()
+
+    return INDEXED_CORPUS_FORMAT.encode('utf-8') in header
+
+@frozen
+class IndexedStaticCorpus(CorpusReader):
+    """
+    A static corpus that is backed by an indexed corpus file.
+
+    The file is a single JSON header line, with a map from component name to
+    (offset, length), followed by one compact JSON record per component.
+    Only the header is parsed on load, the body is memory mapped and each
+    component is decoded the first time it's requested.
+    """
+
+    index : Dict[str,Tuple[int,int]] = field()
+    """ Map from component name to the offset and length of its record. """
+
+    data : Any = field(
+        eq=False,
+    )
+    """ The (usually memory mapped) bytes the index refers to. """
+
+    _component_cache : Dict[str,StaticComponent] = field(
+        factory=dict,
+        init=False,
+        eq=False,
+    )
+    """ Components that have already been decoded, keyed by name. """
+
+    def __getitem__(self, comp : str) -> StaticComponent:
+        component = self._component_cache.get(comp)
+        if component is None:
+            offset, length = self.index[comp]
+            rep = json.loads(self.data[offset:offset + length])
+            component = StaticComponent.from_rep(rep)
+            self._component_cache[comp] = component
+        return component
+
+    def __contains__(self, comp : str) -> bool:
+        return comp in self.index
+
+    @property
+    def components(self) -> Iterator[str]:
+        return self.index.keys()
+
+    def to_rep(self) -> dict:
+        """ Decode every component and return the full rep. """
+        return {comp : self[comp].to_rep() for comp in self.index}
+
+    @classmethod
+    def load(cls, corpus_file : Union[str,Path]) -> 'IndexedStaticCorpus':
+        """
+        Load an indexed corpus from a file, only reads the header eagerly.
+
+        Arguments:
+          corpus_file: The indexed corpus file.
+        """
+
+        corpus_file = Path(corpus_file)
+
+        with corpus_file.open('rb') as fp:
+            header = json.loads(fp.readline())
+
+            if header.get('format') != INDEXED_CORPUS_FORMAT:
+                raise RuntimeError(
+                    f"File {str(corpus_file)} is not an indexed corpus."
+                )
+
+            if header.get('version') != INDEXED_CORPUS_VERSION:
+                raise RuntimeError(
+                    f"Unsupported indexed corpus version {header.get('version')}."
+                )
+
+            body_start = fp.tell()
+            fp.seek(0, 2)
+            body_size = fp.tell() - body_start
+
+            # mmap keeps the body in the (shared) page cache rather than in
+            # the heap of every worker process.
+            if body_size > 0:
+                data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                data = b''
+
+        index = {
+            comp : (body_start + offset, length)
+            for comp, (offset, length) in header['index'].items()
+        }
+
+        log.info(
+            "Loaded indexed static corpus.",
+            corpus_file=str(corpus_file),
+            num_components=len(index),
+        )
+
+        return cls(index=index, data=data)
+
+    @staticmethod
+    def dump_rep(rep : dict, fp):
+        """
+        Write a static corpus rep to a binary file pointer in the indexed
+        format.
+
+        Arguments:
+          rep: The static corpus rep, a map from component name to
+            component rep.
+          fp: The file pointer to write to, must be opened in binary mode.
+        """
+
+        index = dict()
+        records = list()
+        offset = 0
+        for comp in sorted(rep.keys()):
+            record = json.dumps(
+                rep[comp],
+                separators=(',',':'),
+            ).encode('utf-8') + b'\n'
+            index[comp] = [offset, len(record) - 1]
+            records.append(record)
+            offset += len(record)
+
+        header = dict(
+            format=INDEXED_CORPUS_FORMAT,
+            version=INDEXED_CORPUS_VERSION,
+            index=index,
+        )
+
+        fp.write(json.dumps(header, separators=(',',':')).encode('utf-8'))
+        fp.write(b'\n')
+        for record in records:
+            fp.write(record)
+
+    @classmethod
+    def write(cls, rep : dict, corpus_file : Union[str,Path]):
+        """
+        Write a static corpus rep to a file in the indexed format.
+
+        The file is replaced rather than overwritten in place, since workers
+        may still have the old one mmap'd.
+
+        Arguments:
+          rep: The static corpus rep.
+          corpus_file: The output file.
+        """
+
+        with replace_file(corpus_file, 'wb') as fp:
+            cls.dump_rep(rep, fp)
@@ -0,0 +1,298 @@
+from attrs import define, frozen, field
+from typing import List, Dict, Any, Iterator, Tuple, Union, Optional
+
+from simple_uam.util.config import CraidlConfig
+from simple_uam.util.logging import get_logger
+
+from .abstract import CorpusReader
+from .get_corpus import get_corpus
+
+from pathlib import Path
+import hashlib
+import threading
+import time
+
+log = get_logger(__name__)
+
+def file_hash(path : Union[str,Path]) -> str:
+    """
+    The sha256 hash of a file's contents.
+    """
+
+    digest = hashlib.sha256()
+    with Path(path).open('rb') as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+@define
+class CachedCorpusEntry():
+    """
+    A loaded corpus along with the information needed to tell whether it's
+    stale.
+    """
+
+    corpus : CorpusReader = field()
+    """ The loaded corpus. """
+
+    static_file : Optional[Path] = field(default=None)
+    """ The static corpus file this was loaded from, if any. """
+
+    stat_sig : Optional[Tuple[int,int]] = field(default=None)
+    """ The (mtime_ns, size) of the static file when it was loaded. """
+
+    digest : Optional[str] = field(default=None)
+    """ The sha256 of the static file when it was loaded. """
+
+@define
+class ProcessCorpusCache():
+    """
+    Keeps corpora loaded for the lifetime of a process, so that each worker
+    process parses a static corpus (or opens a server connection) once
+    instead of on every message.
+
+    Static corpora are reloaded when the file's mtime or size changes and
+    its contents hash differently.
+    """
+
+    _entries : Dict[tuple,CachedCorpusEntry] = field(
+        factory=dict,
+        init=False,
+    )
+    """ Loaded corpora, keyed by the source they were loaded from. """
+
+    _lock : threading.Lock = field(
+        factory=threading.Lock,
+        init=False,
+    )
+    """ Guards the entries and counters. """
+
+    hits : int = field(default=0, init=False)
+    """ Number of requests served by an already loaded corpus. """
+
+    misses : int = field(default=0, init=False)
+    """ Number of requests that required loading a corpus. """
+
+    reloads : int = field(default=0, init=False)
+    """ Number of misses caused by a changed static corpus file. """
+
+    load_time : float = field(default=0.0, init=False)
+    """ Total time, in seconds, spent loading corpora. """
+
+    last_load_time : Optional[float] = field(default=None, init=False)
+    """ Time, in seconds, the most recent load took. """
+
+    @staticmethod
+    def _source(config : CraidlConfig,
+                static = None,
+                host = None,
+                port = None) -> tuple:
+        """
+        Normalizes get_corpus style arguments into a hashable key that
+        identifies where the corpus comes from.
+        """
+
+        if not static and not host:
+            if config.use_static_corpus:
+                static = True
+            else:
+                host = True
+
+        if static:
+            if isinstance(static, bool):
+                static = config.static_corpus
+            return ('static', str(Path(static).resolve()))
+
+        if isinstance(host, bool):
+            host = config.server_host
+        if not port:
+            port = config.server_port
+        return ('server', str(host), int(port))
+
+    @staticmethod
+    def _stat_sig(static_file : Path) -> Tuple[int,int]:
+        stat = static_file.stat()
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _is_stale(self, entry : CachedCorpusEntry) -> bool:
+        """
+        Checks whether a static corpus has changed on disk since it was
+        loaded. Only hashes the file when its stat info has changed.
+        """
+
+        if not entry.static_file:
+            return False
+
+        stat_sig = self._stat_sig(entry.static_file)
+        if stat_sig == entry.stat_sig:
+            return False
+
+        digest = file_hash(entry.static_file)
+        if digest == entry.digest:
+            entry.stat_sig = stat_sig
+            return False
+
+        return True
+
+    def _load(self,
+              source : tuple,
+              config : CraidlConfig,
+              **kwargs) -> CachedCorpusEntry:
+
+        start = time.monotonic()
+
+        if source[0] == 'static':
+            static_file = Path(source[1])
+            stat_sig = self._stat_sig(static_file)
+            digest = file_hash(static_file)
+            entry = CachedCorpusEntry(
+                corpus=get_corpus(config=config, static=static_file),
+                static_file=static_file,
+                stat_sig=stat_sig,
+                digest=digest,
+            )
+        else:
+            entry = CachedCorpusEntry(
+                corpus=get_corpus(config=config, **kwargs),
+            )
+
+        elapsed = time.monotonic() - start
+        self.load_time += elapsed
+        self.last_load_time = elapsed
+
+        log.info(
+            "Loaded corpus into process cache.",
+            source=source,
+            load_time=elapsed,
+        )
+
+        return entry
+
+    def get(self,
+            config : CraidlConfig,
+            static = None,
+            host = None,
+            port = None) -> CorpusReader:
+        """
+        Same arguments as `get_corpus` but returns an already loaded corpus
+        when possible.
+        """
+
+        source = self._source(config, static=static, host=host, port=port)
+
+        with self._lock:
+            entry = self._entries.get(source)
+
+            if entry and not self._is_stale(entry):
+                self.hits += 1
+                return entry.corpus
+
+            if entry:
+                log.info(
+                    "Static corpus changed on disk, reloading.",
+                    source=source,
+                )
+                self.reloads += 1
+
+            self.misses += 1
+            entry = self._load(
+                source,
+                config,
+                static=static,
+                host=host,
+                port=port,
+            )
+            self._entries[source] = entry
+            return entry.corpus
+
+    def version(self,
+                config : CraidlConfig,
+                static = None,
+                host = None,
+                port = None) -> Optional[str]:
+        """
+        A string identifying the contents of the corpus `get` would return
+        for the same arguments, without loading it.
+
+        Static corpora are identified by the sha256 of their file, reusing
+        the hash of an already loaded, unchanged file. Server corpora can't
+        be hashed, so they're identified by the configured
+        `server_corpus_version`, if any.
+
+        Returns:
+          The version, or None if the corpus can't be identified.
+        """
+
+        source = self._source(config, static=static, host=host, port=port)
+
+        if source[0] != 'static':
+            if not config.server_corpus_version:
+                return None
+            return f"server:{config.server_corpus_version}"
+
+        with self._lock:
+            entry = self._entries.get(source)
+            if entry and not self._is_stale(entry):
+                return f"static:{entry.digest}"
+
+        return f"static:{file_hash(source[1])}"
+
+    def clear(self):
+        """
+        Drops all loaded corpora, the next request for each will reload it.
+        """
+        with self._lock:
+            self._entries = dict()
+
+    @property
+    def stats(self) -> Dict[str,Any]:
+        """
+        Counters for this cache, suitable for logging or metadata.
+        """
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            reloads=self.reloads,
+            load_time=self.load_time,
+            last_load_time=self.last_load_time,
+            loaded=len(self._entries),
+        )
+
+PROCESS_CORPUS_CACHE = ProcessCorpusCache()
+""" The corpus cache for the current process. """
+
+def get_cached_corpus(config : CraidlConfig,
+                      static = None,
+                      host = None,
+                      port = None) -> CorpusReader:
+    """
+    Same as `get_corpus` except that the corpus is loaded once per process
+    and reused by later calls with the same arguments.
+
+    See `ProcessCorpusCache` for details.
+    """
+
+    return PROCESS_CORPUS_CACHE.get(
+        config=config,
+        static=static,
+        host=host,
+        port=port,
+    )
+
+def cached_corpus_version(config : CraidlConfig,
+                          static = None,
+                          host = None,
+                          port = None) -> Optional[str]:
+    """
+    Identifies the corpus `get_cached_corpus` would return for the same
+    arguments, or None if it can't be identified.
+
+    See `ProcessCorpusCache.version` for details.
+    """
+
+    return PROCESS_CORPUS_CACHE.version(
+        config=config,
+        static=static,
+        host=host,
+        port=port,
+    )
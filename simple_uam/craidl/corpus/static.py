@@ -1,7 +1,10 @@
 from attrs import define, frozen, field
-from typing import List, Dict, Any, Iterator, Tuple, Union, Optional
+from typing import List, Dict, Any, Iterator, Tuple, Union, Optional, Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import shutil
+import threading
+import time
 from .abstract import *
 
 from simple_uam.util.logging import get_logger
@@ -14,19 +17,67 @@ log = get_logger(__name__)
 class StaticComponent(ComponentReader):
     """
     A static component defined an an immutable object.
+
+    The various property lists are computed once at init, so repeated access
+    doesn't rebuild them.
     """
 
     rep : dict = field(
     )
     """ Internal object representation of a component. """
 
+    _connections : List[str] = field(
+        init=False,
+    )
+    """ Precomputed list of connection names. """
+
+    @_connections.default
+    def _connections_def(self):
+        return list(self.rep.get('conns',dict()).keys())
+
+    _cad_properties : List[Dict[str,Any]] = field(
+        init=False,
+    )
+    """ Precomputed cad property list. """
+
+    @_cad_properties.default
+    def _cad_properties_def(self):
+        return self.to_prop_list(self.rep.get('cad_props',dict()))
+
+    _cad_params : List[Dict[str,Any]] = field(
+        init=False,
+    )
+    """ Precomputed cad parameter list. """
+
+    @_cad_params.default
+    def _cad_params_def(self):
+        return self.to_prop_list(self.rep.get('cad_params',dict()))
+
+    _properties : List[Dict[str,Any]] = field(
+        init=False,
+    )
+    """ Precomputed property list. """
+
+    @_properties.default
+    def _properties_def(self):
+        return self.to_prop_list(self.rep.get('props',dict()))
+
+    _params : List[Dict[str,Any]] = field(
+        init=False,
+    )
+    """ Precomputed parameter list. """
+
+    @_params.default
+    def _params_def(self):
+        return self.to_prop_list(self.rep.get('params',dict()))
+
     @property
     def name(self) -> str:
         return self.rep['name']
 
     @property
     def connections(self) -> List[str]:
-        return list(self.rep.get('conns',dict()).keys())
+        return self._connections
 
     @property
     def cad_part(self) -> Optional[str]:
@@ -34,30 +85,22 @@ class StaticComponent(ComponentReader):
 
     @property
     def cad_properties(self) -> List[Dict[str,Any]]:
-        return self.to_prop_list(
-            self.rep.get('cad_props',dict())
-        )
+        return self._cad_properties
 
     @property
     def cad_params(self) -> List[Dict[str,Any]]:
-        return self.to_prop_list(
-            self.rep.get('cad_params',dict())
-        )
+        return self._cad_params
 
     def cad_connection(self, conn : str) -> Optional[str]:
         return self.rep.get('conns',dict()).get(conn,dict()).get('cad')
 
     @property
     def properties(self) -> List[Dict[str,Any]]:
-        return self.to_prop_list(
-            self.rep.get('props',dict())
-        )
+        return self._properties
 
     @property
     def params(self) -> List[Dict[str,Any]]:
-        return self.to_prop_list(
-            self.rep.get('params',dict())
-        )
+        return self._params
 
     @staticmethod
     def from_prop_list(prop_list : List[Dict[str,str]]) -> Dict[str,str]:
@@ -191,11 +234,22 @@ class StaticCorpus(CorpusReader):
     rep : dict = field(
     )
 
+    _component_cache : Dict[str,StaticComponent] = field(
+        factory=dict,
+        init=False,
+        eq=False,
+    )
+    """ Components that have already been wrapped, keyed by name. """
+
     def __getitem__(self, comp : str) -> ComponentReader:
-        return StaticComponent.from_rep(self.rep[comp])
+        component = self._component_cache.get(comp)
+        if component is None:
+            component = StaticComponent.from_rep(self.rep[comp])
+            self._component_cache[comp] = component
+        return component
 
     def __contains__(self, comp : str) -> bool:
-        return comp in self.rep[comp]
+        return comp in self.rep
 
     @property
     def components(self) -> Iterator[ComponentReader]:
@@ -228,22 +282,69 @@ class StaticCorpus(CorpusReader):
         """ Same arguments as json.dumps less the first. """
         return json.dumps(self.rep, indent=indent, **kwargs)
 
+    @staticmethod
+    def component_reps(corp : CorpusReader,
+                       comps : List[str],
+                       offset : int = 0,
+                       total : Optional[int] = None) -> Dict[str,dict]:
+        """
+        Gets the reps for a list of components, in bulk if the corpus
+        supports it (via a `fetch_components` method) and one at a time
+        otherwise.
+
+        Arguments:
+           corp: The corpus we are reading from.
+           comps: The names of the components to read.
+           offset: The index of the first component, for logging.
+           total: The total number of components being read, for logging.
+        """
+
+        total = total or len(comps)
+
+        if hasattr(corp, 'fetch_components'):
+            log.info(
+                f"Getting component data in bulk "\
+                f"({offset+1}-{offset+len(comps)}/{total})",
+            )
+            return corp.fetch_components(comps)
+
+        reps = dict()
+        for comp_num, comp in enumerate(comps):
+            log.info(f"Getting component data ({offset+comp_num+1}/{total})",
+                     component=comp)
+            reps[comp] = StaticComponent.component_rep(corp[comp])
+        return reps
+
     @staticmethod
     def corpus_rep(corp : CorpusReader,
                    cache_dir : Union[Path, str, None] = None,
-                   cluster_size : int = 100) -> dict:
+                   cluster_size : int = 100,
+                   workers : int = 1,
+                   corpus_factory : Optional[Callable[[],CorpusReader]] = None,
+    ) -> dict:
         """
         Generates a representation of a corpus.
 
+        When a cache_dir is given each cluster is written to its own file as
+        soon as it's read, and clusters that already have a file are skipped,
+        so an interrupted run can be resumed.
+
         Argument:
            corp: The corpus we are reading from.
            cache_dir: The directory we are reading cached items from.
            cluster_size: The size of each cluster of files we write to size.
+           workers: The number of clusters to read concurrently.
+           corpus_factory: Creates a new connection to the corpus, each worker
+             thread calls this once to get its own connection, and they're
+             closed once all clusters are read. Only used when there's more
+             than one worker. If None all workers share `corp`.
         """
         if cache_dir:
             cache_dir = Path(cache_dir)
             cache_dir.mkdir(parents=True, exist_ok=True)
 
+        workers = max(1, workers)
+
         log.info("Getting component list.")
         cmp_list = sorted(list(corp.components))
         cmp_num = len(cmp_list)
@@ -251,16 +352,17 @@ class StaticCorpus(CorpusReader):
         # split into clusters
         clusters = list()
         cluster_filename = lambda x: f"corpus_cache_{x}.json"
-        if cache_dir:
+        if cache_dir or workers > 1:
             clusters = [cmp_list[x:x+cluster_size] for x in range(0, cmp_num, cluster_size)]
         else:
             clusters = [cmp_list]
         cluster_num = len(clusters)
 
-        rep = dict()
+        # find the clusters we still need to read
+        pending = list()
         for cluster_ind, cluster in enumerate(clusters):
-            # check if cluster file exists
-            cluster_file = cache_dir / cluster_filename(cluster_ind)
+            cluster_file = cache_dir / cluster_filename(cluster_ind) \
+                if cache_dir else None
             cluster_str =  f"({cluster_ind + 1}/{cluster_num})"
             if cache_dir and cluster_file.exists():
                 log.info(
@@ -268,31 +370,90 @@ class StaticCorpus(CorpusReader):
                     cache_dir=str(cache_dir),
                     cluster_file=str(cluster_file),
                 )
-                continue
-            elif cache_dir:
+            else:
+                pending.append(cluster_ind)
+
+        pending_num = sum(len(clusters[ind]) for ind in pending)
+
+        # Each worker thread gets its own connection to the corpus.
+        local = threading.local()
+        worker_corpora = list()
+        worker_corpora_lock = threading.Lock()
+
+        def worker_corpus() -> CorpusReader:
+            if not corpus_factory or workers == 1:
+                return corp
+            if not hasattr(local, 'corp'):
+                local.corp = corpus_factory()
+                with worker_corpora_lock:
+                    worker_corpora.append(local.corp)
+            return local.corp
+
+        def read_cluster(cluster_ind : int) -> Tuple[int, dict]:
+            cluster = clusters[cluster_ind]
+            cluster_str =  f"({cluster_ind + 1}/{cluster_num})"
+
+            if cache_dir:
                 log.info(
                     f"Reading cluster from source corpus. {cluster_str}",
                     cache_dir=str(cache_dir),
-                    cluster_file=str(cluster_file),
                 )
 
-            # get components in cluster
-            for comp_num, comp in enumerate(cluster):
-                ind = (cluster_ind * cluster_size) + comp_num
-                log.info(f"Getting component data ({ind+1}/{cmp_num})",
-                         component=comp)
-                rep[comp] = StaticComponent.component_rep(corp[comp])
+            cluster_rep = StaticCorpus.component_reps(
+                worker_corpus(),
+                cluster,
+                offset=cluster_ind * cluster_size,
+                total=cmp_num,
+            )
 
-            # write cluster file
+            # write cluster file, via a temp file so that an interrupted
+            # write can't be mistaken for a complete cluster.
             if cache_dir:
+                cluster_file = cache_dir / cluster_filename(cluster_ind)
+                temp_file = cluster_file.with_suffix('.tmp')
                 log.info(
                     f"Writing cluster to file. {cluster_str}",
                     cache_dir=str(cache_dir),
                     cluster_file=str(cluster_file),
                 )
-                with cluster_file.open('w') as cf:
-                    json.dump(rep,cf,indent="  ")
-                rep = dict()
+                with temp_file.open('w') as cf:
+                    json.dump(cluster_rep,cf,indent="  ")
+                temp_file.replace(cluster_file)
+                cluster_rep = dict()
+
+            return cluster_ind, cluster_rep
+
+        rep = dict()
+        read_num = 0
+        start_time = time.monotonic()
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(read_cluster, ind) for ind in pending]
+                for future in as_completed(futures):
+                    cluster_ind, cluster_rep = future.result()
+                    rep.update(cluster_rep)
+
+                    read_num += len(clusters[cluster_ind])
+                    elapsed = time.monotonic() - start_time
+                    log.info(
+                        f"Finished reading cluster ({read_num}/{pending_num} components).",
+                        cluster=cluster_ind,
+                        elapsed=elapsed,
+                        comps_per_sec=(read_num / elapsed) if elapsed > 0 else None,
+                    )
+        finally:
+            for worker_corp in worker_corpora:
+                worker_corp.close()
+
+        elapsed = time.monotonic() - start_time
+        log.info(
+            "Finished reading components from source corpus.",
+            components=read_num,
+            workers=workers,
+            elapsed=elapsed,
+            comps_per_sec=(read_num / elapsed) if elapsed > 0 else None,
+        )
 
         if cache_dir:
             rep = dict()
@@ -319,11 +480,16 @@ class StaticCorpus(CorpusReader):
     def from_corpus(cls,
                     corp : CorpusReader,
                     cache_dir : Union[Path, str, None] = None,
-                    cluster_size : int = 100) -> 'StaticCorpus':
+                    cluster_size : int = 100,
+                    workers : int = 1,
+                    corpus_factory : Optional[Callable[[],CorpusReader]] = None,
+    ) -> 'StaticCorpus':
         """ Extract the rep from a component. see corpus_rep for args. """
 
         return cls.from_rep(cls.corpus_rep(
             corp,
             cache_dir=cache_dir,
             cluster_size=cluster_size,
+            workers=workers,
+            corpus_factory=corpus_factory,
         ))
@@ -6,6 +6,8 @@ from typing import List # noqa
 from .abstract import AbstractDesign, AbstractDesignCorpus
 from .gremlin import GremlinDesign, GremlinDesignCorpus
 from .static import StaticDesign, StaticDesignCorpus
+from .validate import DesignError, CorpusIndex, DesignValidator, \
+    validate_designs
 
 __all__: List[str] = [
     'GremlinDesign',
@@ -14,4 +16,8 @@ __all__: List[str] = [
     'StaticDesignCorpus',
     'AbstractDesign',
     'AbstractDesignCorpus',
+    'DesignError',
+    'CorpusIndex',
+    'DesignValidator',
+    'validate_designs',
 ]  # noqa: WPS410 (the only __variable__ we use)
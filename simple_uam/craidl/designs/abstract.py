@@ -1,6 +1,8 @@
 from attrs import define, frozen, field, setters
 from typing import List, Dict, Set, Any, Iterator, Tuple, Optional
 from abc import ABC, abstractmethod
+import hashlib
+import json
 from simple_uam.craidl.corpus.abstract import CorpusReader
 
 @frozen
@@ -248,6 +250,20 @@ class DesignConnection():
             to_conn = self.to_side.conn_type,
         )
 
+    @property
+    def normalized(self) -> 'DesignConnection':
+        """
+        This connection with its sides in a fixed order, so that a connection
+        and its flipped version compare equal.
+        """
+
+        if self.to_side < self.from_side:
+            return DesignConnection(
+                from_side=self.to_side,
+                to_side=self.from_side,
+            )
+        return self
+
     def is_flipped(self, other : DesignConnector) -> bool:
         return (self.from_side == other.to_side) and (self.to_side == other.from_side)
 
@@ -376,19 +392,74 @@ class AbstractDesign(ABC):
             connections = [conn.rep  for conn  in self.connections],
         )
 
+    @property
+    def canonical_rep(self) -> object:
+        """
+        A JSON serializable form of the design that's the same for all
+        equivalent designs. Parameters, components, and connections are
+        sorted, connections are normalized, and the design's name and extra
+        info are left out.
+        """
+
+        parameters = [
+            dict(
+                param.rep,
+                component_properties=sorted(
+                    param.component_properties,
+                    key=lambda p: (p['component_name'], p['component_property']),
+                ),
+            )
+            for param in self.parameters
+        ]
+
+        connections = {conn.normalized for conn in self.connections}
+
+        return dict(
+            parameters  = sorted(parameters, key=lambda p: p['parameter_name']),
+            components  = [
+                comp.rep for comp in
+                sorted(self.components, key=lambda c: c.instance)
+            ],
+            connections = [
+                conn.rep for conn in
+                sorted(connections, key=lambda c: (c.from_side, c.to_side))
+            ],
+        )
+
+    @property
+    def canonical_hash(self) -> str:
+        """
+        A sha256 hex digest of `canonical_rep`, equivalent designs have the
+        same hash.
+        """
+
+        data = json.dumps(
+            self.canonical_rep,
+            sort_keys=True,
+            separators=(',',':'),
+        )
+        return hashlib.sha256(data.encode()).hexdigest()
+
     def validate(self, corpus : Optional[CorpusReader] = None):
         """
         Checks whether this design is valid w/ a possible corpus.
+
+        Raises:
+          RuntimeError: With every problem found, see `DesignValidator` to
+            get them as a list instead.
         """
 
-        for param in self.parameters:
-            param.validate(self, corpus)
+        from .validate import DesignValidator
 
-        for comp in self.components:
-            comp.validate(self, corpus)
+        validator = DesignValidator.for_designs(corpus, [self]) if corpus \
+            else DesignValidator()
+        errors = validator.validate(self)
 
-        for _, conn in self.connection_dict.items():
-            conn.validate(self, corpus)
+        if errors:
+            raise RuntimeError(
+                f"Design {self.name} is invalid:\n  " +
+                "\n  ".join(str(e) for e in errors)
+            )
 
 
 class AbstractDesignCorpus(ABC):
@@ -426,12 +497,29 @@ class AbstractDesignCorpus(ABC):
         """
         Produce a json serializable version of the corpus.
         """
-        return {design : self[design].rendered() for design in self.designs()}
+        return {design : self[design].rep for design in self.designs}
 
     def validate(self, corpus : Optional[CorpusReader] = None):
         """
-        Checks whether this design is valid w/ a possible corpus.
+        Checks whether every design is valid w/ a possible corpus.
+
+        Raises:
+          RuntimeError: With every problem found in every design, see
+            `DesignValidator.validate_corpus` to get them as a dict instead.
         """
 
-        for design in self.designs:
-            design.validate(corpus)
+        from .validate import DesignValidator
+
+        designs = {name : self[name] for name in self.designs}
+        validator = DesignValidator.for_designs(corpus, designs.values()) \
+            if corpus else DesignValidator()
+        results = validator.validate_all(designs)
+
+        if results:
+            raise RuntimeError(
+                "Design corpus is invalid:\n  " + "\n  ".join(
+                    f"{name}: {err}"
+                    for name, errors in results.items()
+                    for err in errors
+                )
+            )
@@ -101,7 +101,7 @@ class StaticDesign(AbstractDesign):
         """ Same arguments as json.dump less the first. """
         return json.dump(self._rep, fp, indent=indent, **kwargs)
 
-    def dump_json_str(indent="  ", **kwargs):
+    def dump_json_str(self, indent="  ", **kwargs):
         """ Same arguments as json.dumps less the first. """
         return json.dumps(self._rep, indent=indent, **kwargs)
 
@@ -115,14 +115,18 @@ class StaticDesignCorpus(AbstractDesignCorpus):
     )
 
     def __getitem__(self, design : str) -> StaticDesign:
-        return StaticDesign.from_rep(self.rep[design])
+        return StaticDesign.from_rep(self._rep[design])
 
     def __contains__(self, design : str) -> bool:
-        return comp in rep
+        return design in self._rep
 
     @property
     def designs(self) -> List[str]:
-        return self.rep.keys()
+        return list(self._rep.keys())
+
+    @property
+    def rep(self) -> object:
+        return self._rep
 
     @classmethod
     def from_rep(cls, rep) -> 'StaticDesignCorpus':
@@ -143,6 +147,6 @@ class StaticDesignCorpus(AbstractDesignCorpus):
         """ Same arguments as json.dump less the first. """
         return json.dump(self.rep, fp, indent=indent, **kwargs)
 
-    def dump_json_str(indent="  ", **kwargs):
+    def dump_json_str(self, indent="  ", **kwargs):
         """ Same arguments as json.dumps less the first. """
         return json.dumps(self.rep, indent=indent, **kwargs)
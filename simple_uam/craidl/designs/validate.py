@@ -0,0 +1,315 @@
+from attrs import define, frozen, field
+from typing import List, Dict, Set, FrozenSet, Any, Iterable, Optional, Union
+
+from simple_uam.craidl.corpus.abstract import CorpusReader
+from simple_uam.craidl.corpus.cached import CachedCorpus
+from simple_uam.util.logging import get_logger
+
+from .abstract import AbstractDesign, AbstractDesignCorpus
+
+log = get_logger(__name__)
+
+@frozen
+class DesignError():
+    """
+    A single problem found in a design.
+    """
+
+    design : Optional[str] = field()
+    """ The name of the design. """
+
+    kind : str = field()
+    """
+    What part of the design is wrong, one of 'format', 'component',
+    'parameter', or 'connection'.
+    """
+
+    message : str = field()
+    """ A human readable description of the problem. """
+
+    def __str__(self) -> str:
+        return self.message
+
+    @property
+    def rep(self) -> object:
+        """
+        This error as a JSON serializable object.
+        """
+        return dict(
+            design=self.design,
+            kind=self.kind,
+            message=self.message,
+        )
+
+@frozen
+class CorpusIndex():
+    """
+    The parts of a corpus needed to validate designs, as sets, so that each
+    check is a single lookup.
+    """
+
+    components : FrozenSet[str] = field(converter=frozenset)
+    """ Names of the known components. """
+
+    connections : Dict[str,FrozenSet[str]] = field()
+    """ The connections each component has. """
+
+    params : Dict[str,FrozenSet[str]] = field()
+    """ The parameters each component has. """
+
+    @classmethod
+    def build(cls,
+              corpus : CorpusReader,
+              names : Optional[Iterable[str]] = None) -> 'CorpusIndex':
+        """
+        Reads the index from a corpus.
+
+        Arguments:
+          corpus: The corpus to index.
+          names: The components to index, e.g. every component choice in a
+            set of designs. Indexes the whole corpus if not given, which can
+            be slow with a corpus server.
+        """
+
+        if names == None:
+            names = corpus.components
+        present = [name for name in set(names) if name in corpus]
+
+        cached = corpus if isinstance(corpus, CachedCorpus) \
+            else CachedCorpus(corpus)
+        cached.prefetch(present)
+
+        return cls(
+            components=present,
+            connections={
+                name : frozenset(cached[name].connections)
+                for name in present
+            },
+            params={
+                name : frozenset(p['PROP_NAME'] for p in cached[name].params)
+                for name in present
+            },
+        )
+
+def design_rep(design : Union[AbstractDesign, Dict]) -> Dict:
+    """
+    The JSON rep of a design, as returned by json.load or similar.
+    """
+
+    if isinstance(design, AbstractDesign):
+        return dict(
+            name = design.name,
+            parameters  = [param.rep for param in design.parameters ],
+            components  = [comp.rep  for comp  in design.components ],
+            connections = [conn.rep  for conn  in design.connections],
+        )
+    return design
+
+def component_choices(designs : Iterable[Union[AbstractDesign,Dict]]) -> Set[str]:
+    """
+    Every component choice used by a set of designs, skipping malformed
+    entries.
+    """
+
+    choices = set()
+    for design in designs:
+        rep = design_rep(design)
+        if not isinstance(rep, dict):
+            continue
+        for comp in rep.get('components') or list():
+            if isinstance(comp, dict) and comp.get('component_choice'):
+                choices.add(comp['component_choice'])
+    return choices
+
+@frozen
+class DesignValidator():
+    """
+    Checks designs against a corpus, collecting every error in a design
+    instead of stopping at the first.
+
+    Validate many designs with one validator, the corpus is only indexed
+    once.
+    """
+
+    index : Optional[CorpusIndex] = field(default=None)
+    """
+    The index of the corpus being checked against, without one only the
+    design's internal consistency is checked.
+    """
+
+    @classmethod
+    def for_designs(cls,
+                    corpus : CorpusReader,
+                    designs : Iterable[Union[AbstractDesign,Dict]],
+    ) -> 'DesignValidator':
+        """
+        Creates a validator that indexes only the components used by the
+        given designs.
+        """
+
+        return cls(index=CorpusIndex.build(corpus, component_choices(designs)))
+
+    def validate(self,
+                 design : Union[AbstractDesign, Dict]) -> List[DesignError]:
+        """
+        Checks a single design in one pass over its components, parameters,
+        and connections.
+
+        Arguments:
+          design: The design, or its JSON rep.
+
+        Returns:
+          Every error found, empty if the design is valid.
+        """
+
+        rep = design_rep(design)
+        errors = list()
+
+        if not isinstance(rep, dict):
+            return [DesignError(
+                design=None,
+                kind='format',
+                message="Design is not a JSON object.",
+            )]
+
+        name = rep.get('name')
+
+        def error(kind, message):
+            errors.append(DesignError(design=name, kind=kind, message=message))
+
+        def entries(key, kind):
+            items = rep.get(key)
+            if not isinstance(items, list):
+                error('format', f"Design has no list of {key}.")
+                return list()
+            valid = [item for item in items if isinstance(item, dict)]
+            if len(valid) != len(items):
+                error(kind, f"Design has {key} that aren't JSON objects.")
+            return valid
+
+        ### Components ###
+
+        instances = dict()
+        for comp in entries('components', 'component'):
+            instance = comp.get('component_instance')
+            choice = comp.get('component_choice')
+
+            if instance == None or choice == None:
+                error('component',
+                      f"Component {instance} is missing its instance name "
+                      "or choice.")
+                continue
+
+            if instance in instances:
+                error('component',
+                      f"Component {instance} appears more than once in design.")
+
+            instances[instance] = choice
+
+            if self.index and choice not in self.index.components:
+                error('component',
+                      f"Component Type {choice} not found in corpus.")
+
+        ### Parameters ###
+
+        for param in entries('parameters', 'parameter'):
+            param_name = param.get('parameter_name')
+            props = param.get('component_properties')
+
+            if param_name == None or not isinstance(props, list):
+                error('parameter',
+                      f"Parameter {param_name} is missing its name or "
+                      "component properties.")
+                continue
+
+            for prop in props:
+                instance = prop.get('component_name') \
+                    if isinstance(prop, dict) else None
+                prop_name = prop.get('component_property') \
+                    if isinstance(prop, dict) else None
+
+                if instance not in instances:
+                    error('parameter',
+                          f"Component {instance} not found in Design {name}, "
+                          f"used by parameter {param_name}.")
+                    continue
+
+                choice = instances[instance]
+                if self.index and choice in self.index.components and \
+                   prop_name not in self.index.params[choice]:
+                    error('parameter',
+                          f"Component {choice} does not have parameter "
+                          f"{prop_name}, used by parameter {param_name}.")
+
+        ### Connections ###
+
+        for conn in entries('connections', 'connection'):
+            for side in ['from', 'to']:
+                instance = conn.get(f'{side}_ci')
+                conn_type = conn.get(f'{side}_conn')
+
+                if instance not in instances:
+                    error('connection',
+                          f"Could not find component {instance} in design.")
+                    continue
+
+                choice = instances[instance]
+                if self.index and choice in self.index.components and \
+                   conn_type not in self.index.connections[choice]:
+                    error('connection',
+                          f"Component {choice} does not have connection "
+                          f"{conn_type}.")
+
+        return errors
+
+    def validate_all(self,
+                     designs : Dict[str,Union[AbstractDesign, Dict]],
+    ) -> Dict[str,List[DesignError]]:
+        """
+        Checks many designs.
+
+        Arguments:
+          designs: Map from a key, e.g. a file name, to a design.
+
+        Returns:
+          Map from key to errors, only for the designs with errors.
+        """
+
+        results = dict()
+        for key, design in designs.items():
+            errors = self.validate(design)
+            if errors:
+                results[key] = errors
+        return results
+
+    def validate_corpus(self,
+                        corpus : AbstractDesignCorpus,
+    ) -> Dict[str,List[DesignError]]:
+        """
+        Checks every design in a design corpus.
+
+        Returns:
+          Map from design name to errors, only for the designs with errors.
+        """
+
+        return self.validate_all({
+            name : corpus[name] for name in corpus.designs
+        })
+
+def validate_designs(corpus : CorpusReader,
+                     designs : Dict[str,Union[AbstractDesign, Dict]],
+) -> Dict[str,List[DesignError]]:
+    """
+    Checks a set of designs against a corpus, indexing only the components
+    they use.
+
+    Arguments:
+      corpus: The component corpus.
+      designs: Map from a key, e.g. a file name, to a design.
+
+    Returns:
+      Map from key to errors, only for the designs with errors.
+    """
+
+    validator = DesignValidator.for_designs(corpus, designs.values())
+    return validator.validate_all(designs)
@@ -1,6 +1,8 @@
 from .corpus.abstract import *
+from .corpus.cached import CachedCorpus
 from attrs import define, field, frozen
 from typing import List, Dict, Any, Iterator, Tuple, Optional
+from contextlib import ExitStack
 import json
 from pathlib import Path
 from simple_uam.util.logging import get_logger
@@ -10,6 +12,48 @@ log = get_logger(__name__)
 def any_none(*vargs):
     return any(map(lambda x: x is None, vargs))
 
+class InfoFileWriter():
+    """
+    Writes a JSON list to a file one entry at a time.
+
+    The default output is byte for byte what `json.dump(entries, fp,
+    indent="  ")` produces, compact output has no whitespace at all.
+    """
+
+    def __init__(self, path : Path, compact : bool = False):
+        self.path = Path(path)
+        self.compact = compact
+        self.count = 0
+        self._fp = None
+
+    def __enter__(self) -> 'InfoFileWriter':
+        self._fp = self.path.open('w')
+        self._fp.write('[')
+        return self
+
+    def write(self, entry):
+        """
+        Appends a single entry to the list.
+        """
+
+        if self.compact:
+            data = json.dumps(entry, separators=(',',':'))
+            self._fp.write(data if self.count == 0 else ',' + data)
+        else:
+            # Nested one level deeper than a top level value.
+            data = json.dumps(entry, indent="  ").replace('\n', '\n  ')
+            self._fp.write(('\n  ' if self.count == 0 else ',\n  ') + data)
+        self.count += 1
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if self.count > 0 and not self.compact:
+                self._fp.write('\n')
+            self._fp.write(']')
+        finally:
+            self._fp.close()
+            self._fp = None
+
 @frozen
 class DesignInfoFiles():
 
@@ -19,6 +63,18 @@ class DesignInfoFiles():
     design : dict = field()
     """ Design rep we're generating info files for. """
 
+    cached_corpus : CachedCorpus = field(
+        init=False,
+    )
+    """
+    Per-generation cache over `corpus`, every field of each distinct
+    component choice is fetched once and shared by all the info files.
+    """
+
+    @cached_corpus.default
+    def _cached_corpus_default(self):
+        return CachedCorpus(self.corpus)
+
     design_to_corpus : dict = field(
         init=False,
     )
@@ -31,20 +87,58 @@ class DesignInfoFiles():
             from_comp = comp_entry['component_instance']
             lib_component = comp_entry['component_choice']
             cdcm[from_comp] = lib_component
+        self.cached_corpus.prefetch(set(cdcm.values()))
         return cdcm
 
-    component_maps : List[dict] = field(
-        init = False,
+    _file_map : Dict[str,List[dict]] = field(
+        factory=dict,
+        init=False,
     )
-    """ Map of components and cad files. """
+    """ The info file data, filled in by `info_file_map` on first use. """
 
     component_maps_file = 'info_componentMapList1.json'
+    """ Map of components and cad files. """
+
+    connection_maps_file = 'info_connectionMap6.json'
+    """ List of connections in the design. """
+
+    param_maps_file = "info_paramMap4.json"
+
+    cad_properties_file = "info_componentCadProps2.json"
+
+    cad_connections_file = "info_connectionCADMap3.json"
+
+    component_props_file = "info_componentProps7.json"
+
+    component_params_file = 'info_componentParams8.json'
+
+    cad_params_file = 'info_componentCADParams5.json'
+
+    @property
+    def info_files(self) -> List[str]:
+        """
+        The names of the info files, in the order they're written.
+        """
+
+        return [
+            self.component_maps_file,
+            self.connection_maps_file,
+            self.param_maps_file,
+            self.cad_properties_file,
+            self.cad_connections_file,
+            self.component_props_file,
+            self.component_params_file,
+            self.cad_params_file,
+        ]
+
+    def _component_entries(self) -> Iterator[Tuple[str,dict]]:
+        """
+        Entries for the component map and every per-component info file.
+        """
 
-    @component_maps.default
-    def _cmp_maps_default(self):
-        cmp_maps = list()
         for from_comp, lib_comp in self.design_to_corpus.items():
-            cad_prt = self.corpus[lib_comp].cad_part
+            lib_entry = self.cached_corpus[lib_comp]
+            cad_prt = lib_entry.cad_part
 
             new_entry = {
                 'FROM_COMP': from_comp,
@@ -59,176 +153,43 @@ class DesignInfoFiles():
                     **new_entry,
                 )
 
-
             if any_none(from_comp, lib_comp):
                 log.warning(
                     'Skipping entry in component_maps due to null values',
                     **new_entry,
                 )
-            else:
-                cmp_maps.append(new_entry)
-        return cmp_maps
+                continue
 
-    connection_maps : List[dict] = field(
-        init=False,
-    )
-    """ List of connections in the design. """
-
-    connection_maps_file = 'info_connectionMap6.json'
+            yield (self.component_maps_file, new_entry)
 
-    @connection_maps.default
-    def _conn_maps_def(self):
-        conn_maps = list()
-        for conn_entry in self.design['connections']:
-            from_comp = conn_entry['from_ci']
-            from_conn = conn_entry['from_conn']
-            to_comp = conn_entry['to_ci']
-            to_conn = conn_entry['to_conn']
-            new_entry = {
-                'FROM_COMP': from_comp,
-                'FROM_CONN': from_conn,
-                'TO_COMP': to_comp,
-                'TO_CONN': to_conn
-            }
-            if any_none(from_comp, from_conn, to_comp, to_conn):
-                log.warning(
-                    'Skipping entry in connectionMap due to null values',
-                    comp_entry=conn_entry,
-                    **new_entry,
-                )
-            else:
-                conn_maps.append(new_entry)
-        return conn_maps
+            comp_name = from_comp
+            lib_name = lib_comp
+            cad_part = cad_prt if cad_prt else None
 
-    param_maps : List[dict] = field(
-        init = False,
-    )
-
-    param_maps_file = "info_paramMap4.json"
-
-    @param_maps.default
-    def _param_maps_default(self):
-        param_maps = list()
-        for param_entry in self.design['parameters']:
-            design_param = param_entry['parameter_name']
-            design_param_val = param_entry['value']
-            for target in param_entry['component_properties']:
-                component_name = target['component_name']
-                component_param = target['component_property']
-                new_entry = {
-                    'DESIGN_PARAM': design_param,
-                    'DESIGN_PARAM_VAL': design_param_val,
-                    'COMPONENT_NAME': component_name,
-                    'COMPONENT_PARAM': component_param
-                }
-                if any_none(design_param,
-                            design_param_val,
-                            component_name,
-                            component_param):
-                    log.warning(
-                        'Skipping entry in paramMap due to null values',
-                        comp_entry=comp_entry,
-                        **new_entry,
-                    )
-                else:
-                    param_maps.append(new_entry)
-        return param_maps
-
-    cad_properties : List[dict] = field(
-        init = False,
-    )
-
-    cad_properties_file = "info_componentCadProps2.json"
-
-    @cad_properties.default
-    def _cad_props_default(self):
-        cad_props = list()
-        for entry in self.component_maps: # NOTE : needs component map list
-            comp_name = entry['FROM_COMP']
-            lib_name = entry['LIB_COMPONENT']
-            cad_part = entry.get('CAD_PRT',None)
-            prop_vals = self.corpus[lib_name].cad_properties
-            for prop_val in prop_vals:
+            for prop_val in lib_entry.cad_properties:
                 prop_name = prop_val['PROP_NAME']
                 prop_value = prop_val['PROP_VALUE']
-                new_entry = {
+                prop_entry = {
                     'COMP_NAME': comp_name,
                     'LIB_NAME': lib_name,
                     'CAD_PART': cad_part,
                     'PROP_NAME': prop_name,
                     'PROP_VALUE': prop_value
                 }
-
                 if any_none(prop_name, prop_value, cad_part):
                     log.warning(
                         'Skipping entry in paramMap due to null values',
-                        entry=entry,
+                        entry=new_entry,
                         prop_val=prop_val,
-                        **new_entry,
+                        **prop_entry,
                     )
                 else:
-                    cad_props.append(new_entry)
-        return cad_props
-
-    cad_connections : List[dict] = field(
-        init=False,
-    )
-
-    cad_connections_file = "info_connectionCADMap3.json"
-
-    @cad_connections.default
-    def _cad_conn_default(self):
-        cad_conns = list()
-        for entry in self.connection_maps: ## NOTE: need connmap
-            from_comp = entry['FROM_COMP']
-            to_comp = entry['TO_COMP']
-            from_conn = entry['FROM_CONN']
-            to_conn = entry['TO_CONN']
-            from_comp_type = self.design_to_corpus[from_comp] ## NOTE: needs ci_to_comp
-            to_comp_type = self.design_to_corpus[to_comp]
-            from_conn_cs = self.corpus[from_comp_type].cad_connection(from_conn)
-            to_conn_cs = self.corpus[to_comp_type].cad_connection(to_conn)
-
-            # Cad connections don't always exist for power but we need to
-            # preserve them anyway.
-            # if not from_conn_cs and 'Power' in from_conn:
-            #     from_conn_cs = from_conn
-            # if not to_conn_cs and 'Power' in to_conn:
-            #     to_conn_cs = to_conn
+                    yield (self.cad_properties_file, prop_entry)
 
-            new_entry = {
-                'FROM_COMP': from_comp,
-                'FROM_CONN_CS': from_conn_cs,
-                'TO_COMP': to_comp,
-                'TO_CONN_CS': to_conn_cs
-            }
-            if any_none(from_conn_cs and to_conn_cs):
-                log.warning(
-                    'Skipping entry in connectionCadMap due to null values',
-                    entry=entry,
-                    **new_entry,
-                )
-            else:
-                cad_conns.append(new_entry)
-        return cad_conns
-
-    component_props : List[dict] = field(
-        init=False,
-    )
-
-    component_props_file = "info_componentProps7.json"
-
-    @component_props.default
-    def _comp_props_default(self):
-        comp_props = list()
-        for entry in self.component_maps:
-            comp_name = entry['FROM_COMP']
-            lib_name = entry['LIB_COMPONENT']
-            prop_vals = self.corpus[lib_name].properties
-            for prop_val in prop_vals:
+            for prop_val in lib_entry.properties:
                 prop_name = prop_val['PROP_NAME']
                 prop_value = prop_val['PROP_VALUE']
-                new_entry = {
+                prop_entry = {
                     'COMP_NAME': comp_name,
                     'LIB_NAME': lib_name,
                     'PROP_NAME': prop_name,
@@ -237,32 +198,17 @@ class DesignInfoFiles():
                 if any_none(prop_name, prop_val):
                     log.warning(
                         'Skipping entry in componentProps due to null values',
-                        entry=entry,
+                        entry=new_entry,
                         prop_val=prop_val,
-                        **new_entry,
+                        **prop_entry,
                     )
                 else:
-                    comp_props.append(new_entry)
-        return comp_props
-
-
-    component_params : List[dict] = field(
-        init=False,
-    )
-
-    component_params_file = 'info_componentParams8.json'
+                    yield (self.component_props_file, prop_entry)
 
-    @component_params.default
-    def _comp_params_default(self):
-        comp_params = list()
-        for entry in self.component_maps:
-            comp_name = entry['FROM_COMP']
-            lib_name = entry['LIB_COMPONENT']
-            prop_vals = self.corpus[lib_name].params
-            for prop_val in prop_vals:
+            for prop_val in lib_entry.params:
                 prop_name = prop_val['PROP_NAME']
                 prop_value = prop_val['PROP_VALUE']
-                new_entry = {
+                prop_entry = {
                     'COMP_NAME': comp_name,
                     'LIB_NAME': lib_name,
                     'PROP_NAME': prop_name,
@@ -271,84 +217,221 @@ class DesignInfoFiles():
                 if any_none(prop_name, prop_value):
                     log.warning(
                         'Skipping entry in componentParams due to null values',
-                        entry=entry,
+                        entry=new_entry,
                         prop_val=prop_val,
-                        **new_entry,
+                        **prop_entry,
                     )
                 else:
-                    comp_params.append(new_entry)
-        return comp_params
+                    yield (self.component_params_file, prop_entry)
 
-    cad_params : List[dict] = field(
-        init=False,
-    )
-
-    cad_params_file = 'info_componentCADParams5.json'
-
-    @cad_params.default
-    def _cad_params(self):
-        cad_params = list()
-        for entry in self.component_maps: ## NOTE: ComponentMapList
-            comp_name = entry['FROM_COMP']
-            lib_name = entry['LIB_COMPONENT']
-            cad_part = entry.get('CAD_PRT',None)
-            prop_vals = self.corpus[lib_name].cad_params
-            for prop_val in prop_vals:
+            for prop_val in lib_entry.cad_params:
                 prop_name = prop_val['PROP_NAME']
                 prop_value = prop_val['PROP_VALUE']
-                new_entry = {
+                prop_entry = {
                     'COMP_NAME': comp_name,
                     'LIB_NAME': lib_name,
                     'CAD_PART': cad_part,
                     'PROP_NAME': prop_name,
                     'PROP_VALUE': prop_value
                 }
-
-                # Propagating possibly missing cad_part forward
-                # if cad_part:
-                #     new_entry['CAD_PART'] = cad_part
-
                 if any_none(prop_name, prop_value, cad_part):
                     log.warning(
                         'Skipping entry in componentCadParams due to null values',
-                        entry=entry,
+                        entry=new_entry,
                         prop_val=prop_val,
+                        **prop_entry,
+                    )
+                else:
+                    yield (self.cad_params_file, prop_entry)
+
+    def _connection_entries(self) -> Iterator[Tuple[str,dict]]:
+        """
+        Entries for the connection map and cad connection map.
+        """
+
+        for conn_entry in self.design['connections']:
+            from_comp = conn_entry['from_ci']
+            from_conn = conn_entry['from_conn']
+            to_comp = conn_entry['to_ci']
+            to_conn = conn_entry['to_conn']
+            new_entry = {
+                'FROM_COMP': from_comp,
+                'FROM_CONN': from_conn,
+                'TO_COMP': to_comp,
+                'TO_CONN': to_conn
+            }
+            if any_none(from_comp, from_conn, to_comp, to_conn):
+                log.warning(
+                    'Skipping entry in connectionMap due to null values',
+                    comp_entry=conn_entry,
+                    **new_entry,
+                )
+                continue
+
+            yield (self.connection_maps_file, new_entry)
+
+            from_comp_type = self.design_to_corpus[from_comp]
+            to_comp_type = self.design_to_corpus[to_comp]
+            from_conn_cs = self.cached_corpus[from_comp_type].cad_connection(from_conn)
+            to_conn_cs = self.cached_corpus[to_comp_type].cad_connection(to_conn)
+
+            # Cad connections don't always exist for power but we need to
+            # preserve them anyway.
+            # if not from_conn_cs and 'Power' in from_conn:
+            #     from_conn_cs = from_conn
+            # if not to_conn_cs and 'Power' in to_conn:
+            #     to_conn_cs = to_conn
+
+            cad_entry = {
+                'FROM_COMP': from_comp,
+                'FROM_CONN_CS': from_conn_cs,
+                'TO_COMP': to_comp,
+                'TO_CONN_CS': to_conn_cs
+            }
+            if any_none(from_conn_cs and to_conn_cs):
+                log.warning(
+                    'Skipping entry in connectionCadMap due to null values',
+                    entry=new_entry,
+                    **cad_entry,
+                )
+            else:
+                yield (self.cad_connections_file, cad_entry)
+
+    def _param_entries(self) -> Iterator[Tuple[str,dict]]:
+        """
+        Entries for the parameter map.
+        """
+
+        for param_entry in self.design['parameters']:
+            design_param = param_entry['parameter_name']
+            design_param_val = param_entry['value']
+            for target in param_entry['component_properties']:
+                component_name = target['component_name']
+                component_param = target['component_property']
+                new_entry = {
+                    'DESIGN_PARAM': design_param,
+                    'DESIGN_PARAM_VAL': design_param_val,
+                    'COMPONENT_NAME': component_name,
+                    'COMPONENT_PARAM': component_param
+                }
+                if any_none(design_param,
+                            design_param_val,
+                            component_name,
+                            component_param):
+                    log.warning(
+                        'Skipping entry in paramMap due to null values',
+                        param_entry=param_entry,
                         **new_entry,
                     )
                 else:
-                    cad_params.append(new_entry)
-        return cad_params
+                    yield (self.param_maps_file, new_entry)
+
+    def entries(self) -> Iterator[Tuple[str,dict]]:
+        """
+        Walks the design's components, connections, and parameters once,
+        yielding `(info file name, entry)` for every entry of every info
+        file. Entries for each file come out in file order.
+        """
+
+        yield from self._component_entries()
+        yield from self._connection_entries()
+        yield from self._param_entries()
 
     @property
-    def info_file_map(self):
+    def info_file_map(self) -> Dict[str,List[dict]]:
         """
         Map from filename to file data.
         """
 
-        return {
-            self.component_maps_file: self.component_maps,
-            self.connection_maps_file: self.connection_maps,
-            self.param_maps_file: self.param_maps,
-            self.cad_properties_file: self.cad_properties,
-            self.cad_connections_file: self.cad_connections,
-            self.component_props_file: self.component_props,
-            self.component_params_file: self.component_params,
-            self.cad_params_file: self.cad_params,
-        }
-
-    def write_files(self, out_dir):
+        if not self._file_map:
+            file_map = {name : list() for name in self.info_files}
+            for name, entry in self.entries():
+                file_map[name].append(entry)
+            self._file_map.update(file_map)
+        return self._file_map
+
+    @property
+    def component_maps(self) -> List[dict]:
+        """ Map of components and cad files. """
+        return self.info_file_map[self.component_maps_file]
+
+    @property
+    def connection_maps(self) -> List[dict]:
+        """ List of connections in the design. """
+        return self.info_file_map[self.connection_maps_file]
+
+    @property
+    def param_maps(self) -> List[dict]:
+        return self.info_file_map[self.param_maps_file]
+
+    @property
+    def cad_properties(self) -> List[dict]:
+        return self.info_file_map[self.cad_properties_file]
+
+    @property
+    def cad_connections(self) -> List[dict]:
+        return self.info_file_map[self.cad_connections_file]
+
+    @property
+    def component_props(self) -> List[dict]:
+        return self.info_file_map[self.component_props_file]
+
+    @property
+    def component_params(self) -> List[dict]:
+        return self.info_file_map[self.component_params_file]
+
+    @property
+    def cad_params(self) -> List[dict]:
+        return self.info_file_map[self.cad_params_file]
+
+    def write_files(self, out_dir, compact : bool = False):
         """
-        Write all the info files to the output directory.
+        Write all the info files to the output directory, streaming entries
+        straight to the files in a single pass over the design.
+
+        Arguments:
+          out_dir: The directory to write the files into.
+          compact: Leave out indentation, otherwise the files match
+            `json.dump(data, fp, indent="  ")`.
         """
 
+        if self._file_map:
+            self.write_file_map(self._file_map, out_dir, compact=compact)
+            return
+
         out_dir = Path(out_dir)
         out_dir.mkdir(parents=True, exist_ok=True)
 
-        for filename, content in self.info_file_map.items():
-            filepath = out_dir / filename
+        with ExitStack() as stack:
+            writers = {
+                name : stack.enter_context(
+                    InfoFileWriter(out_dir / name, compact=compact)
+                )
+                for name in self.info_files
+            }
+            for name, entry in self.entries():
+                writers[name].write(entry)
+
+    @staticmethod
+    def write_file_map(file_map, out_dir, compact : bool = False):
+        """
+        Write info files, as returned by `info_file_map`, to the output
+        directory.
+
+        Arguments:
+          file_map: Map from filename to file data.
+          out_dir: The directory to write the files into.
+          compact: Leave out indentation, otherwise the files match
+            `json.dump(data, fp, indent="  ")`.
+        """
+
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
 
-            with filepath.open('w') as fp:
-                json.dump(content, fp, indent="  ")
+        for filename, content in file_map.items():
+            with InfoFileWriter(out_dir / filename, compact=compact) as writer:
+                for entry in content:
+                    writer.write(entry)
 
     @classmethod
     def load_design(cls, corpus, fp, **kwargs):
@@ -1,49 +1,131 @@
 
 from simple_uam.workspace.session import Session, session_op
 from simple_uam.util.logging import get_logger
-from simple_uam.craidl.corpus import GremlinCorpus, StaticCorpus, get_corpus
+from simple_uam.craidl.corpus import GremlinCorpus, StaticCorpus, get_corpus, \
+    PROCESS_CORPUS_CACHE
 from simple_uam.craidl.info_files import DesignInfoFiles
-from simple_uam.worker import actor, message_metadata
+from simple_uam.worker import actor, message_metadata, register_collector
+from simple_uam.util.config import Config, D2CWorkspaceConfig, D2CWorkerConfig
 from attrs import define,field
 import json
 from pathlib import Path
 from simple_uam.util.invoke import task, call
 from simple_uam.util.logging import get_logger
 from simple_uam.direct2cad.workspace import D2CWorkspace
+from simple_uam.direct2cad.manager import D2CManager
+from simple_uam.direct2cad.creo import CreoServer
+from simple_uam.direct2cad.session import PreparedInfoFiles, design_cache_key
 
 log = get_logger(__name__)
 
+def _results_stats():
+    """
+    Size of the results dir and index lock waits, for the worker metrics.
+    Skipped without a results index, since that would stat every archive on
+    every scrape.
+    """
+    index = D2CManager().results_index
+    if not index:
+        return dict()
+    records = index.records
+    return dict(
+        count=len(records),
+        bytes=sum(r['size'] for r in records),
+        **{f"index_{k}" : v for k, v in index.stats.items()},
+    )
+
+register_collector(
+    'workspace_pool',
+    lambda: D2CManager().workspace_pool.stats,
+)
+register_collector('results', _results_stats)
+register_collector('corpus_cache', lambda: PROCESS_CORPUS_CACHE.stats)
+register_collector(
+    'creo',
+    lambda: CreoServer.shared(Config[D2CWorkspaceConfig].creo).stats,
+)
+
+def _wait_timeout():
+    """
+    How long a message waits for a workspace. With a pipeline the extra
+    threads are expected to wait behind running CAD builds, possibly for
+    longer than `workspace_wait_timeout`, so they wait indefinitely instead of
+    failing and being retried. There are never more waiters than threads.
+    """
+    if Config[D2CWorkerConfig].pipeline_depth > 0:
+        return None
+    return -1
+
 @actor
-def gen_info_files(design, metadata=None):
+def gen_info_files(design, metadata=None, info_files=None):
     """
     gen_info_files as an actor that will perform the task on a worker node
     and return metadata information.
+
+    `info_files` are the design's info files if the client already generated
+    them, in which case they're written as-is.
     """
 
     if not metadata:
         metadata = dict()
     metadata['message_info'] = message_metadata()
 
-    with D2CWorkspace(name="gen_info_files",metadata=metadata) as session:
+    # Generate the info files before we hold a workspace.
+    prepared = PreparedInfoFiles.prepare(design, info_files)
+
+    with D2CWorkspace(
+            name="gen_info_files",
+            metadata=metadata,
+            wait_timeout=_wait_timeout(),
+    ) as session:
         session.write_design(design)
-        session.gen_info_files(design)
+        session.gen_info_files(design, info_files=prepared.apply(session))
 
     return session.metadata
 
 
 @actor
-def process_design(design, metadata=None):
+def process_design(design, metadata=None, info_files=None):
     """
     Processes a design on a worker node and saves the result into a result
     archive on the worker. Returns metadata on the worker used and archive
     created.
+
+    `info_files` are the design's info files if the client already generated
+    them, in which case the worker skips that step.
     """
 
     if not metadata:
         metadata = dict()
     metadata['message_info'] = message_metadata()
 
-    with D2CWorkspace(name="process_design",metadata=metadata) as session:
-        session.process_design(design)
+    # Identical designs get the result of the earlier run, no workspace
+    # needed. Info files from the client are part of the key, since they
+    # come from the client's corpus rather than ours.
+    manager = D2CManager()
+    metadata['cache_key'] = design_cache_key(
+        manager,
+        "process_design",
+        design,
+        info_files=info_files,
+    )
+    cached = manager.cached_result(metadata['cache_key'], metadata)
+    if cached:
+        return cached
+
+    # Generate the info files before we hold a workspace, so that the CAD
+    # build is the only stage that waits on the workspace locks. Failures
+    # are raised within the session so they're in the result archive.
+    prepared = PreparedInfoFiles.prepare(design, info_files)
+
+    with D2CWorkspace(
+            name="process_design",
+            metadata=metadata,
+            wait_timeout=_wait_timeout(),
+    ) as session:
+        session.process_design(
+            design,
+            info_files=prepared.apply(session, design),
+        )
 
     return session.metadata
@@ -0,0 +1,449 @@
+from typing import Dict, Optional, Tuple, Callable, Any
+from attrs import define, field
+from filelock import FileLock, Timeout
+from contextlib import nullcontext
+from pathlib import Path
+import http.client
+import threading
+import socket
+import json
+import time
+import uuid
+import os
+
+from simple_uam.util.config.d2c_workspace_config import CreoConfig
+from simple_uam.util.logging import get_logger
+
+log = get_logger(__name__)
+
+_SHARED_SERVERS : Dict[Tuple[str,int],'CreoServer'] = dict()
+""" Process wide server handles, see `CreoServer.shared`. """
+
+_SHARED_LOCK = threading.Lock()
+""" Guards `_SHARED_SERVERS`. """
+
+@define
+class CreoJob():
+    """
+    A job that's using the creo server, from `CreoServer.start_job`.
+    """
+
+    lock : Optional[FileLock] = field(default=None)
+    """
+    Held for as long as the job runs so that other processes can wait for
+    it to finish before restarting Creo.
+    """
+
+    start : float = field(factory=time.monotonic)
+    """ Monotonic time the job started. """
+
+@define
+class CreoServer():
+    """
+    Keeps track of a long running Creoson server (and the Creo instance behind
+    it) so that sessions reuse it instead of starting it for every design.
+
+    The server is started when a health check fails, and restarted when it
+    has run `restart_after` jobs or a failed job left it unhealthy. After
+    starting the server we poll until it's ready instead of waiting a fixed
+    time.
+
+    Every worker process on a host shares the one Creo instance, so with a
+    `lock_dir` starts and restarts are serialized across processes, and
+    each job holds a lockfile in `lock_dir` while it runs. A restart waits,
+    up to `drain_timeout` seconds, for the running jobs in every process to
+    finish before stopping Creo, and no new jobs start in the meantime.
+
+    Health checks:
+      - 'creoson': Asks creoson whether Creo is running.
+      - 'tcp': Only checks that something is listening on the port.
+    """
+
+    probes = ['creoson', 'tcp']
+    """ Supported health checks. """
+
+    host : str = field(default="localhost")
+    """ The creoson server's host. """
+
+    port : int = field(default=9056)
+    """ The creoson server's port. """
+
+    probe : str = field(default='creoson')
+    """ The health check to use, see class docs. """
+
+    @probe.validator
+    def _probe_valid(self, attr, val):
+        if val not in self.probes:
+            raise RuntimeError(
+                f"Unknown creo health check '{val}', must be one of "
+                f"{self.probes}."
+            )
+
+    connect_timeout : float = field(default=2.0)
+    """ Seconds to wait on a single health check. """
+
+    ready_timeout : float = field(default=120.0)
+    """ Seconds to wait for the server to be ready after starting it. """
+
+    poll_interval : float = field(default=0.5)
+    """ Seconds between health checks while waiting for the server. """
+
+    restart_after : int = field(default=-1)
+    """ Restart the server after this many jobs, never if negative. """
+
+    lock_dir : Optional[Path] = field(
+        default=None,
+        converter=lambda p: None if p == None else Path(p),
+    )
+    """
+    Dir for the host wide restart lock and the lockfiles of running jobs.
+    Without one, restarts only wait on jobs in this process.
+    """
+
+    drain_timeout : float = field(default=3600.0)
+    """
+    Seconds a restart waits for running jobs before stopping Creo anyway.
+    """
+
+    jobs : int = field(default=0, init=False)
+    """ Jobs run since the server was last started. """
+
+    starts : int = field(default=0, init=False)
+    """ Number of times we've started the server. """
+
+    reuses : int = field(default=0, init=False)
+    """ Number of jobs that reused an already running server. """
+
+    needs_restart : bool = field(default=False, init=False)
+    """ Whether the next job should restart the server. """
+
+    active : int = field(default=0, init=False)
+    """ Jobs in this process that are currently using the server. """
+
+    total_lock_wait_time : float = field(default=0.0, init=False)
+    """ Total time, in seconds, jobs spent waiting for the start lock. """
+
+    max_lock_wait_time : float = field(default=0.0, init=False)
+    """ Longest time, in seconds, a single job waited for the start lock. """
+
+    _start_lock : threading.Lock = field(factory=threading.Lock, init=False)
+    """ Ensures only one session in this process starts the server at a time. """
+
+    _cond : threading.Condition = field(
+        factory=threading.Condition,
+        init=False,
+    )
+    """ Guards the counters and wakes a restart waiting on running jobs. """
+
+    @classmethod
+    def shared(cls, config : CreoConfig) -> 'CreoServer':
+        """
+        Gets the handle for the configured server that's shared by the whole
+        process.
+        """
+
+        key = (config.host, config.port)
+        with _SHARED_LOCK:
+            server = _SHARED_SERVERS.get(key)
+            if server == None:
+                server = cls(
+                    host=config.host,
+                    port=config.port,
+                    probe=config.probe,
+                    connect_timeout=config.connect_timeout,
+                    ready_timeout=config.ready_timeout,
+                    poll_interval=config.poll_interval,
+                    restart_after=config.restart_after,
+                    lock_dir=config.lock_dir,
+                    drain_timeout=config.drain_timeout,
+                )
+                _SHARED_SERVERS[key] = server
+            return server
+
+    def request(self, command : str, function : str, **data) -> Dict[str,Any]:
+        """
+        Sends a single request to the creoson server.
+
+        Arguments:
+          command: The creoson command group, e.g. 'connection'.
+          function: The function within that group, e.g. 'is_creo_running'.
+          **data: The request's data fields.
+
+        Returns:
+          The decoded response.
+        """
+
+        body = dict(command=command, function=function)
+        if data:
+            body['data'] = data
+
+        conn = http.client.HTTPConnection(
+            self.host,
+            self.port,
+            timeout=self.connect_timeout,
+        )
+        try:
+            conn.request(
+                "POST",
+                "/creoson",
+                body=json.dumps(body),
+                headers={"Content-Type": "application/json"},
+            )
+            return json.loads(conn.getresponse().read())
+        finally:
+            conn.close()
+
+    def is_alive(self) -> bool:
+        """
+        Runs a single health check.
+        """
+
+        try:
+            if self.probe == 'tcp':
+                with socket.create_connection(
+                        (self.host, self.port),
+                        timeout=self.connect_timeout):
+                    return True
+
+            response = self.request('connection', 'is_creo_running')
+            return bool(response.get('data', dict()).get('running'))
+
+        except (OSError, ValueError, http.client.HTTPException):
+            return False
+
+    def wait_ready(self, timeout : Optional[float] = None) -> bool:
+        """
+        Polls the server until it's healthy.
+
+        Arguments:
+          timeout: Seconds to wait, defaults to `ready_timeout`.
+
+        Returns:
+          Whether the server became ready in time.
+        """
+
+        if timeout == None:
+            timeout = self.ready_timeout
+
+        start = time.monotonic()
+        while True:
+            if self.is_alive():
+                log.info(
+                    "Creo ready.",
+                    host=self.host,
+                    port=self.port,
+                    wait_time=time.monotonic() - start,
+                )
+                return True
+            if time.monotonic() - start >= timeout:
+                return False
+            time.sleep(self.poll_interval)
+
+    def stop(self):
+        """
+        Asks creoson to shut Creo down, if it's listening. The creoson server
+        itself is restarted by the start script.
+        """
+
+        if self.probe != 'creoson':
+            return
+
+        try:
+            self.request('connection', 'stop_creo')
+        except (OSError, ValueError, http.client.HTTPException):
+            pass
+
+    @property
+    def jobs_dir(self) -> Optional[Path]:
+        """ Where running jobs keep their lockfiles. """
+        return None if self.lock_dir == None else self.lock_dir / 'jobs'
+
+    def _host_lock(self):
+        """
+        The lock that serializes starts and restarts across processes.
+        """
+
+        if self.lock_dir == None:
+            return nullcontext()
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+        return FileLock(self.lock_dir / f'creo_{self.port}.lock')
+
+    def _drain(self):
+        """
+        Waits for running jobs, in this and other processes, to finish.
+        Only call with the host lock held, so that no new jobs start.
+        """
+
+        start = time.monotonic()
+
+        def remaining():
+            return max(0.0, self.drain_timeout - (time.monotonic() - start))
+
+        with self._cond:
+            while self.active > 0 and remaining() > 0:
+                self._cond.wait(min(remaining(), self.poll_interval))
+            local = self.active
+
+        busy = list()
+        if self.jobs_dir != None and self.jobs_dir.exists():
+            for job_file in self.jobs_dir.glob('*.lock'):
+                job_lock = FileLock(job_file)
+                try:
+                    job_lock.acquire(timeout=remaining())
+                except Timeout:
+                    busy.append(job_file.name)
+                    continue
+                # Either finished or its process died, either way it's done.
+                job_lock.release()
+                try:
+                    job_file.unlink()
+                except OSError:
+                    pass
+
+        if local > 0 or busy:
+            log.warning(
+                "Running jobs didn't finish in time, restarting Creo anyway.",
+                drain_timeout=self.drain_timeout,
+                local_jobs=local,
+                other_jobs=busy,
+            )
+        else:
+            log.info(
+                "Running jobs finished, restarting Creo.",
+                wait_time=time.monotonic() - start,
+            )
+
+    def _register_job(self) -> CreoJob:
+        """
+        Records a new running job, call with the host lock held.
+        """
+
+        with self._cond:
+            self.active += 1
+
+        lock = None
+        if self.jobs_dir != None:
+            self.jobs_dir.mkdir(parents=True, exist_ok=True)
+            lock = FileLock(
+                self.jobs_dir / f'{os.getpid()}-{uuid.uuid4().hex}.lock')
+            lock.acquire()
+
+        return CreoJob(lock=lock)
+
+    def start_job(self, start_fn : Callable[[],Any]) -> CreoJob:
+        """
+        Makes sure the server is up, reusing it when possible, and records
+        that a job is using it. Every call MUST be followed by a call to
+        `finish_job`.
+
+        Arguments:
+          start_fn: Starts the server (e.g. runs 'startCreo.py'), doesn't
+            need to wait for it to be ready.
+
+        Returns:
+          The job, to pass to `finish_job`.
+        """
+
+        start = time.monotonic()
+        with self._start_lock, self._host_lock():
+
+            with self._cond:
+                wait = time.monotonic() - start
+                self.total_lock_wait_time += wait
+                self.max_lock_wait_time = max(self.max_lock_wait_time, wait)
+
+                if self.restart_after >= 0 and self.jobs >= self.restart_after:
+                    log.info(
+                        "Restarting Creo after job limit.",
+                        jobs=self.jobs,
+                        restart_after=self.restart_after,
+                    )
+                    self.needs_restart = True
+                restart = self.needs_restart
+
+            if not restart and self.is_alive():
+                with self._cond:
+                    self.reuses += 1
+                log.info(
+                    "Reusing running Creo.",
+                    host=self.host,
+                    port=self.port,
+                    jobs=self.jobs,
+                )
+                return self._register_job()
+
+            if restart:
+                self._drain()
+                self.stop()
+
+            log.info(
+                "Starting Creo.",
+                host=self.host,
+                port=self.port,
+            )
+
+            start_fn()
+            with self._cond:
+                self.starts += 1
+                self.jobs = 0
+                self.needs_restart = False
+
+            if not self.wait_ready():
+                with self._cond:
+                    self.needs_restart = True
+                err = RuntimeError("Creo did not become ready in time.")
+                log.exception(
+                    "Creo did not become ready in time.",
+                    host=self.host,
+                    port=self.port,
+                    ready_timeout=self.ready_timeout,
+                    err=err,
+                )
+                raise err
+
+            return self._register_job()
+
+    def finish_job(self, job : CreoJob, failed : bool = False):
+        """
+        Records the end of a job from `start_job`.
+
+        Arguments:
+          job: The job that finished.
+          failed: Whether the job failed. Creo is only restarted before the
+            next job if it also fails a health check, a bad design shouldn't
+            restart Creo for everyone.
+        """
+
+        if job.lock != None:
+            job.lock.release()
+            try:
+                Path(job.lock.lock_file).unlink()
+            except OSError:
+                # Someone draining jobs got to it first.
+                pass
+
+        with self._cond:
+            self.jobs += 1
+            self.active -= 1
+            self._cond.notify_all()
+
+        if failed and not self.is_alive():
+            log.info("Creo failed health check, will restart it for next job.")
+            with self._cond:
+                self.needs_restart = True
+
+    @property
+    def stats(self) -> Dict[str,Any]:
+        """
+        Counters for this server, suitable for logging or metrics.
+        """
+        with self._cond:
+            return dict(
+                jobs=self.jobs,
+                starts=self.starts,
+                reuses=self.reuses,
+                active=self.active,
+                needs_restart=self.needs_restart,
+                total_lock_wait_time=self.total_lock_wait_time,
+                max_lock_wait_time=self.max_lock_wait_time,
+            )
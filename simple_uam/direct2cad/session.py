@@ -3,34 +3,234 @@ from simple_uam.workspace.session import Session, session_op
 from simple_uam.util.logging import get_logger
 from simple_uam.util.config import Config, D2CWorkspaceConfig, CraidlConfig
 from simple_uam.util.system import backup_file
-from simple_uam.craidl.corpus import GremlinCorpus, StaticCorpus, get_corpus
+from simple_uam.craidl.corpus import GremlinCorpus, StaticCorpus, get_corpus, \
+    get_cached_corpus, cached_corpus_version, PROCESS_CORPUS_CACHE
 from simple_uam.craidl.info_files import DesignInfoFiles
+from simple_uam.craidl.designs import StaticDesign
 from attrs import define,field
 from simple_uam.worker import actor
-from time import sleep
+
+from .creo import CreoServer
 
 import json
+import time
+import hashlib
+from datetime import datetime
 from pathlib import Path
+from typing import Dict, Optional
 
 log = get_logger(__name__)
 
+def prepare_info_files(design, workspace=None) -> Dict[str,object]:
+    """
+    Generates the info files for a design without writing them anywhere.
+    Doesn't need a workspace, so it can run before the session starts.
+
+    Arguments:
+       design: The design as returned by json.load or similar.
+       workspace: The workspace number, for logging.
+
+    Returns:
+       Map from info file name to file data.
+    """
+
+    log.info(
+        "Initializing corpus.",
+        workspace=workspace,
+    )
+
+    corpus = get_cached_corpus(
+        config=Config[CraidlConfig]
+    )
+
+    log.info(
+        "Corpus ready.",
+        workspace=workspace,
+        **PROCESS_CORPUS_CACHE.stats,
+    )
+
+    log.info(
+        "Generating info files.",
+        workspace=workspace,
+    )
+
+    return DesignInfoFiles(corpus=corpus, design=design).info_file_map
+
+@define
+class PreparedInfoFiles():
+    """
+    The outcome of generating a design's info files before its session
+    starts. Failures are held on to, rather than raised, so that they can be
+    recorded in the session's result archive like any other failure.
+    """
+
+    info_files : Optional[Dict[str,object]] = field(default=None)
+    """ The info files, if they were generated. """
+
+    error : Optional[Exception] = field(default=None)
+    """ Why the info files couldn't be generated, if they weren't. """
+
+    start : Optional[float] = field(default=None)
+    """ Monotonic time generation started, None if the client sent them. """
+
+    end : Optional[float] = field(default=None)
+    """ Monotonic time generation finished. """
+
+    start_time : Optional[str] = field(default=None)
+    """ When generation started, as an ISO format timestamp. """
+
+    @classmethod
+    def prepare(cls,
+                design,
+                info_files : Optional[Dict[str,object]] = None,
+    ) -> 'PreparedInfoFiles':
+        """
+        Generates the info files for a design, see `prepare_info_files`.
+
+        Arguments:
+           design: The design as returned by json.load or similar.
+           info_files: Info files the client already generated, which are
+             used as is.
+        """
+
+        if info_files != None:
+            return cls(info_files=info_files)
+
+        start_time = datetime.now().isoformat()
+        start = time.monotonic()
+        try:
+            info_files = prepare_info_files(design)
+            error = None
+        except Exception as err:
+            log.exception(
+                "Could not generate info files.",
+                err=err,
+            )
+            error = err
+
+        return cls(
+            info_files=info_files,
+            error=error,
+            start=start,
+            end=time.monotonic(),
+            start_time=start_time,
+        )
+
+    def apply(self, session : Session, design = None) -> Dict[str,object]:
+        """
+        Adds the generation step to the session's op log, then either
+        returns the info files or raises the generation error within the
+        session, so that it ends up in the result archive.
+
+        Arguments:
+           session: The session the info files are for.
+           design: If given, written to the workspace before raising so
+             that the failed design is in the result archive.
+        """
+
+        if self.start != None:
+            session.record_op(
+                "prepare_info_files",
+                start=self.start,
+                end=self.end,
+                start_time=self.start_time,
+                err=self.error,
+            )
+        else:
+            session.metadata['precomputed_info_files'] = True
+
+        if self.error != None:
+            if design != None:
+                session.write_design(design)
+            raise self.error
+
+        return self.info_files
+
+def design_cache_key(manager,
+                     name : str,
+                     design,
+                     info_files : Optional[Dict[str,object]] = None,
+) -> Optional[str]:
+    """
+    The key a design's result is cached under. Equivalent designs, e.g. with
+    components listed in a different order or connections flipped, share a
+    key.
+
+    Arguments:
+       manager: The workspace manager.
+       name: The session name.
+       design: The design as returned by json.load or similar.
+       info_files: Info files sent by the client, which were made from the
+         client's corpus and so are part of the key. Otherwise the info files
+         come from our corpus, whose version is part of the key instead.
+
+    Returns:
+       The key, or None if the result shouldn't be cached.
+    """
+
+    try:
+        design_hash = StaticDesign.from_rep(design).canonical_hash
+    except Exception as err:
+        # Leave reporting malformed designs to the session.
+        log.warning(
+            "Could not hash design, skipping result cache.",
+            err=str(err),
+        )
+        return None
+
+    if info_files != None:
+        info_hash = hashlib.sha256(json.dumps(
+            info_files,
+            sort_keys=True,
+            separators=(',',':'),
+        ).encode()).hexdigest()
+        design_hash = f"{design_hash}:{info_hash}"
+    else:
+        try:
+            corpus_version = cached_corpus_version(
+                config=Config[CraidlConfig],
+            )
+        except Exception as err:
+            log.warning(
+                "Could not identify corpus, skipping result cache.",
+                err=str(err),
+            )
+            return None
+
+        if corpus_version == None:
+            log.info(
+                "Corpus has no version, skipping result cache.",
+            )
+            return None
+
+        design_hash = f"{design_hash}:{corpus_version}"
+
+    return manager.result_cache_key(name, design_hash)
+
 @define
 class D2CSession(Session):
     """
     A workspace session specialized to the direct2cad workflow.
     """
 
+    @property
+    def creo_server(self) -> CreoServer:
+        """
+        The creoson server this session builds CAD with.
+        """
+        return CreoServer.shared(Config[D2CWorkspaceConfig].creo)
+
     @session_op
     def start_creo(self):
         """
-        Runs startCreo.bat in order to ensure that creoson and an instance
-        of creo is running.
-        """
+        Runs startCreo.py in order to ensure that creoson and an instance
+        of creo is running. Reuses an already running instance if
+        configured to.
 
-        log.info(
-            "Starting Creo.",
-            workspace=self.number,
-        )
+        Returns:
+           The job to pass to `CreoServer.finish_job` once the build is done,
+           if reusing the server.
+        """
 
         # For some reason startCreo.bat does nothing now, so we'll just do
         # the same thing in python.
@@ -41,13 +241,21 @@ class D2CSession(Session):
         #     text=True,
         #     )
 
-        self.run(["python", "startCreo.py"])
-        wait_time=5
-        for i in range(1, wait_time):
-            log.info(
-                f"Waiting for Creo Start {i}s / {wait_time}s"
+        if Config[D2CWorkspaceConfig].creo.reuse_server:
+            return self.creo_server.start_job(
+                lambda: self.run(["python", "startCreo.py"])
             )
-            sleep(1)
+
+        log.info(
+            "Starting Creo.",
+            workspace=self.number,
+        )
+
+        self.run(["python", "startCreo.py"])
+        if not self.creo_server.wait_ready():
+            raise RuntimeError("Creo did not become ready in time.")
+
+        return None
 
     @session_op
     def write_design(self, design, out_file="design_swri.json"):
@@ -80,37 +288,30 @@ class D2CSession(Session):
             json.dump(design, fp, indent="  ")
 
     @session_op
-    def gen_info_files(self, design):
+    def gen_info_files(self, design, info_files=None):
         """
         Creates info files in the target directory from the provided design
         data.
 
         Arguments:
            design: The design as returned by json.load or similar.
+           info_files: The info files for the design, as returned by
+             `prepare_info_files`, if they were generated ahead of time.
         """
 
-        log.info(
-            "Initializing corpus.",
-            workspace=self.number,
-        )
-
-        corpus = get_corpus(
-            config=Config[CraidlConfig]
-        )
-
-        log.info(
-            "Generating info files.",
-            workspace=self.number,
-        )
-
-        info_files = DesignInfoFiles(corpus=corpus, design=design)
+        if info_files == None:
+            info_files = prepare_info_files(design, workspace=self.number)
 
         log.info(
             "Writing info files to workspace.",
             workspace=self.number,
         )
 
-        info_files.write_files(self.work_dir)
+        DesignInfoFiles.write_file_map(
+            info_files,
+            self.work_dir,
+            compact=Config[D2CWorkspaceConfig].compact_info_files,
+        )
 
     @session_op
     def build_cad(self):
@@ -118,36 +319,56 @@ class D2CSession(Session):
         Runs buildcad.py on the currently loaded info files,
         leaving changes and parsed results in place for session cleanup
         to manage.
-        """
 
-        self.start_creo()
+        Returns:
+           The completed buildcad.py process.
+        """
 
+        creo_job = self.start_creo()
 
         stdout_file = self.work_dir / 'buildCad.stdout'
         stderr_file = self.work_dir / 'buildCad.stderr'
 
-        backup_file(stdout_file, self.work_dir, delete=True, missing_ok=True)
-        backup_file(stderr_file, self.work_dir, delete=True, missing_ok=True)
+        failed = True
+        try:
+            backup_file(stdout_file, self.work_dir, delete=True, missing_ok=True)
+            backup_file(stderr_file, self.work_dir, delete=True, missing_ok=True)
 
-        log.info(
-            "Starting buildcad.py",
-            workspace=self.number,
-        )
-
-        with stdout_file.open('w') as so, stderr_file.open('w') as se:
-            self.run(
-                ["python", "buildcad.py"],
-                stdout=so,
-                stderr=se,
+            log.info(
+                "Starting buildcad.py",
+                workspace=self.number,
             )
 
+            with stdout_file.open('w') as so, stderr_file.open('w') as se:
+                process = self.run(
+                    ["python", "buildcad.py"],
+                    stdout=so,
+                    stderr=se,
+                )
+            failed = process.returncode != 0
+        finally:
+            # Never serve a failed build from the result cache.
+            if failed:
+                self.metadata.pop('cache_key', None)
+
+            # Only restarts Creo if the failure left it unhealthy.
+            if creo_job != None:
+                self.creo_server.finish_job(creo_job, failed=failed)
+
+        return process
+
     @session_op
-    def process_design(self, design):
+    def process_design(self, design, info_files=None):
         """
         Runs the chain of operations needed to process a single uam design
         and produce FDM, cad, and other output.
+
+        Arguments:
+           design: The design as returned by json.load or similar.
+           info_files: The info files for the design, as returned by
+             `prepare_info_files`, if they were generated ahead of time.
         """
 
         self.write_design(design)
-        self.gen_info_files(design)
+        self.gen_info_files(design, info_files=info_files)
         self.build_cad()
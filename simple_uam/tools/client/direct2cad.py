@@ -4,19 +4,26 @@ Various setup and development tasks for SimpleUAM Utility Modules.
 
 import json
 import time
+import queue
 import shutil
-import zipfile
 import dramatiq
 import subprocess
 
-from typing import Optional, Union
+from typing import Optional, Union, List, Dict, Iterator, Tuple
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from simple_uam.util.invoke import task, call
-from simple_uam.util.config import Config, PathConfig, BrokerConfig
+from simple_uam.util.config import Config, PathConfig, BrokerConfig, \
+    D2CWorkspaceConfig, CraidlConfig
 from simple_uam.util.logging import get_logger
 from simple_uam import direct2cad
-from simple_uam.worker import has_backend
+from simple_uam.worker import has_backend, routed_message, send_routed
+from simple_uam.workspace import ResultsIndex
+from simple_uam.util.system import is_archive, read_archive_json
+from simple_uam.craidl.corpus import get_cached_corpus
+from simple_uam.craidl.designs import DesignValidator, DesignError
+from simple_uam.craidl.info_files import DesignInfoFiles
 
 log = get_logger(__name__)
 
@@ -49,6 +56,87 @@ def load_metadata(metadata_file : Union[Path,str,None]) -> dict:
             raise RuntimeError("Metadata must be JSON serializable dictionary.")
         return meta
 
+def preflight_designs(designs : Dict[str,object],
+                      validate : bool = True,
+                      precompute : bool = False,
+                      static : Union[Path,str,None] = None,
+) -> Tuple[Dict[str,List[DesignError]], Dict[str,Dict]]:
+    """
+    Checks designs against a local static corpus before they're sent, so
+    that malformed designs fail on the client instead of tying up a worker,
+    and optionally generates their info files so the workers don't have to.
+
+    Without a static corpus on the client designs are only checked for
+    internal consistency, precomputing info files needs the corpus.
+
+    Arguments:
+      designs: Map from a key, e.g. the design file, to a design.
+      validate: Whether to check the designs.
+      precompute: Whether to generate the info files for the valid designs.
+      static: The static corpus to use, defaults to the configured one.
+
+    Returns:
+      A tuple of the errors for each invalid design and the info files for
+      each valid design, each keyed like `designs`.
+    """
+
+    errors = dict()
+    info_files = dict()
+
+    if not validate and not precompute:
+        return (errors, info_files)
+
+    corpus = None
+    corpus_file = Path(static or Config[CraidlConfig].static_corpus)
+
+    if corpus_file.exists():
+        log.info(
+            "Loading local corpus for pre-flight checks.",
+            corpus_file=str(corpus_file),
+        )
+        corpus = get_cached_corpus(
+            config=Config[CraidlConfig],
+            static=corpus_file,
+        )
+    elif precompute:
+        err = RuntimeError(
+            f"Cannot precompute info files, no static corpus at {corpus_file}.")
+        log.exception(
+            "Precomputing info files needs a local static corpus.",
+            corpus_file=str(corpus_file),
+            err=err,
+        )
+        raise err
+    else:
+        log.warning(
+            "No local static corpus, only checking design consistency.",
+            corpus_file=str(corpus_file),
+        )
+
+    if validate:
+        if corpus:
+            validator = DesignValidator.for_designs(corpus, designs.values())
+        else:
+            validator = DesignValidator()
+        errors = validator.validate_all(designs)
+
+    if precompute:
+        for key, design in designs.items():
+            if key not in errors:
+                info_files[key] = DesignInfoFiles(
+                    corpus=corpus,
+                    design=design,
+                ).info_file_map
+
+    log.info(
+        "Pre-flight checks finished.",
+        num_designs=len(designs),
+        invalid=len(errors),
+        precomputed=len(info_files),
+    )
+
+    return (errors, info_files)
+
 def wait_on_result(
         msg: dramatiq.Message,
         interval: int = 10,
@@ -56,35 +144,36 @@ def wait_on_result(
     """
     Uses the dramatiq backend mechanism to wait on a result from a worker.
 
+    This blocks on the backend, which pushes the result to us as soon as the
+    worker stores it, rather than checking for it once per interval.
+
     Arguments:
       msg: The message from the dramatiq send call.
-      interval: The time, in seconds, to wait between each check of the backend.
+      interval: The time, in seconds, between each progress log entry while
+        we're waiting.
       timeout: The total time, in seconds, to wait for a result before giving up.
     """
 
+    start = time.monotonic()
     elapsed = 0
-    result = None
 
     # Loop until result found
-    while not result:
+    while True:
 
-        # Try to get Result
+        # Block on the backend for the rest of this interval
+        # (The redis backend only blocks in whole seconds.)
+        wait = max(min(interval, timeout - elapsed), 1)
         try:
-            log.info(f"Checking for result @ {elapsed}s")
-            result = msg.get_result(block=False)
+            log.info(f"Waiting for result @ {int(elapsed)}s")
+            return msg.get_result(block=True, timeout=int(wait * 1000))
 
         # If no result yet
-        except dramatiq.results.ResultMissing as err:
+        except dramatiq.results.ResultTimeout as err:
 
             # Check if we're timed out
+            elapsed = time.monotonic() - start
             if elapsed >= timeout:
-                raise RuntimeError(f"No result found by {elapsed}s")
-
-            # Else wait another interval
-            elapsed += interval
-            time.sleep(interval)
-
-    return result
+                raise RuntimeError(f"No result found by {int(elapsed)}s")
 
 def get_result_archive_path(
         result: object,
@@ -102,45 +191,128 @@ def get_result_archive_path(
 
     return results_dir / raw_path.name
 
-def get_zip_metadata(
-        zip_file: Path) -> Optional[object]:
+def open_results_index(results_dir: Path) -> Optional[ResultsIndex]:
+    """
+    Opens the index the workers keep of the archives in the results dir, if
+    there is one.
+
+    Arguments:
+      results_dir: The directory in which all the results will appear.
+    """
+
+    config = Config[D2CWorkspaceConfig]
+
+    if not config.results.index_file:
+        return None
+
+    # Take the same lock as the workers, wherever the config puts it.
+    return ResultsIndex(
+        index_file=results_dir / config.results.index_file,
+        lock_file=config.results_index_lockfile,
+    )
+
+def lookup_result_archive(
+        msg: dramatiq.Message,
+        results_dir: Path,
+        index: Optional[ResultsIndex]) -> Optional[Path]:
     """
-    Returns the contents of the zip's metadata.json, if it has one.
+    Finds the archive for a message in the results index without opening
+    any archives.
 
     Arguments:
-      zip_file: The part to the zip we're opening.
+      msg: The dramatiq message we're looking for.
+      results_dir: The directory in which all the results will appear.
+      index: The results index, from `open_results_index`.
     """
 
-    # Open Zip file
-    with zipfile.ZipFile(zip_file) as zip:
+    if not index:
+        return None
 
-        meta_file = zipfile.Path(zip) / 'metadata.json'
+    record = index.lookup(msg.message_id)
+    if not record:
+        return None
 
-        # Check if `metadata.json` exists
-        if not meta_file.exists() and meta_file.is_file():
-            log.info(f"Zip '{str(zip_file)}' has no metadata.json")
-            return None
+    archive = results_dir / record['archive']
+    return archive if archive.is_file() else None
 
-        # If yes, decode its contents
-        with meta_file.open('r') as meta:
-            return json.load(meta)
+def archive_message_id(
+        archive: Path,
+        index: Optional[ResultsIndex] = None) -> Optional[str]:
+    """
+    Gets the id of the message that produced a result archive, if any.
+    Uses the results index when the archive is in it, and opens the archive
+    otherwise.
+
+    Arguments:
+      archive: The result archive to check.
+      index: The results index, from `open_results_index`.
+    """
+
+    record = index.get(archive.name) if index else None
+    if record:
+        return record.get('message_id')
+
+    metadata = read_archive_json(archive, 'metadata.json')
+
+    if not metadata:
+        return None
+
+    return metadata.get('message_info',dict()).get('message_id')
 
 def match_msg_to_zip(
         msg: dramatiq.Message,
-        zip_file: Path) -> bool:
+        zip_file: Path,
+        index: Optional[ResultsIndex] = None) -> bool:
     """
     Checks whether the given message produced the given zip archive.
 
     Arguments:
       msg: The dramatiq message we're checking against
       zip_file: The path to the zip we're verifying
+      index: The results index, if available, which saves opening the zip.
+    """
+
+    return msg.message_id == archive_message_id(zip_file, index)
+
+def results_dir_events(results_dir: Path):
+    """
+    Starts watching a directory for new files with the optional 'watchdog'
+    package, which uses inotify on linux and the native equivalents
+    elsewhere.
+
+    Arguments:
+      results_dir: The dir to watch.
+
+    Returns:
+      None if 'watchdog' isn't available, otherwise a tuple of the running
+      observer and a queue which receives the path of each file that's
+      created in, or moved into, the results dir.
     """
 
-    msg_id = msg.message_id
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        log.info("The 'watchdog' package isn't installed, polling results dir.")
+        return None
+
+    events = queue.Queue()
+
+    class NewFileHandler(FileSystemEventHandler):
+
+        def on_created(self, event):
+            if not event.is_directory:
+                events.put(Path(event.src_path))
 
-    metadata = get_zip_metadata(zip_file)
+        def on_moved(self, event):
+            if not event.is_directory:
+                events.put(Path(event.dest_path))
 
-    return metadata and msg_id == metadata.get('message_info',dict()).get('message_id')
+    observer = Observer()
+    observer.schedule(NewFileHandler(), str(results_dir), recursive=False)
+    observer.start()
+
+    return (observer, events)
 
 def watch_results_dir(
         msg: dramatiq.Message,
@@ -148,47 +320,82 @@ def watch_results_dir(
         interval: int = 10,
         timeout: int = 600) -> Path:
     """
-    Checks directory every interval to see if any of the zip files match the
-    provided message.
+    Watches the results dir for an archive that matches the provided message.
 
-    We recommend using
+    If the 'watchdog' package is installed, new archives are checked as soon
+    as they appear. Otherwise the directory is checked for new archives every
+    interval.
 
     Arguments:
       msg: The message we sent to the broker
       results_dir: dir to look for results archive in
-      interval: delay between each check of the results_dir
+      interval: delay between each full check of the results_dir
       timeout: time to search for archive before giving up
     """
 
+    start = time.monotonic()
     elapsed = 0
-    seen = dict()
+    seen = set()
 
-    # Wait till we're out of time or have a result
-    while elapsed <= timeout:
-        log.info(f"Checking for result @ {elapsed}s")
-        for zip_file in results_dir.iterdir():
+    def check(archive : Path) -> bool:
+        """ Checks a single file, only opening each archive once. """
 
-            # Check if file is a valid zip
-            valid_zip = zip_file.is_file()
-            valid_zip = valid_zip and '.zip' == zip_file.suffix
-            valid_zip = valid_zip and zip_file not in seen
+        if archive in seen or not is_archive(archive):
+            return False
+        if not archive.is_file():
+            return False
 
-            # Skip further checks if not zip
-            if not valid_zip:
-                continue
+        seen.add(archive)
+        log.info(f"Checking result archive: {str(archive)}")
+        return match_msg_to_zip(msg, archive, index)
 
-            # return file if match found, else mark as seen.
-            log.info(f"Checking zip file: {str(zip_file)}")
-            if match_msg_to_zip(msg, zip_file):
-                return zip_file
-            else:
-                seen[zip_file] = True # Using seen as set
+    # Start watching before the first scan so no new archive can be missed.
+    watch = results_dir_events(results_dir)
+    index = open_results_index(results_dir)
+
+    try:
+        # Wait till we're out of time or have a result
+        while elapsed <= timeout:
+
+            # Full scan, catches archives written before we started watching
+            # and ones we could have missed if events aren't reliable (e.g.
+            # some network shares).
+            log.info(f"Checking for result @ {int(elapsed)}s")
+            archive = lookup_result_archive(msg, results_dir, index)
+            if archive:
+                return archive
+            for archive in results_dir.iterdir():
+                if check(archive):
+                    return archive
 
-        # Wait for next interval
-        elapsed += interval
-        time.sleep(interval)
+            # Wait for next interval, handling new files as they appear
+            deadline = min(start + timeout, time.monotonic() + interval)
+            while True:
 
-    raise RuntimeError(f"No result found by {elapsed}s")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                if not watch:
+                    time.sleep(remaining)
+                    break
+
+                try:
+                    archive = watch[1].get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+                if check(archive):
+                    return archive
+
+            elapsed = time.monotonic() - start
+
+        raise RuntimeError(f"No result found by {int(elapsed)}s")
+
+    finally:
+        if watch:
+            watch[0].stop()
+            watch[0].join()
 
 def run_d2c_task(task,
                  design_file: Union[Path,str],
@@ -197,7 +404,12 @@ def run_d2c_task(task,
                  timeout: int = 600,
                  interval: int = 10,
                  backend: bool = False,
-                 polling: bool = False):
+                 polling: bool = False,
+                 validate: bool = True,
+                 precompute: bool = False,
+                 static: Union[Path,str,None] = None,
+                 queue: Optional[str] = None,
+                 priority: Optional[int] = None):
     """
     Runs a d2c client task.
 
@@ -207,10 +419,18 @@ def run_d2c_task(task,
       results_dir: the directory in which to look for results
       metadata_file: optional metadata file to include in metadata.json
       timeout: time to keep looking for results before giving up
-      interval: interval with which to check for new results from the backend
-        or the poll the results dir for new zip files.
+      interval: interval with which to log progress while waiting on the
+        backend, or to rescan the results dir for new archives.
       backend: force use of result backend
       polling: force use of polling
+      validate: check the design against the local static corpus before
+        sending it, see `preflight_designs`.
+      precompute: generate the info files on the client and send them with
+        the design.
+      static: the local static corpus, defaults to the configured one.
+      queue: the queue to send the design to, defaults to the task's.
+      priority: the message priority, higher runs sooner, see
+        `simple_uam.worker.routed_message`.
     """
 
     if not design_file:
@@ -236,9 +456,40 @@ def run_d2c_task(task,
     )
     metadata = load_metadata(metadata_file)
 
+    # Catch bad designs before they take up a worker
+    errors, info_files = preflight_designs(
+        {str(design_file): design},
+        validate=validate,
+        precompute=precompute,
+        static=static,
+    )
+
+    if errors:
+        err = RuntimeError(
+            f"Design {str(design_file)} is invalid:\n" + "\n".join(
+                f"  - {e}" for e in errors[str(design_file)]))
+        log.exception(
+            "Design failed pre-flight checks.",
+            design_file=str(design_file),
+            errors=[e.rep for e in errors[str(design_file)]],
+            err=err,
+        )
+        raise err
+
+    # Only send info files when we have them so older workers still work.
+    kwargs = dict(metadata=metadata)
+    if str(design_file) in info_files:
+        kwargs['info_files'] = info_files[str(design_file)]
+
     # Send the design to worker
     log.info("Sending Design to Broker")
-    msg = task.send(design, metadata=metadata)
+    msg = send_routed(
+        task,
+        design,
+        queue_name=queue,
+        priority=priority,
+        **kwargs,
+    )
 
     # Wait for the result to appear
     log.info("Waiting for results")
@@ -271,7 +522,7 @@ def run_d2c_task(task,
             timeout=timeout,
             interval=interval,
         )
-        result = get_zip_metadata(result_archive)
+        result = read_archive_json(result_archive, 'metadata.json')
 
         log.info(
             "Result archive found in results dir",
@@ -281,6 +532,312 @@ def run_d2c_task(task,
 
     return result_archive
 
+def collect_backend_results(
+        msgs: List[dramatiq.Message],
+        results_dir: Path,
+        concurrency: int = 8,
+        interval: int = 10,
+        timeout: int = 600) -> Iterator[Tuple[dramatiq.Message,Optional[Path],Optional[Exception]]]:
+    """
+    Waits on the backend for the results of many messages, yielding each one
+    as it completes.
+
+    Arguments:
+      msgs: The messages we sent to the broker.
+      results_dir: The directory in which all the results will appear.
+      concurrency: The number of messages to wait on at once. A message's
+        timeout starts when we begin waiting on it.
+      interval: The time, in seconds, between progress log entries.
+      timeout: The time, in seconds, to wait for each result.
+
+    Yields:
+      (message, result archive, None) for each successful message and
+      (message, None, error) for each failure, in completion order.
+    """
+
+    def wait(msg):
+        result = wait_on_result(msg, interval=interval, timeout=timeout)
+        return get_result_archive_path(result, results_dir)
+
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+        futures = {pool.submit(wait, msg): msg for msg in msgs}
+        for future in as_completed(futures):
+            try:
+                yield (futures[future], future.result(), None)
+            except Exception as err:
+                yield (futures[future], None, err)
+
+def collect_results_dir(
+        msgs: List[dramatiq.Message],
+        results_dir: Path,
+        concurrency: int = 8,
+        interval: int = 10,
+        timeout: int = 600) -> Iterator[Tuple[dramatiq.Message,Optional[Path],Optional[Exception]]]:
+    """
+    Watches the results dir for the archives of many messages, yielding each
+    one as it appears. Archives in the results index aren't opened at all,
+    and others are opened once no matter how many messages we're waiting on.
+
+    Arguments:
+      msgs: The messages we sent to the broker.
+      results_dir: The dir to look for result archives in.
+      concurrency: The number of messages whose timeout is running at once.
+        A message's timeout starts when we begin waiting on it.
+      interval: delay between each full check of the results_dir
+      timeout: The time, in seconds, to wait for each result.
+
+    Yields:
+      (message, result archive, None) for each successful message and
+      (message, None, error) for each failure, in completion order.
+    """
+
+    pending = list(msgs)
+    pending.reverse()
+    active = dict()
+    found = dict()
+    seen = set()
+
+    def check(archive : Path):
+        """ Records which message produced an archive. """
+
+        if archive in seen or not is_archive(archive):
+            return
+        if not archive.is_file():
+            return
+
+        seen.add(archive)
+        msg_id = archive_message_id(archive, index)
+        if msg_id:
+            found[msg_id] = archive
+
+    watch = results_dir_events(results_dir)
+    index = open_results_index(results_dir)
+    last_scan = None
+
+    try:
+        while pending or active:
+
+            # Start the timeouts of as many messages as we're allowed
+            while pending and len(active) < max(concurrency, 1):
+                msg = pending.pop()
+                active[msg.message_id] = (msg, time.monotonic() + timeout)
+
+            # Full scan every interval, catches archives we have no events
+            # for.
+            if last_scan == None or time.monotonic() - last_scan >= interval:
+                log.info(
+                    "Scanning results dir.",
+                    waiting=len(active),
+                    pending=len(pending),
+                )
+                last_scan = time.monotonic()
+                for msg_id, (msg, _) in active.items():
+                    archive = lookup_result_archive(msg, results_dir, index)
+                    if archive:
+                        found[msg_id] = archive
+                for archive in results_dir.iterdir():
+                    check(archive)
+
+            # Yield completed and timed out messages
+            now = time.monotonic()
+            for msg_id, (msg, deadline) in list(active.items()):
+                if msg_id in found:
+                    del active[msg_id]
+                    yield (msg, found[msg_id], None)
+                elif now >= deadline:
+                    del active[msg_id]
+                    yield (msg, None, RuntimeError(
+                        f"No result found by {timeout}s"))
+
+            if not active and not pending:
+                break
+
+            # Wait for new files until the next scan or deadline
+            next_deadline = min(deadline for _, deadline in active.values()) \
+                if active else now
+            wait = min(last_scan + interval, next_deadline) - time.monotonic()
+
+            if wait <= 0:
+                continue
+            elif not watch:
+                time.sleep(wait)
+            else:
+                try:
+                    check(watch[1].get(timeout=wait))
+                    while True:
+                        check(watch[1].get_nowait())
+                except queue.Empty:
+                    pass
+
+    finally:
+        if watch:
+            watch[0].stop()
+            watch[0].join()
+
+def run_d2c_batch(task,
+                  designs_dir: Union[Path,str],
+                  results_dir: Union[Path,str],
+                  metadata_file: Union[Path,str,None],
+                  pattern: str = '*.json',
+                  concurrency: int = 8,
+                  timeout: int = 600,
+                  interval: int = 10,
+                  backend: bool = False,
+                  polling: bool = False,
+                  validate: bool = True,
+                  precompute: bool = False,
+                  static: Union[Path,str,None] = None,
+                  queue: Optional[str] = None,
+                  priority: Optional[int] = None) -> List[Dict]:
+    """
+    Runs a d2c client task on every design in a directory.
+
+    All the designs are sent to the broker up front, as a single group, and
+    their results are collected in the order they complete.
+
+    Arguments:
+      task: the task to run
+      designs_dir: the dir to load the designs from
+      results_dir: the directory in which to look for results
+      metadata_file: optional metadata file to include in metadata.json
+      pattern: glob pattern for the design files in designs_dir
+      concurrency: the number of results to wait on at once
+      timeout: time to keep looking for each result before giving up
+      interval: interval with which to log progress while waiting on the
+        backend, or to rescan the results dir for new archives.
+      backend: force use of result backend
+      polling: force use of polling
+      validate: check the designs against the local static corpus before
+        sending them, invalid designs aren't sent.
+      precompute: generate the info files on the client and send them with
+        the designs.
+      static: the local static corpus, defaults to the configured one.
+      queue: the queue to send the designs to, defaults to the task's.
+      priority: the message priority, higher runs sooner, see
+        `simple_uam.worker.routed_message`.
+
+    Returns:
+      A summary entry for each design, invalid designs first and then the
+      rest in completion order.
+    """
+
+    if not designs_dir:
+        raise RuntimeError("Designs dir argument is mandatory.")
+    designs_dir = Path(designs_dir)
+
+    if not results_dir:
+        raise RuntimeError("Results dir argument is mandatory.")
+    results_dir = Path(results_dir)
+
+    design_files = sorted(f for f in designs_dir.glob(pattern) if f.is_file())
+
+    if len(design_files) == 0:
+        raise RuntimeError(
+            f"No designs matching '{pattern}' found in {str(designs_dir)}.")
+
+    # Load the metadata from file
+    log.info(
+        "Loading Metadata (if provided)",
+        metadata_file = metadata_file,
+    )
+    metadata = load_metadata(metadata_file)
+
+    # Build a message for each design
+    log.info(
+        "Loading Designs",
+        designs_dir=str(designs_dir),
+        num_designs=len(design_files),
+    )
+    designs = {
+        str(design_file) : load_design(design_file)
+        for design_file in design_files
+    }
+
+    # Catch bad designs before they take up a worker
+    start = time.monotonic()
+    errors, info_files = preflight_designs(
+        designs,
+        validate=validate,
+        precompute=precompute,
+        static=static,
+    )
+
+    summary = list()
+    for design_file, design_errors in errors.items():
+        entry = dict(
+            design_file=design_file,
+            message_id=None,
+            status='invalid',
+            result_archive=None,
+            error="\n".join(str(e) for e in design_errors),
+            elapsed=time.monotonic() - start,
+        )
+        summary.append(entry)
+        log.warning("Design failed pre-flight checks, not sending.", **entry)
+
+    msgs = list()
+    msg_files = dict()
+    for design_file, design in designs.items():
+        if design_file in errors:
+            continue
+        kwargs = dict(metadata=metadata)
+        if design_file in info_files:
+            kwargs['info_files'] = info_files[design_file]
+        msg = routed_message(
+            task,
+            design,
+            queue_name=queue,
+            priority=priority,
+            **kwargs,
+        )
+        msgs.append(msg)
+        msg_files[msg.message_id] = design_file
+
+    # Send all the designs to the workers
+    log.info("Sending Designs to Broker", num_designs=len(msgs))
+    if msgs:
+        dramatiq.group(msgs).run()
+
+    # Collect results as they complete
+    log.info("Waiting for results")
+    use_backend = backend or (has_backend() and not polling)
+    collect = collect_backend_results if use_backend else collect_results_dir
+
+    for msg, result_archive, err in collect(
+            msgs,
+            results_dir,
+            concurrency=concurrency,
+            interval=interval,
+            timeout=timeout):
+
+        entry = dict(
+            design_file=msg_files[msg.message_id],
+            message_id=msg.message_id,
+            status='ok' if err == None else 'failed',
+            result_archive=str(result_archive) if result_archive else None,
+            error=str(err) if err != None else None,
+            elapsed=time.monotonic() - start,
+        )
+        summary.append(entry)
+
+        log.info(
+            "Design finished.",
+            completed=len(summary),
+            total=len(designs),
+            **entry,
+        )
+
+    log.info(
+        "Batch finished.",
+        total=len(summary),
+        succeeded=len([e for e in summary if e['status'] == 'ok']),
+        failed=len([e for e in summary if e['status'] == 'failed']),
+        invalid=len([e for e in summary if e['status'] == 'invalid']),
+        elapsed=time.monotonic() - start,
+    )
+
+    return summary
+
 @task
 def gen_info_files(ctx,
                    design='design_swri.json',
@@ -289,7 +846,12 @@ def gen_info_files(ctx,
                    timeout=600,
                    interval=10,
                    backend=False,
-                   polling=False):
+                   polling=False,
+                   validate=True,
+                   precompute=False,
+                   static=None,
+                   queue=None,
+                   priority=None):
     """
     Will write the design info files in the specified
     workspace, and create a new result archive with only the newly written data.
@@ -302,10 +864,18 @@ def gen_info_files(ctx,
       metadata: The json-format metadata file to include with the query.
         Should be a dictionary.
       timeout: time, in seconds, to keep looking for results before giving up.
-      interval: interval, in seconds, with which to check for new results from
-        the backend or the poll the results dir for new zip files.
+      interval: interval, in seconds, with which to log progress while
+        waiting on the backend, or to rescan the results dir for new archives.
       backend: force use of result backend
       polling: force use of polling
+      validate: check designs against the local static corpus before sending
+        them. (Default: True)
+      precompute: generate the info files locally and send them with the
+        designs, so workers can skip that step. (Default: False)
+      static: The local static corpus. (Default: As configured)
+      queue: The queue to send to. (Default: As configured for the task)
+      priority: The message priority, higher runs sooner. Needs rabbitmq
+        with `routing.max_priority` set in the broker config.
     """
 
     result_archive = run_d2c_task(
@@ -317,6 +887,11 @@ def gen_info_files(ctx,
         timeout=timeout,
         backend=backend,
         polling=polling,
+        validate=validate,
+        precompute=precompute,
+        static=static,
+        queue=queue,
+        priority=None if priority == None else int(priority),
     )
 
     print(result_archive)
@@ -329,7 +904,12 @@ def process_design(ctx,
                    timeout=600,
                    interval=10,
                    backend=False,
-                   polling=False):
+                   polling=False,
+                   validate=True,
+                   precompute=False,
+                   static=None,
+                   queue=None,
+                   priority=None):
     """
     Runs the direct2cad pipeline on the input design files, producing output
     metadata and a result archive with all the generated files.
@@ -341,10 +921,18 @@ def process_design(ctx,
       metadata: The json-format metadata file to include with the query.
         Should be a dictionary.
       timeout: time, in seconds, to keep looking for results before giving up.
-      interval: interval, in seconds, with which to check for new results from
-        the backend or the poll the results dir for new zip files.
+      interval: interval, in seconds, with which to log progress while
+        waiting on the backend, or to rescan the results dir for new archives.
       backend: force use of result backend
       polling: force use of polling
+      validate: check designs against the local static corpus before sending
+        them. (Default: True)
+      precompute: generate the info files locally and send them with the
+        designs, so workers can skip that step. (Default: False)
+      static: The local static corpus. (Default: As configured)
+      queue: The queue to send to. (Default: As configured for the task)
+      priority: The message priority, higher runs sooner. Needs rabbitmq
+        with `routing.max_priority` set in the broker config.
     """
 
     result_archive = run_d2c_task(
@@ -356,6 +944,81 @@ def process_design(ctx,
         interval=interval,
         backend=backend,
         polling=polling,
+        validate=validate,
+        precompute=precompute,
+        static=static,
+        queue=queue,
+        priority=None if priority == None else int(priority),
     )
 
     print(result_archive)
+
+@task
+def process_designs(ctx,
+                    designs=None,
+                    results=None,
+                    metadata=None,
+                    pattern='*.json',
+                    concurrency=8,
+                    timeout=600,
+                    interval=10,
+                    summary=None,
+                    backend=False,
+                    polling=False,
+                    validate=True,
+                    precompute=False,
+                    static=None,
+                    queue=None,
+                    priority=None):
+    """
+    Runs the direct2cad pipeline on every design file in a directory. All the
+    designs are queued at once and results are collected as they complete.
+    Writes a JSON summary of every design's result to stdout.
+
+    Arguments:
+      designs: The directory to read design files from. (Mandatory)
+      results: Where results files are placed. (Mandatory)
+      metadata: The json-format metadata file to include with each query.
+        Should be a dictionary.
+      pattern: Glob pattern for the design files within the designs dir.
+      concurrency: The number of results to wait on at once.
+      timeout: time, in seconds, to keep looking for each result before
+        giving up on it.
+      interval: interval, in seconds, with which to log progress while
+        waiting on the backend, or to rescan the results dir for new archives.
+      summary: Optional file to also write the JSON summary to.
+      backend: force use of result backend
+      polling: force use of polling
+      validate: check designs against the local static corpus before sending
+        them. (Default: True)
+      precompute: generate the info files locally and send them with the
+        designs, so workers can skip that step. (Default: False)
+      static: The local static corpus. (Default: As configured)
+      queue: The queue to send to. (Default: As configured for the task)
+      priority: The message priority, higher runs sooner. Needs rabbitmq
+        with `routing.max_priority` set in the broker config.
+    """
+
+    report = run_d2c_batch(
+        direct2cad.process_design,
+        designs_dir=designs,
+        results_dir=results,
+        metadata_file=metadata,
+        pattern=pattern,
+        concurrency=int(concurrency),
+        timeout=int(timeout),
+        interval=int(interval),
+        backend=backend,
+        polling=polling,
+        validate=validate,
+        precompute=precompute,
+        static=static,
+        queue=queue,
+        priority=None if priority == None else int(priority),
+    )
+
+    if summary:
+        with Path(summary).open('w') as fp:
+            json.dump(report, fp, indent="  ")
+
+    print(json.dumps(report, indent="  "))
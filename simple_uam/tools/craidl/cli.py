@@ -61,9 +61,11 @@ def main(args: Optional[List[str]] = None) -> int:
     static_corpus_ns = Collection()
     static_corpus_ns.add_task(tasks.copy_static_corpus, 'copy')
     static_corpus_ns.add_task(tasks.gen_static_corpus, 'generate')
+    static_corpus_ns.add_task(tasks.index_static_corpus, 'index')
 
     namespace = Collection(
         tasks.gen_info_files,
+        tasks.validate_designs,
     )
     namespace.add_collection(examples_ns, 'examples')
     namespace.add_collection(server_ns, 'stub_server')
@@ -7,9 +7,12 @@ from simple_uam.util.invoke import task, call
 from simple_uam.util.config import Config, PathConfig, CraidlConfig
 from simple_uam.util.logging import get_logger
 
-from simple_uam.craidl.corpus import GremlinCorpus, StaticCorpus, get_corpus
+from simple_uam.craidl.corpus import GremlinCorpus, StaticCorpus, get_corpus, \
+    IndexedStaticCorpus, load_static_corpus
+from simple_uam.craidl.corpus.indexed import is_indexed_corpus
 from simple_uam.craidl.info_files import DesignInfoFiles
-from simple_uam.util.system import backup_file
+from simple_uam.craidl.designs import validate_designs as check_designs
+from simple_uam.util.system import backup_file, replace_file
 
 from .examples import *
 from pathlib import Path
@@ -52,16 +55,15 @@ def copy_static_corpus(ctx,
         return
     elif output.exists() and backup:
         log.info(
-            "Found existing corpus dump, creating backup and removing.",
+            "Found existing corpus dump, creating backup.",
             output=str(output),
         )
-        backup_file(output, delete=True)
+        backup_file(output)
     elif output.exists():
         log.warning(
-            "Found existing corpus dump, deleting.",
+            "Found existing corpus dump, it will be replaced.",
             output=str(output),
         )
-        output.unlink()
 
     log.info(
         "Copying corpus data into location.",
@@ -69,8 +71,65 @@ def copy_static_corpus(ctx,
         output_corpus = str(output),
     )
 
-    output.parent.mkdir(parents=True, exist_ok=True)
-    shutil.copy2(input, output)
+    # Workers may have the old corpus mmap'd, so replace it rather than
+    # overwriting it in place.
+    with replace_file(output, 'wb') as fp, input.open('rb') as ip:
+        shutil.copyfileobj(ip, fp)
+    shutil.copystat(input, output)
+
+@task
+def index_static_corpus(ctx,
+                        input = None,
+                        output = None,
+                        backup = True):
+    """
+    Converts a static corpus into the indexed format, which loads much faster
+    and uses less memory in each worker process.
+
+    Arguments:
+      input: The static corpus to convert, defaults to the configured static
+        corpus.
+      output: Where to write the indexed corpus, defaults to overwriting the
+        input.
+      backup: Should we create a backup if there's a preexisting output file?
+    """
+
+    if input == None:
+        input = Config[CraidlConfig].static_corpus
+    input = Path(input)
+
+    if output == None:
+        output = input
+    output = Path(output)
+
+    if output == input and is_indexed_corpus(input):
+        log.info(
+            "Static corpus is already indexed, skipping further operations.",
+            input_corpus=str(input),
+        )
+        return
+
+    log.info(
+        "Reading static corpus.",
+        input_corpus=str(input),
+    )
+
+    rep = load_static_corpus(input).to_rep()
+
+    if output.exists() and backup:
+        log.info(
+            "Found existing output file, creating backup.",
+            output=str(output),
+        )
+        backup_file(output)
+
+    log.info(
+        "Writing indexed static corpus.",
+        output_corpus=str(output),
+        num_components=len(rep),
+    )
+
+    IndexedStaticCorpus.write(rep, output)
 
 corpus_cache = Config[CraidlConfig].static_corpus_cache
 
@@ -85,7 +144,8 @@ def gen_static_corpus(ctx,
                       backup = True,
                       cache = True,
                       cache_dir = corpus_cache,
-                      cluster_size = 50):
+                      cluster_size = 50,
+                      workers = None):
     """
     Generates a static corpus from a running corpus server.
 
@@ -100,7 +160,10 @@ def gen_static_corpus(ctx,
       backup: Should we create a backup if there's a preexisting output file?
       cache: Should we use a cache to generate this corpus?
       cache_dir: What directory should we use as a cache?
-      cluster_size: If we're using a cache
+      cluster_size: If we're using a cache, the number of components in
+        each cached cluster.
+      workers: The number of clusters to read at once, each with its own
+        connection to the server. Defaults to the configured value.
 
     All three arguments will default to values from 'CraidlConfig' if not
     specified.
@@ -119,6 +182,9 @@ def gen_static_corpus(ctx,
     else:
         force = True
 
+    if workers == None:
+        workers = Config[CraidlConfig].static_corpus_workers
+
     output = Path(output)
     cache_dir = Path(cache_dir)
 
@@ -132,16 +198,15 @@ def gen_static_corpus(ctx,
         return
     elif output.exists() and backup:
         log.info(
-            "Found existing corpus dump, creating backup and removing.",
+            "Found existing corpus dump, creating backup.",
             output=str(output),
         )
-        backup_file(output, delete=True)
+        backup_file(output)
     elif output.exists():
         log.warning(
-            "Found existing corpus dump, deleting.",
+            "Found existing corpus dump, it will be replaced.",
             output=str(output),
         )
-        output.unlink()
 
     ### Init cache
 
@@ -197,15 +262,27 @@ def gen_static_corpus(ctx,
 
     gremlin_corpus = GremlinCorpus(host=host, port=port)
 
-    log.info(
-        "Starting dump to static corpus.")
+    # Extra connections are only needed when reading in parallel.
+    factory = None
+    if int(workers) > 1:
+        factory = lambda: GremlinCorpus(host=host, port=port)
 
-    static_corpus = StaticCorpus.from_corpus(
-        gremlin_corpus,
-        cache_dir = cache_dir if cache else None,
-        cluster_size = cluster_size,
+    log.info(
+        "Starting dump to static corpus.",
+        workers=workers,
     )
 
+    try:
+        static_corpus = StaticCorpus.from_corpus(
+            gremlin_corpus,
+            cache_dir = cache_dir if cache else None,
+            cluster_size = cluster_size,
+            workers = int(workers),
+            corpus_factory = factory,
+        )
+    finally:
+        gremlin_corpus.close()
+
     ### Output Corpus
 
     log.info(
@@ -213,7 +290,7 @@ def gen_static_corpus(ctx,
         output=str(output),
     )
 
-    with output.open('w') as fp:
+    with replace_file(output) as fp:
         static_corpus.dump_json(fp)
 
 
@@ -225,7 +302,8 @@ def gen_info_files(ctx,
                    copy_design = False,
                    static = None,
                    host = None,
-                   port = None):
+                   port = None,
+                   compact = False):
     """
     Generates the info files for a given design.
 
@@ -242,6 +320,7 @@ def gen_info_files(ctx,
         Mutually exclusive with static. Default: As configured
       port: The port of the corpus server to use when generating the files.
         Mutually exclusice with static. Default: As configured
+      compact: Write the files without indentation. Default: False
     """
 
     design = Path(design)
@@ -277,11 +356,74 @@ def gen_info_files(ctx,
         "Writing info files to disk.",
         output=str(output),
         copy_design=copy_design,
+        compact=compact,
     )
 
     output.mkdir(parents=True, exist_ok=True)
 
-    info_files.write_files(output)
+    info_files.write_files(output, compact=compact)
 
     if copy_design:
         shutil.copy2(design, output / 'design_swri.json')
+
+@task(iterable=['design'])
+def validate_designs(ctx,
+                     design,
+                     pattern = '*.json',
+                     static = None,
+                     host = None,
+                     port = None):
+    """
+    Checks designs against the corpus, printing every problem found.
+    Exits with an error if any design is invalid.
+
+    Arguments:
+      design: A design '.json' file or a directory of them, can be given
+        multiple times.
+      pattern: The glob used to find designs in directories.
+        Default: '*.json'
+
+      static: The static '.json' corpus to check against.
+        Mutually exclusive with host and port. Default: As configured
+      host: The hostname of the corpus server to check against.
+        Mutually exclusive with static. Default: As configured
+      port: The port of the corpus server to check against.
+        Mutually exclusice with static. Default: As configured
+    """
+
+    design_files = list()
+    for loc in design:
+        loc = Path(loc)
+        if loc.is_dir():
+            design_files += sorted(loc.glob(pattern))
+        else:
+            design_files.append(loc)
+
+    designs = dict()
+    for design_file in design_files:
+        with design_file.open() as dp:
+            designs[str(design_file)] = json.load(dp)
+
+    corpus = get_corpus(
+        config=Config[CraidlConfig],
+        static=static,
+        host=host,
+        port=port
+    )
+
+    log.info(
+        "Validating designs.",
+        num_designs=len(designs),
+    )
+
+    results = check_designs(corpus, designs)
+
+    for design_file, errors in results.items():
+        print(f"{design_file}:")
+        for err in errors:
+            print(f"  - {err}")
+
+    print(f"{len(designs) - len(results)} of {len(designs)} designs valid.")
+
+    if results:
+        raise RuntimeError(f"Found {len(results)} invalid designs.")
@@ -40,6 +40,8 @@ def main(args: Optional[List[str]] = None) -> int:
     manage_ns = Collection()
     manage_ns.add_task(manage.delete_locks, "delete_locks")
     manage_ns.add_task(manage.prune_results, "prune_results")
+    manage_ns.add_task(manage.index_results, "index_results")
+    manage_ns.add_task(manage.find_result, "find_result")
     manage_ns.add_task(manage.workspaces_dir, "workspaces_dir")
     manage_ns.add_task(manage.cache_dir, "cache_dir")
     manage_ns.add_task(manage.results_dir, "results_dir")
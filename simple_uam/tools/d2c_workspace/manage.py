@@ -38,11 +38,60 @@ def delete_locks(ctx,
     )
 
 @task
-def prune_results(ctx):
+def prune_results(ctx, dry_run=False):
     """
-    Deletes the oldest files in the results dir if there are too many.
+    Deletes result archives until the results dir is within the limits in
+    the config, least recently used first. Prints a report of what was
+    deleted.
+
+    Arguments:
+        dry_run: Only print what would be deleted.
+    """
+
+    victims = manager.prune_results(dry_run=dry_run)
+
+    verb = "Would delete" if dry_run else "Deleted"
+    for victim in victims:
+        print(f"{verb} {victim['archive']} "
+              f"({victim['size']} bytes, reason: {victim['reason']})")
+
+    reasons = dict()
+    for victim in victims:
+        reasons[victim['reason']] = reasons.get(victim['reason'], 0) + 1
+
+    print(f"{verb} {len(victims)} archives, "
+          f"{sum(v['size'] for v in victims)} bytes total.")
+    for reason, count in sorted(reasons.items()):
+        print(f"  {reason}: {count}")
+
+@task
+def index_results(ctx):
+    """
+    Rebuilds the results index from the archives in the results dir.
+    Only needed for results dirs that predate the index or if the index is
+    lost, workers update the index as they add results.
     """
-    manager.prune_results()
+    manager.rebuild_results_index()
+
+@task
+def find_result(ctx, message_id):
+    """
+    Prints the location of the result archive for a message, using the
+    results index.
+
+    Arguments:
+        message_id: The id of the dramatiq message that produced the result.
+    """
+
+    index = manager.results_index
+    if not index:
+        raise RuntimeError("The results index is disabled in the config.")
+
+    record = index.lookup(message_id)
+    if not record:
+        raise RuntimeError(f"No result for message {message_id} in index.")
+
+    print(str(manager.config.results_path / record['archive']))
 
 @task
 def workspaces_dir(ctx):
@@ -19,10 +19,11 @@ import subprocess
 
 log = get_logger(__name__)
 
-@task(incrementable=['verbose'])
+@task(incrementable=['verbose'], iterable=['queue'])
 def run(ctx,
         processes=0,
         threads=0,
+        queue=None,
         verbose=0):
     """
     Runs the worker node compute process. This will pull tasks from the broker
@@ -30,7 +31,10 @@ def run(ctx,
 
     Arguments:
       processes: Number of simultaneous worker processes.
-      threads: Number of threads per worker process.
+      threads: Number of threads per worker process, defaults to
+        `max_threads` plus `pipeline_depth`.
+      queue: A queue to listen to, can be given multiple times. Defaults to
+        the broker config's `routing.worker_queues`, or every queue.
       verbose: Verbosity of output.
     """
 
@@ -38,7 +42,8 @@ def run(ctx,
         processes = Config[D2CWorkerConfig].max_processes
 
     if threads <= 0:
-        threads = Config[D2CWorkerConfig].max_threads
+        threads = Config[D2CWorkerConfig].max_threads \
+            + Config[D2CWorkerConfig].pipeline_depth
 
     return run_worker_node(
         modules=[__name__],
@@ -46,4 +51,5 @@ def run(ctx,
         threads=threads,
         shutdown_timeout=Config[D2CWorkerConfig].shutdown_timeout,
         skip_logging=Config[D2CWorkerConfig].skip_logging,
+        queues=queue or None,
     )
@@ -5,7 +5,7 @@ from .d2c_workspace_config import D2CWorkspaceConfig
 from .service_config import ServiceConfig
 from .manager import Config
 from omegaconf import SI
-from typing import Optional
+from typing import Optional, List, Dict
 
 @define
 class BackendConfig():
@@ -42,6 +42,117 @@ class BackendConfig():
     provided.
     """
 
+@define
+class MetricsConfig():
+
+    enabled : bool = False
+    """
+    Do worker processes export prometheus style metrics?
+    """
+
+    exporter : str = 'http'
+    """
+    How metrics are exported, either 'http' for an endpoint that can be
+    scraped or 'textfile' for files picked up by a textfile collector.
+    """
+
+    host : str = "127.0.0.1"
+    """
+    The interface the 'http' exporter listens on.
+    """
+
+    port : int = 9191
+    """
+    The first port the 'http' exporter tries, each worker process takes the
+    next free port from here.
+    """
+
+    textfile_dir : str = SI("${path:log_directory}/metrics")
+    """
+    The directory the 'textfile' exporter writes to, one file per worker
+    process.
+    """
+
+    interval : float = 15.0
+    """
+    Seconds between writes of the 'textfile' exporter.
+    """
+
+    buckets : List[float] = [
+        0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600,
+    ]
+    """
+    Upper bounds, in seconds, of the latency histogram buckets.
+    """
+
+@define
+class EncoderConfig():
+
+    format : str = 'json'
+    """
+    How messages and results are encoded, one of 'json', 'msgpack' (needs
+    the 'msgpack' package), or 'zstd_json' (needs the 'zstandard' package).
+    Clients and workers must use the same format.
+    """
+
+    zstd_level : int = 3
+    """
+    The compression level for 'zstd_json'.
+    """
+
+    store_threshold : int = -1
+    """
+    Encoded messages larger than this many bytes are put in `store_dir`
+    and only a reference is sent. Negative disables the store.
+    """
+
+    store_dir : str = SI("${path:data_directory}/message_store")
+    """
+    Where large messages are kept, must be the same shared directory for
+    clients and workers.
+    """
+
+    store_max_age : float = 604800.0
+    """
+    Seconds before a stored message is deleted, never if negative.
+    """
+
+@define
+class RoutingConfig():
+
+    queues : List[str] = ['default']
+    """
+    Queues that messages can be sent to, all of them are created on the
+    broker.
+    """
+
+    actor_queues : Dict[str,str] = {}
+    """
+    The queue each actor's messages go to by default, keyed by actor name,
+    e.g. 'gen_info_files', or by full name, e.g.
+    'simple_uam.direct2cad.actors:gen_info_files'. Actors not listed use
+    'default'.
+    """
+
+    actor_priorities : Dict[str,int] = {}
+    """
+    The priority of each actor within a worker, keyed like `actor_queues`.
+    Lower numbers run first, the default is 0.
+    """
+
+    max_priority : int = 0
+    """
+    The highest per-message priority, higher numbers are taken off a queue
+    first. Only supported with rabbitmq, 0 disables per-message priorities.
+    """
+
+    worker_queues : Dict[str,float] = {}
+    """
+    The queues this node's workers listen to, each with a weight that sets
+    its share of the worker threads when several queues have messages
+    waiting. Empty listens to every queue equally.
+    """
+
 @define
 class BrokerConfig():
     """
@@ -83,6 +194,21 @@ class BrokerConfig():
     return values for remote calls directly.
     """
 
+    metrics : MetricsConfig = MetricsConfig()
+    """
+    Configuration options for the worker metrics exporter.
+    """
+
+    encoder : EncoderConfig = EncoderConfig()
+    """
+    Configuration options for how messages and results are encoded.
+    """
+
+    routing : RoutingConfig = RoutingConfig()
+    """
+    Configuration options for queues and priorities.
+    """
+
 # Add to the configuration manager
 Config.register(
     BrokerConfig, # class to be registered
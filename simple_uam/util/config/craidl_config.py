@@ -97,6 +97,13 @@ class CraidlConfig():
     The port to connect to when using a gremlin corpus server.
     """
 
+    server_corpus_version : Optional[str] = None
+    """
+    Identifies the contents of the gremlin corpus server. Results made with
+    the server corpus are only cached when this is set, change it whenever
+    the server's corpus changes.
+    """
+
     static_corpus : str = field(
         default=SI("${path:data_directory}/corpus_static_dump.json"),
     )
@@ -111,6 +118,12 @@ class CraidlConfig():
     The cache directory to use when generating a static corpus.
     """
 
+    static_corpus_workers : int = 1
+    """
+    The number of clusters of components to read concurrently when generating
+    a static corpus. Each worker opens its own connection to the corpus server.
+    """
+
     use_static_corpus : bool = True
     """
     Use the static corpus for generating design info files if true, otherwise
@@ -26,6 +26,15 @@ class D2CWorkerConfig():
     Default is 1.
     """
 
+    pipeline_depth : int = 0
+    """
+    Extra threads per process that decode designs and generate info files
+    for queued messages while the workspaces are busy, so that only the CAD
+    stage waits on a workspace. When non-zero, messages wait for a workspace
+    indefinitely rather than for `workspace_wait_timeout`.
+    Default is 0, no running ahead.
+    """
+
     shutdown_timeout : int = 600000
     """
     Timeout for worker shutdown in milliseconds.
@@ -6,6 +6,57 @@ from .craidl_config import CraidlConfig
 from typing import List
 from .workspace_config import ResultsConfig, WorkspaceConfig
 
+@define
+class CreoConfig():
+    """
+    Options for the Creo and Creoson instance that sessions build CAD with.
+    """
+
+    reuse_server : bool = True
+    """
+    Reuse a healthy, already running creoson server instead of starting it
+    for every design.
+    """
+
+    host : str = "localhost"
+    """ The creoson server's host. """
+
+    port : int = 9056
+    """ The creoson server's port. """
+
+    probe : str = "creoson"
+    """
+    How to check the server is healthy, either 'creoson' to ask creoson
+    whether Creo is running, or 'tcp' to only check the port is open.
+    """
+
+    connect_timeout : float = 2.0
+    """ Seconds to wait on a single health check. """
+
+    ready_timeout : float = 120.0
+    """ Seconds to wait for the server to be ready after starting it. """
+
+    poll_interval : float = 0.5
+    """ Seconds between health checks while waiting for the server. """
+
+    restart_after : int = -1
+    """
+    Restart the server after this many jobs. Negative values only restart it
+    when a failed job leaves it unhealthy.
+    """
+
+    lock_dir : str = SI("${path:cache_directory}/creo_locks")
+    """
+    Dir for the lockfiles that keep the worker processes on a host from
+    restarting Creo while another process's job is using it.
+    """
+
+    drain_timeout : float = 3600.0
+    """
+    Seconds a restart waits for the jobs using Creo to finish before
+    stopping it anyway.
+    """
+
 @define
 class D2CWorkspaceConfig(WorkspaceConfig):
     """
@@ -41,12 +92,41 @@ class D2CWorkspaceConfig(WorkspaceConfig):
 
     exclude : List[str] = ['.git']
 
+    reset_copy_patterns : List[str] = [
+        '*.json', # design and info files
+        '*.csv',
+        '*.txt',
+        '*.out',
+        '*.log',
+        '*.stdout',
+        '*.stderr',
+        '*.zip',
+        '*.prt*', # creo saves parts and assemblies in place
+        '*.asm*',
+        'workingdir/*',
+    ]
+    """
+    Files in the direct2cad tree that buildcad.py or the session writes to,
+    which must be copies, not links, with the 'hardlink' reset strategy.
+    Extend this if a session modifies other files already in the reference
+    dir.
+    """
+
     result_exclude : List[str] = [
         '.git',
         'workingdir/*.prt', #copied part files
         'data.zip',
     ]
 
+    creo : CreoConfig = CreoConfig()
+    """ Options for how Creo is started and reused between sessions. """
+
+    compact_info_files : bool = False
+    """
+    Write the info files without indentation, which is faster and makes
+    them smaller.
+    """
+
     # craidl : CraidlConfig = field(
     #     default=SI("${craidl:}")
     # )
@@ -1,5 +1,5 @@
 from attrs import define, field
-from typing import List
+from typing import List, Optional, Dict
 from pathlib import Path
 
 @define
@@ -22,6 +22,29 @@ class ResultsConfig():
     Lots of non-stale results can lead to keeping more than max_count.
     """
 
+    max_bytes : int = -1
+    """
+    Total size, in bytes, of the transaction results to save, with the least
+    recently used deleted first. Negative values disable the limit.
+    """
+
+    max_age : int = -1
+    """
+    Number of seconds after creation that a transaction result is deleted.
+    Negative values disable the limit.
+    """
+
+    session_quotas : Dict[str,int] = dict()
+    """
+    Number of transaction results to save for each session name
+    (e.g. 'process_design'), with the least recently used deleted first.
+    """
+
+    prune_on_finish : bool = True
+    """
+    Whether to enforce the limits above each time a session adds a result.
+    """
+
     metadata_file : str = "metadata.json"
     """
     The file within each result that stores metadata.
@@ -32,6 +55,60 @@ class ResultsConfig():
     The file which stores log information.
     """
 
+    index_file : Optional[str] = "results_index.jsonl"
+    """
+    The index of result archives, kept in the results directory, that
+    lets clients and pruning find archives without opening them.
+    None disables the index.
+    """
+
+    cache_results : bool = True
+    """
+    Whether to answer repeated requests, e.g. the same design submitted twice,
+    with the result archive already in the results directory instead of
+    running them again. Needs the results index.
+    """
+
+    compression : str = "store"
+    """
+    How result archives are compressed, one of:
+
+      - 'store': A zip file without compression.
+      - 'deflate': A deflate compressed zip file, files matching
+        `store_patterns` are stored without compression.
+      - 'zstd': A zstd compressed tar file ('.tar.zst'), compressed with
+        `compression_threads` threads. Requires the 'zstandard' package.
+    """
+
+    compression_level : Optional[int] = None
+    """
+    The compression level to use, None uses the codec's default.
+    """
+
+    compression_threads : int = 0
+    """
+    Threads used for compression with the 'zstd' codec, 0 uses one per core.
+    """
+
+    store_patterns : List[str] = [
+        '*.prt',
+        '*.prt.*',
+        '*.asm',
+        '*.asm.*',
+        '*.stp',
+        '*.step',
+        '*.png',
+        '*.jpg',
+        '*.jpeg',
+        '*.zip',
+        '*.gz',
+        '*.zst',
+    ]
+    """
+    Patterns for files that are already compressed, and are stored as is
+    in 'deflate' archives.
+    """
+
 @define
 class WorkspaceConfig():
 
@@ -68,6 +145,47 @@ class WorkspaceConfig():
     max_workspaces : int = 4
     """ The maximum number of workspaces operating simultaneously """
 
+    background_reset : bool = False
+    """
+    Reset each workspace in the background right after its session finishes,
+    so the next session can skip the reset if nothing has changed since.
+    """
+
+    background_reset_interval : float = -1
+    """
+    When positive, how often, in seconds, to check for idle workspaces that
+    haven't been reset yet and reset them in the background.
+    """
+
+    workspace_selection : str = 'ordered'
+    """
+    How a session picks between free workspaces, one of:
+
+      - 'ordered': The lowest numbered free workspace.
+      - 'round_robin': The next free workspace after the last one used.
+      - 'lru': The least recently used free workspace.
+      - 'mru': The most recently used free workspace, whose files are more
+        likely to still be in the OS's cache.
+    """
+
+    workspace_wait_timeout : Optional[float] = 600
+    """
+    Seconds a session waits for a free workspace before failing, None waits
+    indefinitely.
+    """
+
+    workspace_max_waiters : int = -1
+    """
+    The number of sessions within a process that can wait for a workspace at
+    once, any more fail immediately. Negative values mean no limit.
+    """
+
+    workspace_poll_interval : float = 0.5
+    """
+    Seconds between checks for workspaces freed by other processes. Waiters
+    are woken immediately when a workspace is freed by their own process.
+    """
+
     exclude : List[str] = ['.git']
     """
     File patterns to not copy from the reference dir to each workspace.
@@ -76,6 +194,30 @@ class WorkspaceConfig():
     See rsync's '--exclude' argument for more info.
     """
 
+    reset_strategy : str = 'rsync'
+    """
+    How each workspace is reset to match the reference dir at the start of
+    a session, one of:
+
+      - 'rsync': Use rsync to copy over the differences.
+      - 'reflink': Copy files as copy-on-write clones where the filesystem
+        supports it, falling back to plain copies. Unchanged files are
+        skipped without running a subprocess.
+      - 'hardlink': Hardlink files from the reference dir, with copies of the
+        files matching `reset_copy_patterns`. Only safe if sessions never
+        modify linked files in place, since that changes the reference too.
+        Refused when `reset_copy_patterns` is empty.
+    """
+
+    reset_copy_patterns : List[str] = []
+    """
+    With the 'hardlink' reset strategy, patterns for files that sessions
+    modify in place and so must be real copies instead of links. Must not be
+    empty when using 'hardlink'.
+
+    Uses the same pattern format as `exclude`.
+    """
+
     result_exclude : List[str] = ['.git']
     """
     File patterns to not include in a session's result archive.
@@ -85,6 +227,19 @@ class WorkspaceConfig():
     See rsync's '--exclude' argument for more info.
     """
 
+    change_tracking : str = 'manifest'
+    """
+    How the files a session changed are found when creating its result
+    archive, one of:
+
+      - 'manifest': Snapshot the size, mtime, and inode of each file right
+        after the workspace is reset, and compare against that in-process.
+      - 'rsync': Run an rsync dry-run between the reference dir and the
+        workspace.
+
+    The 'rsync' method is always used if no snapshot was taken.
+    """
+
     @property
     def workspaces_path(self):
         """ Path form of Workspaces_dir. """
@@ -114,6 +269,15 @@ class WorkspaceConfig():
 
         return self.locks_path / "reference.lock"
 
+    @property
+    def reference_version_file(self):
+        """
+        The file with an id that changes each time the reference dir is set
+        up.
+        """
+
+        return self.locks_path / "reference.version"
+
     @property
     def assets_path(self):
         """
@@ -154,6 +318,21 @@ class WorkspaceConfig():
 
         return self.results_lockdir / "results.lock"
 
+    @property
+    def results_index_path(self) -> Optional[Path]:
+        """ The results index file, if enabled. """
+
+        if not self.results.index_file:
+            return None
+
+        return self.results_path / self.results.index_file
+
+    @property
+    def results_index_lockfile(self):
+        """ The lockfile for writes to the results index. """
+
+        return self.results_lockdir / "results_index.lock"
+
     def validate_workspace_subdir_num(self, num : int):
         """ Validate whether a particular worker subdir can exist. """
 
@@ -1,7 +1,12 @@
-from .backup import backup_file, archive_files, configure_file
+from .backup import backup_file, archive_files, configure_file, \
+    replace_file
+from .archive import ArchiveWriter, is_archive, read_archive_json
 from .rsync import Rsync
+from .clone import Clone
+from .manifest import Manifest
 from .git import Git
 from .pip import Pip
+from .host_info import HostInfo, HOST_INFO
 # We don't import '.windows' so that you have to import platform specific stuff
 # manually.
 
@@ -11,7 +16,15 @@ __all__: List[str] = [
     'backup_file',
     'archive_files',
     'configure_file',
+    'replace_file',
+    'ArchiveWriter',
+    'is_archive',
+    'read_archive_json',
     'Rsync',
+    'Clone',
+    'Manifest',
     'Git',
     'Pip',
+    'HostInfo',
+    'HOST_INFO',
 ]  # noqa: WPS410 (the only __variable__ we use)
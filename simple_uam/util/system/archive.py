@@ -0,0 +1,217 @@
+from attrs import define, frozen, field
+from attrs.validators import in_
+from pathlib import Path
+from typing import Union, List, Optional
+from zipfile import ZipFile, ZIP_STORED, ZIP_DEFLATED
+import fnmatch
+import tarfile
+import json
+
+from ..logging import get_logger
+
+log = get_logger(__name__)
+
+def archive_paths(cwd : Path, files : List[Union[str,Path]]) -> List[Path]:
+    """
+    Get the relative archive paths for a list of files, which must all be
+    either relative or in a subdir of `cwd`.
+    """
+
+    cwd = Path(cwd).resolve()
+
+    def make_arc(f : Path) -> Path:
+        """
+        Get the relative archive file path for a given file.
+        """
+        if f.is_absolute() and f.is_relative_to(cwd):
+            return f.relative_to(cwd)
+        elif not f.is_absolute():
+            return f
+        else:
+            err = RuntimeError("Invalid file location")
+            log.exception(
+                "File not subdir of cwd.",
+                file=str(f),
+                cwd=str(cwd),
+                err=err,
+            )
+            raise err
+
+    return [make_arc(Path(f)) for f in files]
+
+archive_suffixes = ['.zip', '.tar.zst']
+""" File extensions of the archives `ArchiveWriter` can produce. """
+
+def is_archive(path : Union[str,Path]) -> bool:
+    """
+    Checks, by name, whether a file is an archive `ArchiveWriter` can produce.
+    """
+    return any(Path(path).name.endswith(suf) for suf in archive_suffixes)
+
+def read_archive_json(archive : Union[str,Path],
+                      member : str) -> Optional[object]:
+    """
+    Reads and decodes a JSON file from an archive.
+
+    Arguments:
+       archive: The '.zip' or '.tar.zst' archive to read.
+       member: The path of the file within the archive.
+
+    Returns:
+       The decoded contents or None if the archive doesn't have the file.
+    """
+
+    archive = Path(archive)
+
+    if archive.name.endswith('.tar.zst'):
+
+        import zstandard
+
+        with archive.open('rb') as fh, \
+             zstandard.ZstdDecompressor().stream_reader(fh) as zr, \
+             tarfile.open(fileobj=zr, mode='r|') as tar:
+            for info in tar:
+                if info.name == member and info.isfile():
+                    return json.load(tar.extractfile(info))
+        return None
+
+    with ZipFile(archive) as zf:
+        try:
+            with zf.open(member) as fp:
+                return json.load(fp)
+        except KeyError:
+            return None
+
+@frozen
+class ArchiveWriter():
+    """
+    Writes a set of files into an archive with a configurable codec.
+
+    Codecs:
+      - 'store': An uncompressed zip file.
+      - 'deflate': A deflate compressed zip file. Members matching
+        `store_patterns`, which are usually already compressed, are stored
+        as is.
+      - 'zstd': A zstd compressed tar file ('.tar.zst'). Compression is spread
+        over `threads` threads. Needs the optional 'zstandard' package.
+    """
+
+    codecs = ['store', 'deflate', 'zstd']
+    """ Supported codecs. """
+
+    codec : str = field(
+        default='deflate',
+        validator=in_(codecs),
+    )
+    """ The codec to use, see class docs. """
+
+    level : Optional[int] = field(
+        default=None,
+    )
+    """ Compression level, None uses the codec's default. """
+
+    threads : int = field(
+        default=0,
+    )
+    """
+    Number of compression threads for codecs that support it, 0 uses one per
+    core.
+    """
+
+    store_patterns : List[str] = field(
+        factory=list,
+    )
+    """
+    Filename patterns for files that are stored without compression in zip
+    archives.
+    """
+
+    @property
+    def suffix(self) -> str:
+        """ The file extension of archives this writer produces. """
+        return '.tar.zst' if self.codec == 'zstd' else '.zip'
+
+    def is_precompressed(self, arc_file : Path) -> bool:
+        """ Should this file be stored without compression? """
+        name = arc_file.name.lower()
+        return any(fnmatch.fnmatch(name, pat) for pat in self.store_patterns)
+
+    def write(self,
+              cwd : Union[str,Path],
+              files : List[Union[str,Path]],
+              out : Union[str,Path],
+              missing_ok : bool = False):
+        """
+        Archives the files in `files` to `out`, preserving any structure
+        `files` have relative to `cwd`.
+
+        Note: All `files` must either be relative or in a subdir of `cwd`.
+
+        Arguments:
+           cwd: Root locations from which we're gathering files.
+           files: list of files to archive.
+           out: Output archive location.
+           missing_ok: Do we ignore files that don't exist?
+        """
+
+        cwd = Path(cwd).resolve()
+        out = Path(out).resolve()
+        files = archive_paths(cwd, files)
+
+        if not missing_ok:
+            for arc_file in files:
+                if not (cwd / arc_file).exists():
+                    raise RuntimeError(
+                        f"Cannot archive {str(arc_file)}, file does not exist."
+                    )
+
+        files = [f for f in files if (cwd / f).exists()]
+
+        log.info(
+            "Writing archive.",
+            out=str(out),
+            codec=self.codec,
+            level=self.level,
+            num_files=len(files),
+        )
+
+        if self.codec == 'zstd':
+            self._write_tar_zst(cwd, files, out)
+        else:
+            self._write_zip(cwd, files, out)
+
+    def _write_zip(self, cwd : Path, files : List[Path], out : Path):
+
+        compression = ZIP_STORED if self.codec == 'store' else ZIP_DEFLATED
+
+        with ZipFile(out, 'x',
+                     compression=compression,
+                     compresslevel=self.level) as zf:
+            for arc_file in files:
+                if compression != ZIP_STORED and self.is_precompressed(arc_file):
+                    zf.write(cwd / arc_file, arc_file, compress_type=ZIP_STORED)
+                else:
+                    zf.write(cwd / arc_file, arc_file)
+
+    def _write_tar_zst(self, cwd : Path, files : List[Path], out : Path):
+
+        try:
+            import zstandard
+        except ImportError as err:
+            log.exception(
+                "The 'zstd' archive codec requires the 'zstandard' package.",
+                err=err,
+            )
+            raise
+
+        cctx = zstandard.ZstdCompressor(
+            level=3 if self.level == None else self.level,
+            threads=-1 if self.threads <= 0 else self.threads,
+        )
+
+        with out.open('xb') as fh, \
+             cctx.stream_writer(fh) as zw, \
+             tarfile.open(fileobj=zw, mode='w|') as tar:
+            for arc_file in files:
+                tar.add(cwd / arc_file, arcname=arc_file.as_posix(),
+                        recursive=False)
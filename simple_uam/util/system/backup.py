@@ -1,13 +1,16 @@
 import shutil
 from datetime import datetime
 from pathlib import Path, WindowsPath
-from typing import Union, List, Optional, Dict
+from typing import Union, List, Optional, Dict, IO, Iterator
+from contextlib import contextmanager
 from zipfile import ZipFile
 import subprocess
 import tempfile
 import shutil
 import re
+import os
 
+from .archive import ArchiveWriter
 from ..logging import get_logger
 
 log = get_logger(__name__)
@@ -78,10 +81,43 @@ def backup_file(
 
         return None
 
+@contextmanager
+def replace_file(file_path : Union[Path, str],
+                 mode : str = 'w') -> Iterator[IO]:
+    """
+    Opens a temporary file next to `file_path` for writing and, once the
+    block exits without error, moves it over `file_path` in one step.
+
+    Readers never see a partially written file, and processes that still
+    have the old file open or mmap'd keep reading the old contents rather
+    than having it truncated underneath them.
+
+    Arguments:
+      file_path: The file to (over)write.
+      mode: The mode to open the temporary file with, 'w' or 'wb'.
+    """
+
+    file_path = Path(file_path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, tmp_file = tempfile.mkstemp(
+        dir=file_path.parent,
+        prefix=f"{file_path.name}.",
+        suffix='.tmp',
+    )
+    try:
+        with os.fdopen(fd, mode) as fp:
+            yield fp
+        os.replace(tmp_file, file_path)
+    except BaseException:
+        Path(tmp_file).unlink(missing_ok=True)
+        raise
+
 def archive_files(cwd : Union[str,Path],
                   files : List[Union[str,Path]],
                   out : Union[str,Path],
                   missing_ok : bool = False,
+                  writer : Optional[ArchiveWriter] = None,
 ):
     """
     Archives the files in `files` to `out`, preserving any structure `files`
@@ -94,40 +130,13 @@ def archive_files(cwd : Union[str,Path],
        files: list of files to archive.
        out: Output zipfile location.
        missing_ok: Do we ignore files that don't exist?
+       writer: The archive writer to use, defaults to an uncompressed zip.
     """
 
-    cwd = Path(cwd).resolve()
-    out = Path(out).resolve()
-
-    def make_arc(f : Path) -> Path:
-        """
-        Get the relative archive file path for a given file.
-        """
-        if f.is_absolute() and f.is_relative_to(cwd):
-            return f.relative_to(cwd)
-        elif not f.is_absolute():
-            return f
-        else:
-            err = RuntimeError("Invalid file location")
-            log.exception(
-                "File not subdir of cwd.",
-                file=str(f),
-                cwd=str(cwd),
-                err=err,
-            )
-            raise err
-
-    files = [make_arc(Path(f)) for f in files]
-
-    # Iterate through the files to archive, adding them to the zip file as
-    # needed.
-    with ZipFile(out, 'x') as zf:
-        for arc_file in files:
-            sys_file = cwd / arc_file
-            if not sys_file.exists() and missing_ok:
-                pass
-            else:
-                zf.write(sys_file, arc_file)
+    if not writer:
+        writer = ArchiveWriter(codec='store')
+
+    writer.write(cwd, files, out, missing_ok=missing_ok)
 
 def configure_file(input_file : Union[str,Path],
                    output_file : Union[str, Path],
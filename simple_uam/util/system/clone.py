@@ -0,0 +1,240 @@
+import os
+import sys
+import errno
+import shutil
+import fnmatch
+from pathlib import Path
+from typing import Union, List, Optional, Dict
+
+from ..logging import get_logger
+
+log = get_logger(__name__)
+
+FICLONE = 0x40049409
+""" The linux ioctl for cloning a file's extents, i.e. a reflink copy. """
+
+class Clone():
+    """
+    Static class with in-process alternatives to `Rsync.copy_dir` that make a
+    destination dir match a source dir without copying unchanged data.
+
+    Modes:
+      - 'reflink': Copy files as copy-on-write clones where the filesystem
+        supports it (btrfs, xfs, ...), regular copies otherwise. Unchanged
+        files are detected by size and mtime and left alone.
+      - 'hardlink': Hardlink files from the source, except for files matching
+        `copy_patterns` which are copied. Files that are still linked to the
+        source are left alone.
+    """
+
+    modes = ['reflink', 'hardlink']
+    """ The supported copy modes. """
+
+    @staticmethod
+    def is_excluded(rel_path : str, exclude : List[str]) -> bool:
+        """
+        Checks a posix style relative path against rsync style exclude
+        patterns. Patterns without a '/' match the last component of the path,
+        other patterns match the whole path relative to the root.
+
+        Arguments:
+          rel_path: The path to check, relative to the sync root.
+          exclude: The patterns to check against.
+        """
+
+        name = rel_path.rsplit('/', 1)[-1]
+        for pat in exclude:
+            pat = pat.rstrip('/')
+            if '/' in pat:
+                if fnmatch.fnmatchcase(rel_path, pat.lstrip('/')):
+                    return True
+            elif fnmatch.fnmatchcase(name, pat):
+                return True
+        return False
+
+    @staticmethod
+    def reflink_file(src : Union[str,Path], dst : Union[str,Path]) -> bool:
+        """
+        Copies src to dst, as a copy-on-write clone if possible.
+
+        Returns:
+          True if a clone was made, False if we fell back to a full copy.
+        """
+
+        if sys.platform.startswith('linux'):
+            import fcntl
+            try:
+                with open(src, 'rb') as sf, open(dst, 'wb') as df:
+                    fcntl.ioctl(df.fileno(), FICLONE, sf.fileno())
+                shutil.copystat(src, dst)
+                return True
+            except OSError as err:
+                if err.errno not in (errno.EOPNOTSUPP, errno.ENOTTY,
+                                     errno.EXDEV, errno.EINVAL,
+                                     errno.ENOSYS, errno.EBADF):
+                    raise
+
+        shutil.copy2(src, dst)
+        return False
+
+    @staticmethod
+    def link_file(src : Union[str,Path], dst : Union[str,Path]) -> bool:
+        """
+        Hardlinks src to dst, copying if links aren't supported.
+
+        Returns:
+          True if a link was made, False if we fell back to a full copy.
+        """
+
+        try:
+            os.link(src, dst)
+            return True
+        except OSError:
+            shutil.copy2(src, dst)
+            return False
+
+    @staticmethod
+    def _remove(path : Union[str,Path]):
+        path = Path(path)
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+
+    @classmethod
+    def copy_dir(cls,
+                 src : Union[str,Path],
+                 dst : Union[str,Path],
+                 mode : str = 'reflink',
+                 exclude : List[str] = [],
+                 copy_patterns : List[str] = [],
+                 delete : bool = True,
+    ) -> Dict[str,int]:
+        """
+        Makes dst match src, only touching files that differ.
+
+        Arguments:
+          src: source dir
+          dst: destination dir
+          mode: one of `Clone.modes`, see class docs.
+          exclude: rsync style patterns for files to ignore. Excluded files in
+            dst are neither copied over nor deleted.
+          copy_patterns: In 'hardlink' mode, patterns for files that must be
+            real copies because the workspace modifies them in place.
+          delete: delete files in dst that aren't in src.
+
+        Returns:
+          Counts of the files that were kept, cloned, linked, copied and
+          deleted.
+        """
+
+        if mode not in cls.modes:
+            raise RuntimeError(
+                f"Unknown clone mode '{mode}', must be one of {cls.modes}."
+            )
+
+        src = Path(src).resolve()
+        dst = Path(dst).resolve()
+
+        if not src.is_dir():
+            raise RuntimeError(f"Clone src {str(src)} isn't a dir.")
+
+        dst.mkdir(parents=True, exist_ok=True)
+
+        counts = dict(kept=0, cloned=0, linked=0, copied=0, deleted=0)
+
+        def sync_file(src_entry : os.DirEntry, dst_path : str, rel : str):
+
+            # Not `src_entry.stat()`, on windows that leaves st_ino and
+            # st_nlink unset.
+            src_stat = os.stat(src_entry.path, follow_symlinks=False)
+
+            try:
+                dst_stat = os.stat(dst_path, follow_symlinks=False)
+            except FileNotFoundError:
+                dst_stat = None
+
+            use_link = mode == 'hardlink' \
+                and not cls.is_excluded(rel, copy_patterns)
+
+            if dst_stat is not None:
+                if use_link:
+                    unchanged = os.path.samestat(src_stat, dst_stat)
+                else:
+                    unchanged = dst_stat.st_nlink == 1 \
+                        and dst_stat.st_size == src_stat.st_size \
+                        and dst_stat.st_mtime_ns == src_stat.st_mtime_ns
+                if unchanged:
+                    counts['kept'] += 1
+                    return
+                cls._remove(dst_path)
+
+            if use_link:
+                if cls.link_file(src_entry.path, dst_path):
+                    counts['linked'] += 1
+                else:
+                    counts['copied'] += 1
+            elif mode == 'reflink':
+                if cls.reflink_file(src_entry.path, dst_path):
+                    counts['cloned'] += 1
+                else:
+                    counts['copied'] += 1
+            else:
+                shutil.copy2(src_entry.path, dst_path)
+                counts['copied'] += 1
+
+        def sync_dir(src_dir : str, dst_dir : str, rel_dir : str):
+
+            src_names = set()
+
+            with os.scandir(src_dir) as it:
+                entries = list(it)
+
+            for entry in entries:
+                rel = f"{rel_dir}{entry.name}"
+                if cls.is_excluded(rel, exclude):
+                    continue
+                src_names.add(entry.name)
+                dst_path = os.path.join(dst_dir, entry.name)
+
+                if entry.is_symlink():
+                    if os.path.lexists(dst_path):
+                        if os.path.islink(dst_path) and \
+                           os.readlink(dst_path) == os.readlink(entry.path):
+                            counts['kept'] += 1
+                            continue
+                        cls._remove(dst_path)
+                    os.symlink(os.readlink(entry.path), dst_path)
+                    counts['copied'] += 1
+
+                elif entry.is_dir():
+                    if os.path.lexists(dst_path) and \
+                       (os.path.islink(dst_path) or not os.path.isdir(dst_path)):
+                        cls._remove(dst_path)
+                    os.makedirs(dst_path, exist_ok=True)
+                    sync_dir(entry.path, dst_path, rel + '/')
+
+                else:
+                    sync_file(entry, dst_path, rel)
+
+            if delete:
+                with os.scandir(dst_dir) as it:
+                    dst_entries = list(it)
+                for entry in dst_entries:
+                    rel = f"{rel_dir}{entry.name}"
+                    if entry.name in src_names or cls.is_excluded(rel, exclude):
+                        continue
+                    cls._remove(entry.path)
+                    counts['deleted'] += 1
+
+        sync_dir(str(src), str(dst), '')
+
+        log.info(
+            "Finished cloning directory.",
+            src=str(src),
+            dst=str(dst),
+            mode=mode,
+            **counts,
+        )
+
+        return counts
@@ -0,0 +1,135 @@
+from attrs import define, field
+from typing import Dict, Optional, Any
+import threading
+import platform
+import socket
+import uuid
+import time
+import re
+
+from ..logging import get_logger
+
+log = get_logger(__name__)
+
+@define
+class HostInfo():
+    """
+    Facts about the current host, for session metadata, computed once per
+    process.
+
+    Everything but the IP address is fixed for the life of the process. The
+    IP address needs a DNS lookup, which can hang for seconds on a badly
+    configured host, so it's resolved in a background thread. Callers wait
+    at most `resolve_timeout` seconds for the first lookup and never wait
+    on later refreshes, which happen every `refresh_interval` seconds.
+    """
+
+    resolve_timeout : float = field(default=1.0)
+    """ Seconds to wait for the first IP address lookup. """
+
+    refresh_interval : float = field(default=600.0)
+    """ Seconds before the IP address is looked up again. """
+
+    _static : Optional[Dict[str,Any]] = field(default=None, init=False)
+    """ The facts that don't change. """
+
+    _ip_address : Optional[str] = field(default=None, init=False)
+    """ The last resolved IP address. """
+
+    _resolved_at : Optional[float] = field(default=None, init=False)
+    """ Monotonic time of the last finished lookup. """
+
+    _resolver : Optional[threading.Thread] = field(default=None, init=False)
+    """ The running lookup, if any. """
+
+    _waited : bool = field(default=False, init=False)
+    """ Whether a caller already waited on the first lookup. """
+
+    _lock : threading.Lock = field(factory=threading.Lock, init=False)
+    """ Guards the cached values. """
+
+    def _static_info(self) -> Dict[str,Any]:
+        return dict(
+            platform=platform.system(),
+            platform_release=platform.release(),
+            platform_version=platform.version(),
+            architecture=platform.machine(),
+            hostname=socket.gethostname(),
+            mac_address=':'.join(re.findall('..', '%012x' % uuid.getnode())),
+            processor=platform.processor(),
+        )
+
+    def _resolve(self, hostname : str):
+        """
+        Looks up the IP address, run in the resolver thread.
+        """
+
+        start = time.monotonic()
+        try:
+            ip_address = socket.gethostbyname(hostname)
+        except OSError as err:
+            log.warning(
+                "Could not resolve host IP address.",
+                hostname=hostname,
+                err=str(err),
+            )
+            ip_address = None
+
+        with self._lock:
+            if ip_address != None:
+                self._ip_address = ip_address
+            self._resolved_at = time.monotonic()
+            self._resolver = None
+
+        duration = time.monotonic() - start
+        if duration > self.resolve_timeout:
+            log.warning(
+                "Slow host IP address lookup, check the host's DNS config.",
+                hostname=hostname,
+                duration=duration,
+            )
+
+    def _start_resolver(self, hostname : str) -> threading.Thread:
+        """
+        Starts a lookup unless one is running, call with the lock held.
+        """
+
+        if self._resolver == None:
+            self._resolver = threading.Thread(
+                target=self._resolve,
+                args=(hostname,),
+                name="host-info-resolver",
+                daemon=True,
+            )
+            self._resolver.start()
+        return self._resolver
+
+    def get(self) -> Dict[str,Any]:
+        """
+        The host facts, with 'ip_address' None if it hasn't resolved yet.
+        """
+
+        with self._lock:
+            if self._static == None:
+                self._static = self._static_info()
+
+            hostname = self._static['hostname']
+            resolver = None
+
+            if self._resolved_at == None:
+                resolver = self._start_resolver(hostname)
+                if self._waited:
+                    resolver = None
+                self._waited = True
+            elif time.monotonic() - self._resolved_at > self.refresh_interval:
+                self._start_resolver(hostname)
+
+        # Only the first lookup is waited on, and only for a bit.
+        if resolver:
+            resolver.join(self.resolve_timeout)
+
+        with self._lock:
+            return dict(self._static, ip_address=self._ip_address)
+
+HOST_INFO = HostInfo()
+""" The host info for the current process. """
@@ -0,0 +1,118 @@
+import os
+import json
+from pathlib import Path
+from typing import Union, List, Optional, Dict, Tuple
+
+from .clone import Clone
+from ..logging import get_logger
+
+log = get_logger(__name__)
+
+FileSig = Tuple[int,int,int]
+""" The (size, mtime_ns, inode) of a file. """
+
+class Manifest():
+    """
+    Static class for snapshotting a directory tree's file metadata and
+    finding the files that changed since, an in-process replacement for
+    `Rsync.list_changes` when the snapshot is taken right after a reset.
+    """
+
+    @staticmethod
+    def _walk(root : str, exclude : List[str]):
+        """
+        Yields (relative posix path, DirEntry) for every file under root
+        that isn't excluded.
+        """
+
+        stack = [(root, '')]
+        while stack:
+            cur_dir, rel_dir = stack.pop()
+            with os.scandir(cur_dir) as it:
+                for entry in it:
+                    rel = f"{rel_dir}{entry.name}"
+                    if Clone.is_excluded(rel, exclude):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, rel + '/'))
+                    else:
+                        yield rel, entry
+
+    @staticmethod
+    def _sig(entry : os.DirEntry) -> FileSig:
+        stat = entry.stat(follow_symlinks=False)
+        # `entry.inode()` rather than `stat.st_ino`, which is 0 on windows.
+        return (stat.st_size, stat.st_mtime_ns, entry.inode())
+
+    @classmethod
+    def snapshot(cls,
+                 root : Union[str,Path],
+                 exclude : List[str] = [],
+    ) -> Dict[str,FileSig]:
+        """
+        Records the size, mtime, and inode of every file in a dir.
+
+        Arguments:
+          root: The dir to snapshot.
+          exclude: rsync style patterns for files to skip.
+
+        Returns:
+          A map from posix style relative path to file signature.
+        """
+
+        return {
+            rel : cls._sig(entry)
+            for rel, entry in cls._walk(str(Path(root).resolve()), exclude)
+        }
+
+    @classmethod
+    def list_changes(cls,
+                     root : Union[str,Path],
+                     manifest : Dict[str,FileSig],
+                     exclude : List[str] = [],
+    ) -> List[Path]:
+        """
+        Lists the files in a dir that are new or modified relative to a
+        snapshot. Files that were deleted are ignored, same as
+        `Rsync.list_changes` with `prune_missing`.
+
+        Arguments:
+          root: The dir to check.
+          manifest: A snapshot of the dir from `Manifest.snapshot`.
+          exclude: rsync style patterns for files to skip.
+
+        Returns:
+          The changed files, relative to root.
+        """
+
+        root = Path(root).resolve()
+
+        changes = list()
+        for rel, entry in cls._walk(str(root), exclude):
+            sig = manifest.get(rel)
+            if sig is None or tuple(sig) != cls._sig(entry):
+                changes.append(Path(rel))
+
+        log.info(
+            "Manifest found following changes.",
+            root=str(root),
+            changes=[str(f) for f in changes],
+        )
+
+        return changes
+
+    @staticmethod
+    def save(manifest : Dict[str,FileSig], out : Union[str,Path]):
+        """
+        Writes a manifest to a json file.
+        """
+        with Path(out).open('w') as fp:
+            json.dump(manifest, fp)
+
+    @staticmethod
+    def load(manifest_file : Union[str,Path]) -> Dict[str,FileSig]:
+        """
+        Reads a manifest from a json file.
+        """
+        with Path(manifest_file).open('r') as fp:
+            return {rel : tuple(sig) for rel, sig in json.load(fp).items()}
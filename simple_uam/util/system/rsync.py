@@ -9,6 +9,7 @@ import shutil
 import re
 
 from .backup import archive_files
+from .archive import ArchiveWriter
 from ..logging import get_logger
 
 log = get_logger(__name__)
@@ -322,6 +323,7 @@ class Rsync():
                         out : Union[str,Path],
                         exclude : List[str] = [],
                         exclude_from : List[Union[str,Path]] = [],
+                        writer : Optional[ArchiveWriter] = None,
     ):
         """
         Package any files that are different in src (compared to ref) into
@@ -333,6 +335,7 @@ class Rsync():
           out: The location of the output zip file
           exclude: patterns for list of files to ignore
           exclude_from: File to read exclude patterns from (great for gitignore)
+          writer: The archive writer to use, see `archive_files`.
         """
 
         ref = Path(ref)
@@ -345,4 +348,4 @@ class Rsync():
             exclude=exclude,
             exclude_from=exclude_from,
         )
-        archive_files(src,changes,out)
+        archive_files(src,changes,out,writer=writer)
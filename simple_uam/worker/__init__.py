@@ -1,8 +1,10 @@
 """
 SimpleUAM windows node setup scripts.
 """
-from .broker import actor, message_metadata, has_backend
+from .broker import actor, message_metadata, has_backend, \
+    routed_message, send_routed
 from .run_worker import run_worker_node
+from .metrics import register_collector
 from typing import List # noqa
 
 __all__: List[str] = [
@@ -10,4 +12,7 @@ __all__: List[str] = [
     'message_metadata',
     'run_worker_node',
     'has_backend',
+    'routed_message',
+    'send_routed',
+    'register_collector',
 ]  # noqa: WPS410 (the only __variable__ we use)
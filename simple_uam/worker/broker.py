@@ -12,6 +12,10 @@ from dramatiq.results.backends import RedisBackend
 from dramatiq.actor import Actor
 from dramatiq.middleware import CurrentMessage
 
+from .metrics import WorkerMetrics
+from .encoder import make_encoder
+from .queues import QueueWeights
+
 import textwrap
 
 log = get_logger(__name__)
@@ -27,12 +31,29 @@ def default_broker():
 
     broker = None
 
+    ### Setup Encoder ###
+
+    # Set before anything reads the global encoder, so the broker and
+    # backend agree with it.
+    encoder = make_encoder(Config[BrokerConfig].encoder)
+    dramatiq.set_encoder(encoder)
+
     ### Setup Broker ###
 
+    routing = Config[BrokerConfig].routing
+
     if 'amqp' in parsed.scheme:
-        broker = RabbitmqBroker(url=url)
+        broker = RabbitmqBroker(
+            url=url,
+            max_priority=routing.max_priority or None,
+        )
     elif parsed.scheme == 'redis':
         broker = RedisBroker(url=url)
+        if routing.max_priority:
+            log.warning(
+                "Per-message priorities need rabbitmq, ignoring max_priority.",
+                max_priority=routing.max_priority,
+            )
     else:
         err = RuntimeError("Unsupported broker protocol.")
         log.exception(
@@ -44,12 +65,40 @@ def default_broker():
 
     broker.add_middleware(CurrentMessage())
 
+    ### Setup Queues ###
+
+    # Declare every queue up front so workers listen to them even before
+    # an actor that uses them is loaded.
+    for queue_name in sorted({*routing.queues, *routing.actor_queues.values()}):
+        broker.declare_queue(queue_name)
+
+    if routing.worker_queues:
+        broker.add_middleware(QueueWeights(
+            weights=dict(routing.worker_queues),
+        ))
+
+    ### Setup Metrics ###
+
+    metrics = Config[BrokerConfig].metrics
+
+    if metrics.enabled:
+
+        broker.add_middleware(WorkerMetrics(
+            exporter=metrics.exporter,
+            host=metrics.host,
+            port=metrics.port,
+            textfile_dir=metrics.textfile_dir,
+            interval=metrics.interval,
+            buckets=list(metrics.buckets),
+        ))
+
     ### Setup Results Backend ###
 
     if Config[BrokerConfig].backend.enabled:
 
         backend = RedisBackend(
-            url=Config[BrokerConfig].backend.url
+            url=Config[BrokerConfig].backend.url,
+            encoder=encoder,
         )
 
         broker.add_middleware(Results(
@@ -63,12 +112,20 @@ def default_broker():
 _BROKER = default_broker()
 dramatiq.set_broker(_BROKER)
 
+def _routed(table, name, full_name, default):
+    """
+    Looks up an actor's setting in a routing table, by full name first.
+    """
+    if full_name in table:
+        return table[full_name]
+    return table.get(name, default)
+
 def actor(fn=None,
           *,
           actor_class=Actor,
           actor_name=None,
-          queue_name='default',
-          priority=0,
+          queue_name=None,
+          priority=None,
           **options):
     """
     Wraps 'dramatiq.actor', so the options and defaults are mostly the same.
@@ -79,11 +136,28 @@ def actor(fn=None,
         use 'dramatiq.actor' directly.
       - There is no 'broker' option, it's fixed to the one initialized in
         this modules.
+      - The queue and priority are taken from the broker's routing config
+        when it has an entry for the actor, falling back to the arguments
+        and then to 'default' and 0.
 
     See: https://dramatiq.io/reference.html#dramatiq.actor
     """
-    actor_name = actor_name or fn.__name__
-    actor_name = f"{fn.__module__}:{actor_name}"
+    short_name = actor_name or fn.__name__
+    actor_name = f"{fn.__module__}:{short_name}"
+
+    routing = Config[BrokerConfig].routing
+    queue_name = _routed(
+        routing.actor_queues,
+        short_name,
+        actor_name,
+        queue_name or 'default',
+    )
+    priority = _routed(
+        routing.actor_priorities,
+        short_name,
+        actor_name,
+        priority or 0,
+    )
 
     return dramatiq.actor(
         fn=fn,
@@ -95,6 +169,49 @@ def actor(fn=None,
         **options,
     )
 
+def routed_message(actor,
+                   *args,
+                   queue_name=None,
+                   priority=None,
+                   **kwargs) -> dramatiq.Message:
+    """
+    Builds a message for an actor, like 'actor.message', that can go to a
+    different queue than the actor's default and carry its own priority.
+    Send it with 'dramatiq.get_broker().enqueue' or as part of a group.
+
+    Arguments:
+      actor: The actor to call.
+      *args: The actor's positional arguments.
+      queue_name: The queue to send the message to, defaults to the actor's.
+      priority: The message's priority, higher is taken off the queue
+        first. Needs rabbitmq with `max_priority` set.
+      **kwargs: The actor's keyword arguments.
+    """
+
+    options = dict()
+    if priority != None:
+        options['broker_priority'] = priority
+
+    msg = actor.message_with_options(args=args, kwargs=kwargs, **options)
+
+    if queue_name and queue_name != msg.queue_name:
+        msg = msg.copy(queue_name=queue_name)
+
+    return msg
+
+def send_routed(actor, *args, queue_name=None, priority=None, **kwargs):
+    """
+    Sends a message built with `routed_message`.
+    """
+
+    return _BROKER.enqueue(routed_message(
+        actor,
+        *args,
+        queue_name=queue_name,
+        priority=priority,
+        **kwargs,
+    ))
+
 def message_metadata():
     """
     When called in a running actor provides a dictionary of metadata from the
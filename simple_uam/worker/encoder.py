@@ -0,0 +1,270 @@
+from attrs import define, field
+from typing import Optional, Dict, Any
+from pathlib import Path
+from dramatiq.encoder import Encoder, JSONEncoder
+from dramatiq.errors import DecodeError
+import hashlib
+import tempfile
+import threading
+import time
+import os
+
+from simple_uam.util.logging import get_logger
+
+log = get_logger(__name__)
+
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+""" The first bytes of every zstd frame. """
+
+STORE_REF_KEY = '__simple_uam_store_ref__'
+""" The key of a reference to a payload in the object store. """
+
+@define
+class MsgpackEncoder(Encoder):
+    """
+    Encodes messages with msgpack, which is smaller and faster than JSON for
+    designs with many numeric parameters. Needs the optional 'msgpack'
+    package.
+
+    Still decodes plain JSON so that messages sent before a switch can be
+    read.
+    """
+
+    _json : JSONEncoder = field(factory=JSONEncoder, init=False)
+    """ Decodes old JSON messages. """
+
+    _msgpack : Any = field(default=None, init=False)
+    """ The msgpack module. """
+
+    def __attrs_post_init__(self):
+        try:
+            import msgpack
+        except ImportError as err:
+            log.exception(
+                "The 'msgpack' message encoder requires the 'msgpack' package.",
+                err=err,
+            )
+            raise
+        self._msgpack = msgpack
+
+    def encode(self, data : Dict[str,Any]) -> bytes:
+        return self._msgpack.packb(data, use_bin_type=True)
+
+    def decode(self, data : bytes) -> Dict[str,Any]:
+        # A msgpack map never starts with '{', so that's an old JSON message.
+        if data[:1] == b'{':
+            return self._json.decode(data)
+        try:
+            return self._msgpack.unpackb(data, raw=False)
+        except ValueError as err:
+            raise DecodeError(
+                f"failed to decode message {data!r}", data, err) from None
+
+@define
+class ZstdJSONEncoder(Encoder):
+    """
+    Encodes messages as zstd compressed JSON. Needs the optional 'zstandard'
+    package.
+
+    Still decodes plain JSON so that messages sent before a switch can be
+    read.
+    """
+
+    level : int = field(default=3)
+    """ The zstd compression level. """
+
+    _json : JSONEncoder = field(factory=JSONEncoder, init=False)
+    """ Does the actual encoding. """
+
+    _local : threading.local = field(factory=threading.local, init=False)
+    """ Per thread (de)compressors, they aren't thread safe. """
+
+    def __attrs_post_init__(self):
+        try:
+            import zstandard
+        except ImportError as err:
+            log.exception(
+                "The 'zstd_json' message encoder requires the 'zstandard' package.",
+                err=err,
+            )
+            raise
+
+    def _codecs(self):
+        if not hasattr(self._local, 'cctx'):
+            import zstandard
+            self._local.cctx = zstandard.ZstdCompressor(level=self.level)
+            self._local.dctx = zstandard.ZstdDecompressor()
+        return (self._local.cctx, self._local.dctx)
+
+    def encode(self, data : Dict[str,Any]) -> bytes:
+        cctx, _ = self._codecs()
+        return cctx.compress(self._json.encode(data))
+
+    def decode(self, data : bytes) -> Dict[str,Any]:
+        if data[:4] != ZSTD_MAGIC:
+            return self._json.decode(data)
+        _, dctx = self._codecs()
+        try:
+            data = dctx.decompress(data)
+        except Exception as err:
+            raise DecodeError(
+                f"failed to decompress message {data!r}", data, err) from None
+        return self._json.decode(data)
+
+@define
+class ObjectStoreEncoder(Encoder):
+    """
+    Wraps another encoder, putting payloads larger than `threshold` bytes in
+    a shared directory and sending only a reference to them. The directory
+    must be reachable, at the same path, by the clients and workers.
+
+    Payloads are stored under their sha256 hash. Each message has its own id
+    and timestamp, so every message large enough gets its own stored payload.
+    Payloads older than `max_age` are pruned, at most once every
+    `prune_interval` seconds, as part of encoding.
+    """
+
+    encoder : Encoder = field()
+    """ Encodes the payloads and the references. """
+
+    store_dir : Path = field(converter=Path)
+    """ Where large payloads are kept. """
+
+    threshold : int = field(default=65536)
+    """ Payloads larger than this many bytes go in the store. """
+
+    max_age : float = field(default=7 * 24 * 3600.0)
+    """ Seconds before a stored payload is pruned, never if negative. """
+
+    prune_interval : float = field(default=3600.0)
+    """ Minimum seconds between prunes of the store. """
+
+    _last_prune : Optional[float] = field(default=None, init=False)
+    """ Monotonic time of the last prune. """
+
+    _lock : threading.Lock = field(factory=threading.Lock, init=False)
+    """ Guards `_last_prune`. """
+
+    def payload_file(self, digest : str) -> Path:
+        """ The file a payload with the given hash is stored in. """
+        return self.store_dir / f"{digest}.bin"
+
+    def encode(self, data : Dict[str,Any]) -> bytes:
+        payload = self.encoder.encode(data)
+
+        if len(payload) <= self.threshold:
+            return payload
+
+        digest = hashlib.sha256(payload).hexdigest()
+        payload_file = self.payload_file(digest)
+
+        if not payload_file.exists():
+            self.store_dir.mkdir(parents=True, exist_ok=True)
+            # Write then rename so readers never see a partial payload. The
+            # temp file must be unique across every host sharing the store.
+            fd, tmp_file = tempfile.mkstemp(
+                dir=self.store_dir,
+                prefix=f"{digest}.",
+                suffix='.tmp',
+            )
+            try:
+                with os.fdopen(fd, 'wb') as fp:
+                    fp.write(payload)
+                os.replace(tmp_file, payload_file)
+            except BaseException:
+                Path(tmp_file).unlink(missing_ok=True)
+                raise
+        else:
+            # Keep it from being pruned while the message is in flight.
+            payload_file.touch()
+
+        self._maybe_prune()
+
+        return self.encoder.encode({STORE_REF_KEY: digest})
+
+    def decode(self, data : bytes) -> Dict[str,Any]:
+        decoded = self.encoder.decode(data)
+
+        if not (isinstance(decoded, dict) and STORE_REF_KEY in decoded):
+            return decoded
+
+        payload_file = self.payload_file(decoded[STORE_REF_KEY])
+        try:
+            payload = payload_file.read_bytes()
+        except OSError as err:
+            log.exception(
+                "Could not read message payload from object store.",
+                payload_file=str(payload_file),
+                err=err,
+            )
+            raise DecodeError(
+                f"missing stored payload {str(payload_file)}", data, err,
+            ) from None
+
+        return self.encoder.decode(payload)
+
+    def _maybe_prune(self):
+        """
+        Removes old payloads from the store if it's been a while.
+        """
+
+        if self.max_age < 0:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            if self._last_prune != None and \
+               now - self._last_prune < self.prune_interval:
+                return
+            self._last_prune = now
+
+        cutoff = time.time() - self.max_age
+        pruned = 0
+        for payload_file in self.store_dir.glob('*.bin'):
+            try:
+                if payload_file.stat().st_mtime < cutoff:
+                    payload_file.unlink()
+                    pruned += 1
+            except OSError:
+                # Another process got to it first.
+                continue
+
+        if pruned:
+            log.info(
+                "Pruned old message payloads.",
+                store_dir=str(self.store_dir),
+                pruned=pruned,
+            )
+
+encoders = ['json', 'msgpack', 'zstd_json']
+""" The supported message formats. """
+
+def make_encoder(config) -> Encoder:
+    """
+    Creates the message encoder described by an `EncoderConfig`.
+    """
+
+    if config.format == 'json':
+        encoder = JSONEncoder()
+    elif config.format == 'msgpack':
+        encoder = MsgpackEncoder()
+    elif config.format == 'zstd_json':
+        encoder = ZstdJSONEncoder(level=config.zstd_level)
+    else:
+        err = RuntimeError("Unsupported message encoder.")
+        log.exception(
+            f"Message encoder format must be one of {encoders}.",
+            format=config.format,
+            err=err,
+        )
+        raise err
+
+    if config.store_threshold >= 0:
+        encoder = ObjectStoreEncoder(
+            encoder=encoder,
+            store_dir=config.store_dir,
+            threshold=config.store_threshold,
+            max_age=config.store_max_age,
+        )
+
+    return encoder
@@ -0,0 +1,436 @@
+from simple_uam.util.logging import get_logger
+from typing import List, Dict, Tuple, Optional, Callable, Any
+from attrs import define, field
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from dramatiq import Middleware
+import threading
+import bisect
+import time
+import os
+
+log = get_logger(__name__)
+
+_COLLECTORS : Dict[str,Callable[[],Dict[str,Any]]] = dict()
+""" Gauge collectors, see `register_collector`. """
+
+_COLLECTORS_LOCK = threading.Lock()
+""" Guards `_COLLECTORS`. """
+
+def register_collector(name : str, collect : Callable[[],Dict[str,Any]]):
+    """
+    Adds a set of gauges to the worker metrics. Meant for the stats of
+    process wide objects, like the workspace pool or corpus cache.
+
+    Arguments:
+      name: Prefix for the gauges, e.g. 'workspace_pool'.
+      collect: Called on every export, returns a dict from gauge name to
+        value. Values that aren't numbers are skipped.
+    """
+
+    with _COLLECTORS_LOCK:
+        _COLLECTORS[name] = collect
+
+def _labels(labels : Dict[str,str]) -> str:
+    """
+    Formats a set of labels in the prometheus text format.
+    """
+
+    if not labels:
+        return ""
+
+    def escape(val):
+        return str(val).replace('\\', '\\\\').replace('"', '\\"') \
+                       .replace('\n', '\\n')
+
+    return "{" + ",".join(
+        f'{k}="{escape(v)}"' for k, v in sorted(labels.items())
+    ) + "}"
+
+@define
+class Histogram():
+    """
+    A cumulative histogram of observed values.
+    """
+
+    buckets : List[float] = field()
+    """ Sorted upper bounds of the buckets, +Inf is implicit. """
+
+    counts : List[int] = field(init=False)
+    """ Observations in each bucket, not cumulative. """
+
+    @counts.default
+    def _counts_def(self):
+        return [0] * (len(self.buckets) + 1)
+
+    total : float = field(default=0.0, init=False)
+    """ Sum of all observations. """
+
+    count : int = field(default=0, init=False)
+    """ Number of observations. """
+
+    def observe(self, value : float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def render(self, name : str, labels : Dict[str,str]) -> List[str]:
+        lines = list()
+        cumulative = 0
+        bounds = [str(float(b)) for b in self.buckets] + ["+Inf"]
+        for bound, num in zip(bounds, self.counts):
+            cumulative += num
+            lines.append(
+                f"{name}_bucket{_labels(dict(labels, le=bound))} {cumulative}"
+            )
+        lines.append(f"{name}_sum{_labels(labels)} {self.total}")
+        lines.append(f"{name}_count{_labels(labels)} {self.count}")
+        return lines
+
+@define
+class MetricsRegistry():
+    """
+    The metrics of a single worker process, rendered in the prometheus text
+    format.
+    """
+
+    buckets : List[float] = field()
+    """ Bucket bounds for every histogram. """
+
+    const_labels : Dict[str,str] = field(factory=dict)
+    """ Labels added to every metric, to tell worker processes apart. """
+
+    _counters : Dict[str,Dict[tuple,float]] = field(factory=dict, init=False)
+    """ Counter values by metric name and sorted label items. """
+
+    _gauges : Dict[str,Dict[tuple,float]] = field(factory=dict, init=False)
+    """ Gauge values by metric name and sorted label items. """
+
+    _histograms : Dict[str,Dict[tuple,Histogram]] = field(
+        factory=dict,
+        init=False,
+    )
+    """ Histograms by metric name and sorted label items. """
+
+    _help : Dict[str,str] = field(factory=dict, init=False)
+    """ Help text for each metric. """
+
+    _lock : threading.Lock = field(factory=threading.Lock, init=False)
+    """ Guards the metric values, hooks run on every worker thread. """
+
+    def describe(self, name : str, text : str):
+        """ Sets the help text for a metric. """
+        self._help[name] = text
+
+    def inc(self, name : str, amount : float = 1, **labels):
+        """ Increments a counter. """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, dict())
+            series[key] = series.get(key, 0) + amount
+
+    def add(self, name : str, amount : float, **labels):
+        """ Adds to a gauge, which can go up or down. """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._gauges.setdefault(name, dict())
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name : str, value : float, **labels):
+        """ Adds an observation to a histogram. """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, dict())
+            if key not in series:
+                series[key] = Histogram(buckets=self.buckets)
+            series[key].observe(value)
+
+    def collect(self) -> Dict[str,float]:
+        """
+        Runs the registered collectors, a failing collector only loses its
+        own gauges.
+        """
+
+        with _COLLECTORS_LOCK:
+            collectors = list(_COLLECTORS.items())
+
+        gauges = dict()
+        for prefix, collect in collectors:
+            try:
+                values = collect()
+            except Exception as err:
+                log.warning(
+                    "Metrics collector failed.",
+                    collector=prefix,
+                    err=str(err),
+                )
+                continue
+            for key, val in values.items():
+                if isinstance(val, bool):
+                    val = int(val)
+                if isinstance(val, (int, float)):
+                    gauges[f"simple_uam_{prefix}_{key}"] = val
+        return gauges
+
+    def render(self) -> str:
+        """
+        All the metrics in the prometheus text exposition format.
+        """
+
+        lines = list()
+
+        def header(name, kind):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def labels(key):
+            return dict(self.const_labels, **dict(key))
+
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                header(name, 'counter')
+                for key, val in series.items():
+                    lines.append(f"{name}{_labels(labels(key))} {val}")
+
+            for name, series in sorted(self._gauges.items()):
+                header(name, 'gauge')
+                for key, val in series.items():
+                    lines.append(f"{name}{_labels(labels(key))} {val}")
+
+            for name, series in sorted(self._histograms.items()):
+                header(name, 'histogram')
+                for key, hist in series.items():
+                    lines.extend(hist.render(name, labels(key)))
+
+        for name, val in sorted(self.collect().items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name}{_labels(self.const_labels)} {val}")
+
+        return "\n".join(lines) + "\n"
+
+class WorkerMetrics(Middleware):
+    """
+    Dramatiq middleware that tracks messages processed by each actor, their
+    latency, and the per-stage timings sessions return in their metadata,
+    then exports them along with any registered collectors.
+
+    Exporters, started when a worker process boots:
+      - 'http': Serves '/metrics' on the first free port from `port`, so
+        each worker process gets its own port.
+      - 'textfile': Writes '<textfile_dir>/simple_uam_worker_<pid>.prom'
+        every `interval` seconds, for a node exporter's textfile collector.
+    """
+
+    exporters = ['http', 'textfile']
+    """ Supported exporters. """
+
+    def __init__(self,
+                 exporter : str = 'http',
+                 host : str = "127.0.0.1",
+                 port : int = 9191,
+                 textfile_dir : Optional[str] = None,
+                 interval : float = 15.0,
+                 buckets : Optional[List[float]] = None,
+                 max_ports : int = 64):
+
+        if exporter not in self.exporters:
+            raise RuntimeError(
+                f"Unknown metrics exporter '{exporter}', must be one of "
+                f"{self.exporters}."
+            )
+
+        self.exporter = exporter
+        self.host = host
+        self.port = port
+        self.textfile_dir = textfile_dir
+        self.interval = interval
+        self.max_ports = max_ports
+        self.registry = MetricsRegistry(
+            buckets=sorted(buckets or [1, 10, 60, 300, 1800]),
+        )
+        self._starts : Dict[str,float] = dict()
+        self._starts_lock = threading.Lock()
+        self._server : Optional[ThreadingHTTPServer] = None
+        self._stop = threading.Event()
+
+        self.registry.describe(
+            'simple_uam_messages_total',
+            "Messages processed, by actor and outcome.")
+        self.registry.describe(
+            'simple_uam_messages_in_progress',
+            "Messages currently being processed, by actor.")
+        self.registry.describe(
+            'simple_uam_message_duration_seconds',
+            "Time spent processing each message, by actor.")
+        self.registry.describe(
+            'simple_uam_session_op_duration_seconds',
+            "Time spent in each session operation, by actor and operation.")
+
+    def before_process_message(self, broker, message):
+        with self._starts_lock:
+            self._starts[message.message_id] = time.monotonic()
+        self.registry.add(
+            'simple_uam_messages_in_progress', 1,
+            actor=message.actor_name,
+        )
+
+    def after_process_message(self, broker, message, *,
+                              result=None, exception=None):
+
+        with self._starts_lock:
+            start = self._starts.pop(message.message_id, None)
+
+        actor = message.actor_name
+        if start != None:
+            self.registry.add('simple_uam_messages_in_progress', -1, actor=actor)
+
+        status = 'success'
+        if exception != None:
+            status = 'failure'
+        elif isinstance(result, dict) and result.get('cached_result'):
+            status = 'cached'
+        self.registry.inc('simple_uam_messages_total', actor=actor, status=status)
+
+        if start != None:
+            self.registry.observe(
+                'simple_uam_message_duration_seconds',
+                time.monotonic() - start,
+                actor=actor,
+            )
+
+        # Sessions return their per-op timings in their metadata, cached
+        # results carry the timings of the original run so are skipped.
+        if isinstance(result, dict) and not result.get('cached_result'):
+            for op, timing in result.get('op_timings', dict()).items():
+                self.registry.observe(
+                    'simple_uam_session_op_duration_seconds',
+                    timing.get('duration', 0),
+                    actor=actor,
+                    op=op,
+                )
+
+    def after_skip_message(self, broker, message):
+        with self._starts_lock:
+            start = self._starts.pop(message.message_id, None)
+        if start != None:
+            self.registry.add(
+                'simple_uam_messages_in_progress', -1,
+                actor=message.actor_name,
+            )
+        self.registry.inc(
+            'simple_uam_messages_total',
+            actor=message.actor_name,
+            status='skipped',
+        )
+
+    def after_worker_boot(self, broker, worker):
+        self.registry.const_labels = dict(pid=str(os.getpid()))
+        if self.exporter == 'http':
+            self._start_http()
+        else:
+            self._start_textfile()
+
+    def before_worker_shutdown(self, broker, worker):
+        self._stop.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self.exporter == 'textfile':
+            try:
+                self.textfile.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _start_http(self):
+
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header(
+                    "Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        for port in range(self.port, self.port + self.max_ports):
+            try:
+                self._server = ThreadingHTTPServer((self.host, port), Handler)
+                break
+            except OSError:
+                continue
+
+        if not self._server:
+            log.warning(
+                "No free port for the metrics exporter, metrics disabled.",
+                host=self.host,
+                ports=(self.port, self.port + self.max_ports - 1),
+            )
+            return
+
+        self._server.daemon_threads = True
+        threading.Thread(
+            target=self._server.serve_forever,
+            name="metrics-exporter",
+            daemon=True,
+        ).start()
+
+        log.info(
+            "Serving worker metrics.",
+            host=self.host,
+            port=self._server.server_address[1],
+        )
+
+    @property
+    def textfile(self) -> Path:
+        """ The file this process writes its metrics to. """
+        return Path(self.textfile_dir) / f"simple_uam_worker_{os.getpid()}.prom"
+
+    def write_textfile(self):
+        """
+        Writes the metrics to `textfile`, atomically so the collector never
+        sees a partial file.
+        """
+
+        out = self.textfile
+        out.parent.mkdir(parents=True, exist_ok=True)
+        tmp = out.with_name(out.name + '.tmp')
+        tmp.write_text(self.registry.render())
+        os.replace(tmp, out)
+
+    def _start_textfile(self):
+
+        def export():
+            while not self._stop.is_set():
+                try:
+                    self.write_textfile()
+                except Exception as err:
+                    log.warning(
+                        "Could not write metrics file.",
+                        textfile=str(self.textfile),
+                        err=str(err),
+                    )
+                self._stop.wait(self.interval)
+
+        threading.Thread(
+            target=export,
+            name="metrics-exporter",
+            daemon=True,
+        ).start()
+
+        log.info(
+            "Writing worker metrics to file.",
+            textfile=str(self.textfile),
+            interval=self.interval,
+        )
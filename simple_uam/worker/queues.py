@@ -0,0 +1,89 @@
+from attrs import define, field
+from typing import Dict, List, Any
+from queue import PriorityQueue
+from dramatiq.middleware import Middleware
+from dramatiq.common import q_name
+import heapq
+
+from simple_uam.util.logging import get_logger
+
+log = get_logger(__name__)
+
+def _item_queue(item) -> str:
+    """
+    The queue a work queue item came from. Items are either objects with a
+    'message' field or (priority, ..., message) tuples, depending on the
+    version of dramatiq.
+    """
+
+    message = getattr(item, 'message', None)
+    if message == None:
+        message = item[-1]
+    return q_name(message.queue_name)
+
+class WeightedWorkQueue(PriorityQueue):
+    """
+    A drop-in replacement for a dramatiq worker's work queue that shares the
+    worker threads between queues by weight.
+
+    Each queue gets its own lane, ordered by actor priority like the normal
+    work queue. When a thread picks up work the lanes with messages are
+    chosen by smooth weighted round robin, so with weights of 3 and 1 the
+    first queue gets 3 of every 4 threads that free up while both have work,
+    and either gets every thread when the other is empty.
+    """
+
+    def __init__(self, weights : Dict[str,float], maxsize : int = 0):
+        self.weights = {q_name(k) : float(v) for k, v in weights.items()}
+        super().__init__(maxsize)
+
+    def weight(self, queue_name : str) -> float:
+        """ The weight of a queue, queues without one get 1. """
+        return self.weights.get(queue_name, 1.0)
+
+    # The following are the hooks `queue.Queue` calls with its mutex held.
+
+    def _init(self, maxsize):
+        self.lanes : Dict[str,List[Any]] = dict()
+        self.credit : Dict[str,float] = dict()
+
+    def _qsize(self):
+        return sum(len(lane) for lane in self.lanes.values())
+
+    def _put(self, item):
+        heapq.heappush(self.lanes.setdefault(_item_queue(item), list()), item)
+
+    def _get(self):
+        active = [name for name, lane in self.lanes.items() if lane]
+        total = sum(self.weight(name) for name in active)
+
+        for name in active:
+            self.credit[name] = self.credit.get(name, 0.0) + self.weight(name)
+
+        chosen = max(active, key=lambda name: self.credit[name])
+        self.credit[chosen] -= total
+
+        return heapq.heappop(self.lanes[chosen])
+
+    @property
+    def lane_sizes(self) -> Dict[str,int]:
+        """ The number of messages waiting in each lane. """
+        with self.mutex:
+            return {name : len(lane) for name, lane in self.lanes.items()}
+
+@define
+class QueueWeights(Middleware):
+    """
+    Swaps a worker's work queue for a `WeightedWorkQueue` as the worker
+    boots, before any messages are fetched.
+    """
+
+    weights : Dict[str,float] = field(factory=dict)
+    """ The weight of each queue, queues without one get 1. """
+
+    def before_worker_boot(self, broker, worker):
+        worker.work_queue = WeightedWorkQueue(self.weights)
+        log.info(
+            "Sharing worker threads between queues by weight.",
+            weights=self.weights,
+        )
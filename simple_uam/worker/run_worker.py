@@ -1,4 +1,5 @@
 
+from simple_uam.util.config import Config, BrokerConfig
 from simple_uam.util.logging import get_logger
 from urllib.parse import urlparse
 from pathlib import Path
@@ -40,7 +41,8 @@ def run_worker_node(modules : list,
                     threads: int,
                     shutdown_timeout: int = 600000,
                     skip_logging : bool = False,
-                    verbose : int = 0
+                    verbose : int = 0,
+                    queues : Optional[List[str]] = None,
 ):
     """
     Runs a worker node with various settings.
@@ -52,10 +54,15 @@ def run_worker_node(modules : list,
       shutdown_timeout: Worker shutdown timeout in milliseconds.
       skip_logging: skip dramatiq's orthogonal logging process.
       verbose: Controls verbosity of dramatiq worker.
+      queues: The queues to listen to. Default: The broker config's
+        `routing.worker_queues`, or every queue if that's empty.
     """
 
     broker = get_broker()
 
+    if queues == None:
+        queues = list(Config[BrokerConfig].routing.worker_queues.keys())
+
     log.info(
         "Setting up dramatiq broker.",
         type=type(broker).__name__,
@@ -71,6 +78,7 @@ def run_worker_node(modules : list,
         skip_logging=skip_logging,
         verbose=verbose,
         modules=[getattr(m,'__name__',m) for m in modules],
+        queues=list(queues),
     )
 
     log.info(
@@ -5,10 +5,16 @@ SimpleUAM windows node setup scripts.
 from .manager import WorkspaceManager
 from .session import Session
 from .workspace import Workspace
+from .results_index import ResultsIndex
+from .retention import RetentionPolicy
+from .pool import WorkspacePool
 from typing import List # noqa
 
 __all__: List[str] = [
     'WorkspaceManager',
     'Session',
     'Workspace',
+    'ResultsIndex',
+    'RetentionPolicy',
+    'WorkspacePool',
 ]  # noqa: WPS410 (the only __variable__ we use)
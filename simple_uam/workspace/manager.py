@@ -1,4 +1,4 @@
-from typing import List, Tuple, Optional, Union
+from typing import List, Tuple, Optional, Union, Dict
 from pathlib import Path
 from attrs import define, frozen, field
 from filelock import Timeout, FileLock
@@ -7,17 +7,41 @@ import tempfile
 import subprocess
 import random
 import string
+import time
 from datetime import datetime
-import heapq
+import os
+import json
+import uuid
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from simple_uam.util.config.workspace_config import \
     ResultsConfig, WorkspaceConfig
 from simple_uam.util.logging import get_logger
+from simple_uam.util.system import ArchiveWriter, Manifest, \
+    read_archive_json
 from simple_uam.util.invoke import task
 from simple_uam.util.config import Config
 
+from .results_index import ResultsIndex
+from .retention import RetentionPolicy, scan_records
+from .pool import WorkspacePool
+
 log = get_logger(__name__)
 
+_RESET_EXECUTOR = ThreadPoolExecutor(
+    max_workers=1,
+    thread_name_prefix="workspace-reset",
+)
+""" Runs background workspace resets, one at a time. """
+
+_HOUSEKEEPERS : Dict[Path,threading.Thread] = dict()
+""" Idle reset threads that have been started, keyed by locks dir. """
+
+_HOUSEKEEPERS_LOCK = threading.Lock()
+""" Guards `_HOUSEKEEPERS`. """
+
 @frozen
 class WorkspaceManager():
     """
@@ -82,6 +106,20 @@ class WorkspaceManager():
         # No lock free
         return None
 
+    @property
+    def workspace_pool(self) -> WorkspacePool:
+        """
+        The pool that hands out workspaces to sessions in this process, waiting
+        for a workspace to free up when they're all busy.
+        """
+
+        return WorkspacePool.shared(
+            self.config,
+            selection=self.config.workspace_selection,
+            max_waiters=self.config.workspace_max_waiters,
+            poll_interval=self.config.workspace_poll_interval,
+        )
+
     def init_dirs(self):
         """
         Creates the various workspace directories and subdirs that this class
@@ -120,15 +158,80 @@ class WorkspaceManager():
             lockfiles.append(self.config.reference_lockfile)
         if not skip_results:
             lockfiles.append(self.config.results_lockfile)
+            lockfiles.append(self.config.results_index_lockfile)
 
         for lf in lockfiles:
             lf.unlink(missing_ok=True)
 
+    @property
+    def results_index(self) -> Optional[ResultsIndex]:
+        """
+        The index of the archives in the results dir, if enabled.
+
+        Note: The index object is shared by the whole process, so each use
+              only reads the entries added since the last.
+        """
+
+        if not self.config.results_index_path:
+            return None
+
+        return ResultsIndex.shared(
+            index_file=self.config.results_index_path,
+            lock_file=self.config.results_index_lockfile,
+        )
+
+    @property
+    def result_writer(self) -> ArchiveWriter:
+        """
+        The archive writer for session results, as configured.
+        """
+
+        return ArchiveWriter(
+            codec=self.config.results.compression,
+            level=self.config.results.compression_level,
+            threads=self.config.results.compression_threads,
+            store_patterns=list(self.config.results.store_patterns),
+        )
+
+    def result_path(self,
+                    prefix : str,
+                    suffix : Optional[str] = None) -> Path:
+        """
+        Creates a new unique path for a result in the results directory.
+
+        Arguments:
+           prefix: The prefix to the final file name.
+           suffix: The file extension to use, defaults to the one for the
+             configured result writer.
+        """
+
+        if not suffix:
+            suffix = self.result_writer.suffix
+
+        if not suffix.startswith('.'):
+            suffix = "." + suffix
+
+        time_str = datetime.now().strftime("%Y-%m-%d")
+        uniq_str = ''.join(random.choices(
+            string.ascii_lowercase + string.digits, k=10))
+
+        return self.config.results_path / f"{prefix}-{time_str}-{uniq_str}{suffix}"
+
+    def partial_result_path(self, out_path : Path) -> Path:
+        """
+        The path a result is written to, within the results directory, before
+        it's complete and renamed to `out_path`.
+        """
+
+        return out_path.with_name(f"{out_path.name}.partial")
+
     def add_result(self,
                    archive : Union[str,Path],
                    prefix : Optional[str] = None,
                    suffix : Optional[str] = None,
                    copy : bool = True,
+                   out_path : Optional[Path] = None,
+                   metadata : Optional[Dict] = None,
     ) -> Optional[Path]:
         """
         Adds an archive to the result directory.
@@ -138,6 +241,11 @@ class WorkspaceManager():
            prefix: The prefix to the final file name.
            suffix: The file extension to use.
            copy: copy the file if true, otherwise move.
+           out_path: The final location of the result, from `result_path`.
+             If given and the archive was written directly into the results
+             dir it's renamed in place.
+           metadata: The session metadata stored in the archive, which is
+             summarized in the results index.
 
         Returns:
            The path to the resulting file in results dir, none if
@@ -154,21 +262,28 @@ class WorkspaceManager():
         if not archive.exists() or not archive.is_file():
             raise RuntimeError(f"Expected {archive} to be file, cannot proceed.")
 
-        # Get archive file name setup
-        time_str = datetime.now().strftime("%Y-%m-%d")
-        uniq_str = ''.join(random.choices(
-            string.ascii_lowercase + string.digits, k=10))
+        # Archive was streamed into the results dir, so just rename it.
+        if out_path and not copy and \
+           archive.resolve().parent == self.config.results_path.resolve():
+
+            log.info(
+                "Finalizing result archive.",
+                out_path=str(out_path),
+                archive=str(archive),
+            )
+            os.replace(archive, out_path)
+            self.index_result(out_path, metadata)
+            return out_path
 
+        # Get archive file name setup
         if not prefix:
             prefix = archive.stem
 
         if not suffix:
             suffix = archive.suffix
 
-        if not suffix.startswith('.'):
-            suffix = "." + suffix
-
-        out_file = f"{prefix}-{time_str}-{uniq_str}{suffix}"
+        out_file = out_path.name if out_path else \
+            self.result_path(prefix, suffix).name
 
         with tempfile.TemporaryDirectory() as tmp_dir:
 
@@ -187,52 +302,400 @@ class WorkspaceManager():
                 tmp_dir=tmp_dir,
             )
             shutil.move(archive, out_path)
+            self.index_result(out_path, metadata)
 
             # Return the resulting filepath
             return out_path
 
-    def prune_results(self):
+    def index_result(self, archive : Path, metadata : Optional[Dict] = None):
         """
-        Deletes the oldest files in the results dir if there are too many.
+        Adds an archive in the results dir to the results index, if enabled.
+        A failure to update the index doesn't fail the session, clients fall
+        back to opening archives for anything that isn't indexed.
         """
 
-        # Never pruning results, don't bother.
-        if self.config.results.max_count < 0:
+        index = self.results_index
+        if not index:
             return
 
-        # Gather results that are old enough to prune.
-        now = datetime.now()
-        results = list()
-        total_results = 0
-        for result in self.config.results_path.iterdir():
-            if result.is_file():
-                total_results += 1
-                access_time = datime.from_timestamp(result.stat().st_atime)
-                staletime = (now - access_time).total_seconds()
-                if staletime > self.config.results.min_staletime:
-                    results.append(tuple(staletime,result))
-
-        # Short circuit if there's nothing to prune
-        surplus_results = total_results - self.config.results.max_count
-        if surplus_results <= 0:
-            return
+        try:
+            self.maintain_results_index()
+            index.add(archive, metadata)
+        except Exception as err:
+            log.exception(
+                "Could not add result to index.",
+                archive=str(archive),
+                err=err,
+            )
+
+    def result_cache_key(self, name : str, input_hash : str) -> Optional[str]:
+        """
+        The key a session's result is cached under, combining the session
+        name, a hash of the session's input, and the reference dir version so
+        that updating the reference dir invalidates the cache.
+
+        Arguments:
+          name: The session name.
+          input_hash: A hash of everything the session's result depends on.
+
+        Returns:
+          The key, or None if caching is disabled or the reference dir has no
+          recorded version.
+        """
+
+        if not self.config.results.cache_results or not self.results_index:
+            return None
+
+        version = self.reference_version()
+        if version == None:
+            return None
+
+        key = json.dumps([name, input_hash, version])
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def cached_result(self,
+                      cache_key : Optional[str],
+                      metadata : Optional[Dict] = None,
+    ) -> Optional[Dict]:
+        """
+        Looks for an existing result with the given cache key, without
+        needing a workspace. Cache entries go away when their archive is
+        pruned from the results dir.
+
+        Arguments:
+          cache_key: The key from `result_cache_key`.
+          metadata: The new session's metadata. On a hit this is merged into
+            the cached metadata and its message id is pointed at the cached
+            archive in the results index.
+
+        Returns:
+          The cached result's metadata, or None on a miss.
+        """
+
+        index = self.results_index
+        if not cache_key or not index:
+            return None
+
+        record = index.lookup_key(cache_key)
+        if not record:
+            return None
+
+        archive = self.config.results_path / record['archive']
+        message_id = None
+        if metadata:
+            message_id = metadata.get('message_info', dict()).get('message_id')
+
+        try:
+            # Counts as an access, so pruning leaves the archive alone for a
+            # while.
+            if message_id:
+                index.alias(archive, message_id)
+            else:
+                index.touch(archive)
+
+            cached = read_archive_json(
+                archive,
+                self.config.results.metadata_file,
+            )
+        except Exception as err:
+            log.warning(
+                "Could not read cached result, ignoring it.",
+                archive=str(archive),
+                cache_key=cache_key,
+                err=str(err),
+            )
+            return None
+
+        if cached == None:
+            return None
+
+        log.info(
+            "Found cached result.",
+            archive=str(archive),
+            cache_key=cache_key,
+            message_id=message_id,
+        )
+
+        cached.update(metadata or dict())
+        cached['result_archive'] = record['archive']
+        cached['cached_result'] = dict(
+            message_id=record.get('message_id'),
+            cache_key=cache_key,
+        )
+        return cached
+
+    def rebuild_results_index(self):
+        """
+        Rebuilds the results index by reading every archive in the results
+        dir.
+        """
+
+        index = self.results_index
+        if not index:
+            raise RuntimeError("The results index is disabled in the config.")
 
-        # Gather the oldest.
-        results = heapq.nlargest(
-            surplus_results,
-            results,
-            key=lambda t: t[0],
+        index.rebuild(
+            self.config.results_path,
+            metadata_file=self.config.results.metadata_file,
         )
 
+    def maintain_results_index(self):
+        """
+        Builds the results index from the results dir the first time it's
+        used, so archives from before it was enabled aren't invisible, and
+        compacts it once it's mostly superseded operations.
+        """
+
+        index = self.results_index
+        if not index:
+            return
+
+        if not index.index_file.exists():
+            index.rebuild(
+                self.config.results_path,
+                metadata_file=self.config.results.metadata_file,
+                missing_only=True,
+            )
+        elif index.needs_compaction():
+            index.compact()
+
+    @property
+    def retention_policy(self) -> RetentionPolicy:
+        """
+        The policy for deleting old results, as configured.
+        """
+        return RetentionPolicy.from_config(self.config.results)
+
+    def result_records(self) -> List[Dict]:
+        """
+        Records for every archive in the results dir, from the results index
+        if enabled, otherwise by scanning the dir.
+        """
+
+        index = self.results_index
+        if index:
+            return index.records
+        return scan_records(self.config.results_path)
+
+    def prune_results(self, dry_run : bool = False) -> List[Dict]:
+        """
+        Deletes result archives until the results dir is within the configured
+        limits, see `RetentionPolicy` for details.
+
+        Arguments:
+          dry_run: Only report what would be deleted.
+
+        Returns:
+          The records of the archives that were (or would be) deleted, each
+          with a 'reason'.
+        """
+
+        policy = self.retention_policy
+
+        # Never pruning results, just keep the index in shape.
+        if not policy.enabled:
+            if not dry_run:
+                self.maintain_results_index()
+            return list()
+
+        def last_access(record):
+            # Only called for deletion candidates, so the stat is cheap.
+            try:
+                stat = (self.config.results_path / record['archive']).stat()
+                return max(stat.st_atime, stat.st_mtime)
+            except FileNotFoundError:
+                return 0
+
+        if dry_run:
+            return policy.plan(self.result_records(), last_access=last_access)
+
         try:
             # Presumably someone else is also pruning if there's a lock,
             # Just let them do the work, and move on.
             with self.results_lock().acquire(blocking=False):
-                for result in results:
+
+                self.maintain_results_index()
+
+                victims = policy.plan(
+                    self.result_records(),
+                    last_access=last_access,
+                )
+
+                for victim in victims:
                     # If a result got deleted before this point, that's fine.
-                    results.unlink(missing_ok=True)
+                    archive = self.config.results_path / victim['archive']
+                    archive.unlink(missing_ok=True)
+
+                index = self.results_index
+                if index and victims:
+                    index.remove(v['archive'] for v in victims)
+                    self.maintain_results_index()
+
         except Timeout:
-            pass
+            return list()
+
+        if victims:
+            log.info(
+                "Pruned results dir.",
+                results_dir=str(self.config.results_path),
+                num_deleted=len(victims),
+                bytes_deleted=sum(v['size'] for v in victims),
+            )
+
+        return victims
+
+    def reference_version(self) -> Optional[str]:
+        """
+        An id that changes every time the reference dir is set up, None if
+        it was set up before versions were recorded.
+        """
+
+        try:
+            return self.config.reference_version_file.read_text().strip()
+        except FileNotFoundError:
+            return None
+
+    def clean_marker(self, num : int) -> Path:
+        """
+        The file that marks a workspace as already reset, kept outside the
+        workspace so it's never part of a result.
+        """
+
+        return self.config.locks_path / \
+            f"{self.config.workspace_subdir(num)}.clean.json"
+
+    def mark_clean(self, num : int, manifest : Dict):
+        """
+        Marks a workspace, which the caller holds the lock for, as freshly
+        reset.
+
+        Arguments:
+          num: The workspace number.
+          manifest: A snapshot of the workspace right after the reset, taken
+            with the session's `result_exclude_patterns`.
+        """
+
+        marker = self.clean_marker(num)
+        tmp_marker = marker.with_name(marker.name + '.tmp')
+
+        with tmp_marker.open('w') as fp:
+            json.dump(dict(
+                reference_version=self.reference_version(),
+                manifest=manifest,
+            ), fp)
+        os.replace(tmp_marker, marker)
+
+    def take_clean_marker(self,
+                          num : int,
+                          exclude : List[str] = [],
+    ) -> Optional[Dict]:
+        """
+        Checks whether a workspace, which the caller holds the lock for, is
+        still in the state it was marked clean in. The marker is removed
+        either way, since the caller is about to use the workspace.
+
+        Arguments:
+          num: The workspace number.
+          exclude: The patterns the marker's manifest was taken with.
+
+        Returns:
+          The marker's manifest if the workspace is still clean, otherwise
+          None.
+        """
+
+        marker = self.clean_marker(num)
+
+        try:
+            with marker.open('r') as fp:
+                contents = json.load(fp)
+        except (FileNotFoundError, ValueError):
+            return None
+        finally:
+            marker.unlink(missing_ok=True)
+
+        if contents.get('reference_version') != self.reference_version():
+            log.info(
+                "Reference dir changed since workspace was reset.",
+                workspace=num,
+            )
+            return None
+
+        manifest = {k : tuple(v) for k, v in contents['manifest'].items()}
+        current = Manifest.snapshot(
+            self.config.workspace_path(num),
+            exclude=exclude,
+        )
+
+        if current != manifest:
+            log.info(
+                "Workspace changed since it was reset.",
+                workspace=num,
+            )
+            return None
+
+        return manifest
+
+    def schedule_reset(self, num : int, reset_fn):
+        """
+        Resets a workspace in the background, if nothing else grabs it first.
+
+        Arguments:
+          num: The workspace number.
+          reset_fn: Called with the workspace number while holding its lock,
+            resets the workspace and returns a snapshot for `mark_clean`.
+        """
+
+        def background_reset():
+
+            lock_tuple = self.workspace_pool.try_acquire(num)
+            if not lock_tuple:
+                # A session is using or waiting for it, nothing to do.
+                return
+
+            try:
+                if self.clean_marker(num).exists():
+                    return
+                log.info("Resetting idle workspace.", workspace=num)
+                self.mark_clean(num, reset_fn(num))
+            except Exception as err:
+                log.exception(
+                    "Background workspace reset failed.",
+                    workspace=num,
+                    err=err,
+                )
+            finally:
+                self.workspace_pool.release(*lock_tuple, used=False)
+
+        _RESET_EXECUTOR.submit(background_reset)
+
+    def start_housekeeping(self, reset_fn, interval : float):
+        """
+        Starts a thread, once per process, that resets every idle workspace
+        without a clean marker each interval.
+
+        Arguments:
+          reset_fn: See `schedule_reset`.
+          interval: Seconds between passes over the workspaces.
+        """
+
+        def housekeeping():
+            while True:
+                time.sleep(interval)
+                for num in self.config.workspace_nums:
+                    if not self.clean_marker(num).exists():
+                        self.schedule_reset(num, reset_fn)
+
+        with _HOUSEKEEPERS_LOCK:
+            if self.config.locks_path in _HOUSEKEEPERS:
+                return
+
+            thread = threading.Thread(
+                target=housekeeping,
+                name="workspace-housekeeping",
+                daemon=True,
+            )
+            _HOUSEKEEPERS[self.config.locks_path] = thread
+            thread.start()
 
     def setup_reference_dir(self,**kwargs):
         """
@@ -251,6 +714,8 @@ class WorkspaceManager():
                     self.config.assets_path,
                     **kwargs,
                 )
+                self.config.reference_version_file.write_text(
+                    uuid.uuid4().hex)
         except Timeout as err:
             log.exception(
                 "Could not acquire reference directory lock.",
@@ -0,0 +1,290 @@
+from typing import List, Tuple, Dict, Optional, Any
+from pathlib import Path
+from attrs import define, field
+from filelock import Timeout, FileLock
+from collections import deque
+import threading
+import time
+
+from simple_uam.util.config.workspace_config import WorkspaceConfig
+from simple_uam.util.logging import get_logger
+
+log = get_logger(__name__)
+
+_SHARED_POOLS : Dict[Path,'WorkspacePool'] = dict()
+""" Process wide pools, see `WorkspacePool.shared`. """
+
+_SHARED_LOCK = threading.Lock()
+""" Guards `_SHARED_POOLS`. """
+
+@define
+class WorkspacePool():
+    """
+    Hands out workspaces to sessions, waiting for one to free up instead of
+    failing when they're all busy.
+
+    Within a process waiters are served in FIFO order and woken as soon as
+    a workspace is released. Workspaces held by other processes are only
+    visible through their lockfiles, so those are rechecked every
+    `poll_interval` seconds.
+
+    Selection modes:
+      - 'ordered': Lowest numbered free workspace first.
+      - 'round_robin': The free workspace after the one handed out last.
+      - 'lru': Least recently released workspace first, spreads the work.
+      - 'mru': Most recently released workspace first, prefers workspaces
+        whose files are still in the OS cache.
+    """
+
+    selections = ['ordered', 'round_robin', 'lru', 'mru']
+    """ The supported selection modes. """
+
+    config : WorkspaceConfig = field()
+    """ The config with the workspaces and their lockfiles. """
+
+    selection : str = field(default='ordered')
+    """ How to choose between free workspaces, see class docs. """
+
+    @selection.validator
+    def _selection_valid(self, attr, val):
+        if val not in self.selections:
+            raise RuntimeError(
+                f"Unknown workspace selection '{val}', must be one of "
+                f"{self.selections}."
+            )
+
+    max_waiters : int = field(default=-1)
+    """
+    The number of sessions that can wait for a workspace at once, further
+    requests fail immediately. Negative means no limit.
+    """
+
+    poll_interval : float = field(default=0.5)
+    """ Seconds between checks of the lockfiles held by other processes. """
+
+    _cond : threading.Condition = field(
+        factory=threading.Condition,
+        init=False,
+    )
+    """ Guards the pool state and wakes waiters on release. """
+
+    _queue : deque = field(factory=deque, init=False)
+    """ Tickets of the sessions waiting for a workspace, in arrival order. """
+
+    _last_used : Dict[int,float] = field(factory=dict, init=False)
+    """ Monotonic time each workspace was last released by this process. """
+
+    _next : int = field(default=0, init=False)
+    """ Where the next round robin search starts. """
+
+    _in_use : Dict[int,FileLock] = field(factory=dict, init=False)
+    """ Workspaces held by this process. """
+
+    acquisitions : int = field(default=0, init=False)
+    """ Number of workspaces handed out. """
+
+    waits : int = field(default=0, init=False)
+    """ Number of acquisitions that had to wait. """
+
+    timeouts : int = field(default=0, init=False)
+    """ Number of requests that gave up waiting. """
+
+    rejected : int = field(default=0, init=False)
+    """ Number of requests refused because the wait queue was full. """
+
+    total_wait_time : float = field(default=0.0, init=False)
+    """ Total time, in seconds, spent waiting for workspaces. """
+
+    max_wait_time : float = field(default=0.0, init=False)
+    """ Longest time, in seconds, a single request waited. """
+
+    last_wait_time : Optional[float] = field(default=None, init=False)
+    """ Time, in seconds, the most recent acquisition waited. """
+
+    @classmethod
+    def shared(cls, config : WorkspaceConfig, **kwargs) -> 'WorkspacePool':
+        """
+        Gets the pool for a set of workspaces that's shared by the whole
+        process, creating it with `kwargs` if needed.
+        """
+
+        key = config.locks_path
+        with _SHARED_LOCK:
+            pool = _SHARED_POOLS.get(key)
+            if pool == None:
+                pool = cls(config=config, **kwargs)
+                _SHARED_POOLS[key] = pool
+            return pool
+
+    def _candidates(self, num : Optional[int]) -> List[int]:
+        """
+        The workspaces to try, in order of preference.
+        """
+
+        if num != None:
+            return [num]
+
+        nums = [n for n in self.config.workspace_nums if n not in self._in_use]
+
+        if self.selection == 'round_robin':
+            nums.sort(key=lambda n: (n < self._next, n))
+        elif self.selection == 'lru':
+            nums.sort(key=lambda n: (self._last_used.get(n, 0), n))
+        elif self.selection == 'mru':
+            nums.sort(key=lambda n: (-self._last_used.get(n, 0), n))
+
+        return nums
+
+    def _try_acquire(self, num : Optional[int]) -> Optional[Tuple[int,FileLock]]:
+        """
+        Tries each candidate workspace's lock without blocking.
+        """
+
+        for workspace_num in self._candidates(num):
+            lock = FileLock(self.config.workspace_lockfile(workspace_num))
+            try:
+                lock.acquire(blocking=False)
+            except Timeout:
+                # Will only fail in lock.acquire and that cleans up after itself.
+                continue
+            self._in_use[workspace_num] = lock
+            self._next = workspace_num + 1
+            return (workspace_num, lock)
+        return None
+
+    def acquire(self,
+                num : Optional[int] = None,
+                timeout : Optional[float] = None,
+    ) -> Tuple[int,FileLock]:
+        """
+        Waits for a free workspace and locks it.
+
+        Arguments:
+          num: A specific workspace to wait for, otherwise any will do.
+          timeout: Seconds to wait before giving up, None waits forever.
+
+        Returns:
+          A tuple of workspace number and ALREADY ACQUIRED lock. The caller
+          MUST ensure that it's given back with `release`.
+
+        Raises:
+          RuntimeError: If the wait queue is full or the timeout expires.
+        """
+
+        start = time.monotonic()
+        ticket = object()
+
+        with self._cond:
+
+            # Fast path, nobody's waiting and a workspace is free.
+            acquired = None if self._queue else self._try_acquire(num)
+            waited = acquired == None
+
+            if waited and self.max_waiters >= 0 \
+               and len(self._queue) >= self.max_waiters:
+                self.rejected += 1
+                raise RuntimeError(
+                    "Could not acquire Workspace lock, too many sessions waiting.")
+
+            if waited:
+                self._queue.append(ticket)
+                log.info(
+                    "All workspaces busy, waiting for one to free up.",
+                    waiting=len(self._queue),
+                    workspace=num,
+                )
+
+            try:
+                while waited:
+
+                    # Only the longest waiting session gets to try the locks.
+                    if self._queue[0] is ticket:
+                        acquired = self._try_acquire(num)
+                        if acquired:
+                            break
+
+                    wait = self.poll_interval
+                    if timeout != None:
+                        remaining = timeout - (time.monotonic() - start)
+                        if remaining <= 0:
+                            self.timeouts += 1
+                            raise RuntimeError(
+                                "Could not acquire Workspace lock, timed out "
+                                f"after {timeout}s.")
+                        wait = min(wait, remaining)
+
+                    self._cond.wait(wait)
+
+            finally:
+                if waited:
+                    self._queue.remove(ticket)
+                    self._cond.notify_all()
+
+            wait_time = time.monotonic() - start
+            self.acquisitions += 1
+            self.last_wait_time = wait_time
+            if waited:
+                self.waits += 1
+                self.total_wait_time += wait_time
+                self.max_wait_time = max(self.max_wait_time, wait_time)
+
+        log.info(
+            "Acquired workspace.",
+            workspace=acquired[0],
+            wait_time=wait_time,
+        )
+
+        return acquired
+
+    def try_acquire(self, num : int) -> Optional[Tuple[int,FileLock]]:
+        """
+        Locks a specific workspace if it's free and nobody is waiting,
+        without waiting or counting towards the pool's stats. Meant for
+        housekeeping.
+
+        Returns:
+          A tuple of workspace number and ALREADY ACQUIRED lock, or None.
+        """
+
+        with self._cond:
+            if self._queue or num in self._in_use:
+                return None
+            return self._try_acquire(num)
+
+    def release(self, num : int, lock : FileLock, used : bool = True):
+        """
+        Releases a workspace from `acquire`, waking the next waiter.
+
+        Arguments:
+          num: The workspace number.
+          lock: The workspace's lock.
+          used: Whether a session used the workspace, which updates its last
+            used time for selection.
+        """
+
+        with self._cond:
+            lock.release()
+            self._in_use.pop(num, None)
+            if used:
+                self._last_used[num] = time.monotonic()
+            self._cond.notify_all()
+
+    @property
+    def stats(self) -> Dict[str,Any]:
+        """
+        Counters for this pool, suitable for logging or metrics.
+        """
+
+        with self._cond:
+            return dict(
+                acquisitions=self.acquisitions,
+                waits=self.waits,
+                timeouts=self.timeouts,
+                rejected=self.rejected,
+                total_wait_time=self.total_wait_time,
+                max_wait_time=self.max_wait_time,
+                last_wait_time=self.last_wait_time,
+                waiting=len(self._queue),
+                in_use=len(self._in_use),
+                size=len(self.config.workspace_nums),
+            )
@@ -0,0 +1,494 @@
+from typing import List, Dict, Optional, Union, Any, Iterable
+from pathlib import Path
+from attrs import define, field
+from filelock import FileLock
+from datetime import datetime
+from contextlib import contextmanager
+import threading
+import time
+import json
+import os
+
+from simple_uam.util.logging import get_logger
+from simple_uam.util.system import is_archive, read_archive_json
+
+log = get_logger(__name__)
+
+_SHARED_INDEXES : Dict[Path,'ResultsIndex'] = dict()
+""" Process wide index objects, see `ResultsIndex.shared`. """
+
+_SHARED_LOCK = threading.Lock()
+""" Guards `_SHARED_INDEXES`. """
+
+def result_summary(metadata : Optional[Dict]) -> Dict[str,Any]:
+    """
+    Picks out the fields of a session's metadata that are kept in the index.
+
+    Arguments:
+      metadata: The metadata written to the result archive's metadata.json.
+    """
+
+    if not metadata:
+        return dict()
+
+    session_info = metadata.get('session_info', dict())
+    message_info = metadata.get('message_info', dict())
+
+    summary = dict(
+        session_name=session_info.get('name'),
+        hostname=session_info.get('hostname'),
+        workspace_num=session_info.get('workspace_num'),
+        start_time=session_info.get('start_time'),
+        end_time=session_info.get('end_time'),
+        actor_name=message_info.get('actor_name'),
+    )
+
+    return {k : v for k, v in summary.items() if v != None}
+
+@define
+class ResultsIndex():
+    """
+    An append-only JSONL index of the archives in a results directory, keyed
+    by archive name, dramatiq message id, and cache key.
+
+    Each line is a single operation, 'add', 'access', 'alias', or 'remove',
+    and the current state is found by replaying them. Readers keep their position in
+    the file and only parse the lines written since their last refresh, so
+    lookups don't have to open any archives. Writers append whole lines under
+    a file lock, which works on shared drives as well.
+
+    Lines for removed archives and old accesses stay in the file until it's
+    compacted, see `needs_compaction`.
+    """
+
+    index_file : Path = field(converter=Path)
+    """ The index file, usually within the results directory. """
+
+    lock_file : Path = field(converter=Path)
+    """ The lockfile guarding writes to the index. """
+
+    _records : Dict[str,Dict] = field(factory=dict, init=False)
+    """ Records for the archives in the index, keyed by archive name. """
+
+    _by_message : Dict[str,str] = field(factory=dict, init=False)
+    """ Map from message id to archive name. """
+
+    _by_key : Dict[str,str] = field(factory=dict, init=False)
+    """ Map from cache key to the newest archive with that key. """
+
+    _aliases : Dict[str,List[str]] = field(factory=dict, init=False)
+    """ Extra message ids answered by each archive, from cache hits. """
+
+    compact_min_lines : int = field(default=1000)
+    """ Never compact an index with fewer lines than this. """
+
+    compact_ratio : float = field(default=0.5)
+    """ Compact once more than this fraction of the lines are superseded. """
+
+    _offset : int = field(default=0, init=False)
+    """ How far into the index file we've read. """
+
+    _lines : int = field(default=0, init=False)
+    """ How many operations we've read from the index file. """
+
+    _file_id : Optional[tuple] = field(default=None, init=False)
+    """ The (device, inode) of the index file when we started reading it. """
+
+    _mutex : threading.RLock = field(factory=threading.RLock, init=False)
+    """ Guards the in-memory state when an index is shared between threads. """
+
+    lock_acquisitions : int = field(default=0, init=False)
+    """ Number of times this object took the index lock. """
+
+    total_lock_wait_time : float = field(default=0.0, init=False)
+    """ Total time, in seconds, spent waiting for the index lock. """
+
+    max_lock_wait_time : float = field(default=0.0, init=False)
+    """ Longest time, in seconds, a single write waited for the index lock. """
+
+    @classmethod
+    def shared(cls,
+               index_file : Union[str,Path],
+               lock_file : Union[str,Path]) -> 'ResultsIndex':
+        """
+        Gets an index object that's shared by the whole process, so that
+        repeated lookups only read the entries added since the last one.
+        """
+
+        index_file = Path(index_file).resolve()
+        with _SHARED_LOCK:
+            index = _SHARED_INDEXES.get(index_file)
+            if index == None:
+                index = cls(index_file=index_file, lock_file=lock_file)
+                _SHARED_INDEXES[index_file] = index
+            return index
+
+    def lock(self) -> FileLock:
+        """
+        Lockfile for writes to the index.
+
+        Note: We provide new locks on every request due to reentrancy issues.
+        """
+        return FileLock(self.lock_file)
+
+    @contextmanager
+    def _locked(self):
+        """
+        Holds the index lock, keeping track of how long it took to get.
+        """
+
+        start = time.monotonic()
+        with self.lock():
+            wait = time.monotonic() - start
+            with self._mutex:
+                self.lock_acquisitions += 1
+                self.total_lock_wait_time += wait
+                self.max_lock_wait_time = max(self.max_lock_wait_time, wait)
+            yield
+
+    @property
+    def stats(self) -> Dict[str,Any]:
+        """
+        Counters for this index, suitable for logging or metrics.
+        """
+        with self._mutex:
+            return dict(
+                lines=self._lines,
+                records=len(self._records),
+                lock_acquisitions=self.lock_acquisitions,
+                total_lock_wait_time=self.total_lock_wait_time,
+                max_lock_wait_time=self.max_lock_wait_time,
+            )
+
+    def _reset(self):
+        self._records = dict()
+        self._by_message = dict()
+        self._by_key = dict()
+        self._aliases = dict()
+        self._offset = 0
+        self._lines = 0
+
+    def _apply(self, entry : Dict):
+        """
+        Applies a single operation from the index to the in-memory state.
+        """
+
+        op = entry.get('op')
+        archive = entry.get('archive')
+
+        if op == 'add':
+            record = {k : v for k, v in entry.items() if k != 'op'}
+            self._records[archive] = record
+            if record.get('message_id'):
+                self._by_message[record['message_id']] = archive
+            if record.get('cache_key'):
+                self._by_key[record['cache_key']] = archive
+
+        elif op == 'access':
+            if archive in self._records:
+                self._records[archive]['accessed'] = entry['accessed']
+
+        elif op == 'alias':
+            if archive in self._records:
+                self._by_message[entry['message_id']] = archive
+                self._aliases.setdefault(archive, list()).append(
+                    entry['message_id'])
+
+        elif op == 'remove':
+            record = self._records.pop(archive, None)
+            if record and record.get('message_id'):
+                self._by_message.pop(record['message_id'], None)
+            if record and self._by_key.get(record.get('cache_key')) == archive:
+                del self._by_key[record['cache_key']]
+            for message_id in self._aliases.pop(archive, list()):
+                self._by_message.pop(message_id, None)
+
+    def refresh(self):
+        """
+        Reads any operations appended to the index since the last refresh.
+        Starts over if the index was compacted or replaced in the meantime.
+        """
+
+        with self._mutex:
+            self._refresh()
+
+    def _refresh(self):
+
+        try:
+            stat = self.index_file.stat()
+        except FileNotFoundError:
+            self._reset()
+            self._file_id = None
+            return
+
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id != self._file_id or stat.st_size < self._offset:
+            self._reset()
+            self._file_id = file_id
+
+        if stat.st_size == self._offset:
+            return
+
+        with self.index_file.open('rb') as fp:
+            fp.seek(self._offset)
+            data = fp.read()
+
+        # Only consume complete lines, a writer might be mid-append.
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            self._lines += 1
+            try:
+                self._apply(json.loads(line))
+            except ValueError:
+                log.warning(
+                    "Skipping malformed results index entry.",
+                    index_file=str(self.index_file),
+                    entry=line[:200],
+                )
+        self._offset += end
+
+    def _append(self, entries : Iterable[Dict]):
+        """
+        Appends operations to the index, holding the lock.
+        """
+
+        data = ''.join(json.dumps(e) + '\n' for e in entries).encode()
+        if not data:
+            return
+
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        with self._locked():
+            with self.index_file.open('ab') as fp:
+                fp.write(data)
+                fp.flush()
+                os.fsync(fp.fileno())
+
+    @staticmethod
+    def make_record(archive : Path,
+                    metadata : Optional[Dict] = None,
+    ) -> Dict[str,Any]:
+        """
+        Creates an index record for an archive that's in the results dir.
+
+        Arguments:
+          archive: The archive in the results dir.
+          metadata: The metadata stored in the archive, if available.
+        """
+
+        stat = archive.stat()
+        message_id = None
+        cache_key = None
+        if metadata:
+            message_id = metadata.get('message_info', dict()).get('message_id')
+            # Failed sessions are never served from the cache.
+            if not metadata.get('exceptions'):
+                cache_key = metadata.get('cache_key')
+
+        return dict(
+            archive=archive.name,
+            message_id=message_id,
+            cache_key=cache_key,
+            size=stat.st_size,
+            created=stat.st_mtime,
+            accessed=stat.st_mtime,
+            summary=result_summary(metadata),
+        )
+
+    def add(self, archive : Path, metadata : Optional[Dict] = None) -> Dict:
+        """
+        Adds an archive to the index.
+
+        Arguments:
+          archive: The archive, which must already be in the results dir.
+          metadata: The metadata stored in the archive, if available.
+
+        Returns:
+          The new record.
+        """
+
+        record = self.make_record(Path(archive), metadata)
+        self._append([dict(op='add', **record)])
+
+        log.info(
+            "Added result to index.",
+            index_file=str(self.index_file),
+            archive=record['archive'],
+            message_id=record['message_id'],
+        )
+
+        return record
+
+    def touch(self, archive : Union[str,Path]):
+        """
+        Records an access of an archive, e.g. when it's served from a cache.
+        """
+
+        self._append([dict(
+            op='access',
+            archive=Path(archive).name,
+            accessed=datetime.now().timestamp(),
+        )])
+
+    def alias(self, archive : Union[str,Path], message_id : str):
+        """
+        Records that a message was answered with an existing archive, e.g.
+        on a cache hit, so that lookups of the message find it. Also counts
+        as an access.
+        """
+
+        archive = Path(archive).name
+        self._append([
+            dict(op='alias', archive=archive, message_id=message_id),
+            dict(
+                op='access',
+                archive=archive,
+                accessed=datetime.now().timestamp(),
+            ),
+        ])
+
+    def remove(self, archives : Iterable[Union[str,Path]]):
+        """
+        Removes archives from the index, doesn't delete the files.
+        """
+
+        self._append(
+            dict(op='remove', archive=Path(a).name) for a in archives
+        )
+
+    def get(self, archive : Union[str,Path]) -> Optional[Dict]:
+        """
+        Gets the record for an archive by name.
+        """
+        with self._mutex:
+            self._refresh()
+            return self._records.get(Path(archive).name)
+
+    def lookup(self, message_id : str) -> Optional[Dict]:
+        """
+        Gets the record of the archive produced by a message.
+        """
+        with self._mutex:
+            self._refresh()
+            archive = self._by_message.get(message_id)
+            if archive == None:
+                return None
+            return self._records.get(archive)
+
+    def lookup_key(self, cache_key : str) -> Optional[Dict]:
+        """
+        Gets the record of the newest archive with a cache key.
+        """
+        with self._mutex:
+            self._refresh()
+            archive = self._by_key.get(cache_key)
+            if archive == None:
+                return None
+            return self._records.get(archive)
+
+    @property
+    def records(self) -> List[Dict]:
+        """
+        All the records currently in the index.
+        """
+        with self._mutex:
+            self._refresh()
+            return list(self._records.values())
+
+    def needs_compaction(self) -> bool:
+        """
+        Whether enough of the index is superseded operations, e.g. accesses
+        and removed archives, that it's worth compacting.
+        """
+
+        with self._mutex:
+            self._refresh()
+            if self._lines < self.compact_min_lines:
+                return False
+            live = len(self._records) + \
+                sum(len(a) for a in self._aliases.values())
+            return self._lines - live > self.compact_ratio * self._lines
+
+    def compact(self):
+        """
+        Rewrites the index with one line per live archive.
+        """
+
+        with self._locked(), self._mutex:
+            self._refresh()
+            tmp_file = self.index_file.with_name(self.index_file.name + '.tmp')
+            with tmp_file.open('w') as fp:
+                for record in self._records.values():
+                    fp.write(json.dumps(dict(op='add', **record)) + '\n')
+                    for message_id in self._aliases.get(record['archive'], []):
+                        fp.write(json.dumps(dict(
+                            op='alias',
+                            archive=record['archive'],
+                            message_id=message_id,
+                        )) + '\n')
+                fp.flush()
+                os.fsync(fp.fileno())
+            os.replace(tmp_file, self.index_file)
+
+        log.info(
+            "Compacted results index.",
+            index_file=str(self.index_file),
+            num_records=len(self._records),
+        )
+
+    def rebuild(self,
+                results_dir : Path,
+                metadata_file : str = "metadata.json",
+                missing_only : bool = False) -> bool:
+        """
+        Rebuilds the index from the archives in a results dir, for results
+        dirs that predate the index or after the index was lost.
+
+        The scan happens under the lock so archives indexed in the meantime
+        aren't lost.
+
+        Arguments:
+          results_dir: The dir to scan.
+          metadata_file: The file in each archive with the session metadata.
+          missing_only: Only rebuild if the index file doesn't exist, e.g.
+            because another process got there first.
+
+        Returns:
+          Whether the index was rebuilt.
+        """
+
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        with self._locked():
+
+            if missing_only and self.index_file.exists():
+                return False
+
+            records = list()
+            for archive in Path(results_dir).iterdir():
+                if not archive.is_file() or not is_archive(archive):
+                    continue
+                try:
+                    metadata = read_archive_json(archive, metadata_file)
+                except Exception as err:
+                    log.warning(
+                        "Could not read result archive, skipping.",
+                        archive=str(archive),
+                        err=str(err),
+                    )
+                    continue
+                records.append(self.make_record(archive, metadata))
+
+            tmp_file = self.index_file.with_name(self.index_file.name + '.tmp')
+            with tmp_file.open('w') as fp:
+                for record in records:
+                    fp.write(json.dumps(dict(op='add', **record)) + '\n')
+            os.replace(tmp_file, self.index_file)
+
+        log.info(
+            "Rebuilt results index.",
+            index_file=str(self.index_file),
+            num_records=len(records),
+        )
+
+        return True
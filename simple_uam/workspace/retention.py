@@ -0,0 +1,174 @@
+from typing import List, Dict, Optional, Any, Iterable
+from pathlib import Path
+from attrs import frozen, field
+from datetime import datetime
+import heapq
+
+from simple_uam.util.config.workspace_config import ResultsConfig
+from simple_uam.util.logging import get_logger
+from simple_uam.util.system import is_archive
+
+log = get_logger(__name__)
+
+def scan_records(results_dir : Path) -> List[Dict[str,Any]]:
+    """
+    Builds index style records for the archives in a results dir by checking
+    each one's file info. Used when there's no results index.
+
+    Arguments:
+      results_dir: The dir to scan.
+    """
+
+    records = list()
+    for archive in Path(results_dir).iterdir():
+        if not archive.is_file() or not is_archive(archive):
+            continue
+        stat = archive.stat()
+
+        # Archive names are '<session name>-<yyyy>-<mm>-<dd>-<uniq>.<ext>'
+        session_name = archive.name.split('.',1)[0].rsplit('-',4)[0]
+
+        records.append(dict(
+            archive=archive.name,
+            message_id=None,
+            size=stat.st_size,
+            created=stat.st_mtime,
+            accessed=max(stat.st_atime, stat.st_mtime),
+            summary=dict(session_name=session_name),
+        ))
+    return records
+
+@frozen
+class RetentionPolicy():
+    """
+    Decides which result archives to delete given a set of limits. Each limit
+    is disabled when negative.
+
+    Archives are considered in least recently used order, and no archive
+    accessed within `min_staletime` seconds is deleted, even if that means
+    going over a limit.
+    """
+
+    max_count : int = field(default=-1)
+    """ The maximum number of archives to keep. """
+
+    max_bytes : int = field(default=-1)
+    """ The maximum total size, in bytes, of the archives to keep. """
+
+    max_age : int = field(default=-1)
+    """ Archives created more than this many seconds ago are deleted. """
+
+    min_staletime : int = field(default=0)
+    """ Archives accessed within this many seconds are never deleted. """
+
+    session_quotas : Dict[str,int] = field(factory=dict)
+    """ Maximum number of archives to keep for each session name. """
+
+    @staticmethod
+    def from_config(config : ResultsConfig) -> 'RetentionPolicy':
+        """
+        Gets the policy described by a results config.
+        """
+
+        return RetentionPolicy(
+            max_count=config.max_count,
+            max_bytes=config.max_bytes,
+            max_age=config.max_age,
+            min_staletime=config.min_staletime,
+            session_quotas=dict(config.session_quotas),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """ Does this policy ever delete anything? """
+        return self.max_count >= 0 \
+            or self.max_bytes >= 0 \
+            or self.max_age >= 0 \
+            or any(q >= 0 for q in self.session_quotas.values())
+
+    def plan(self,
+             records : Iterable[Dict[str,Any]],
+             now : Optional[float] = None,
+             last_access = None,
+    ) -> List[Dict[str,Any]]:
+        """
+        Chooses the archives to delete.
+
+        Arguments:
+          records: Records for all the archives in the results dir, in the
+            format used by `ResultsIndex`.
+          now: The current time as a timestamp, defaults to now.
+          last_access: Optional function from a record to the latest time the
+            archive was accessed. Only called on archives that would be
+            deleted, so it can afford to check the file itself.
+
+        Returns:
+          The records of the archives to delete, each with an added 'reason'.
+        """
+
+        if now == None:
+            now = datetime.now().timestamp()
+
+        victims = list()
+        protected = set()
+
+        def is_stale(record) -> bool:
+            accessed = record.get('accessed', record['created'])
+            if last_access and now - accessed > self.min_staletime:
+                accessed = max(accessed, last_access(record))
+            if now - accessed > self.min_staletime:
+                return True
+            protected.add(record['archive'])
+            return False
+
+        def evict(record, reason):
+            victims.append(dict(record, reason=reason))
+
+        # Least recently used first
+        heap = [
+            (r.get('accessed', r['created']), r['archive'], r)
+            for r in records
+        ]
+        heapq.heapify(heap)
+        remaining = list()
+
+        # Age limit
+        while heap:
+            _, _, record = heapq.heappop(heap)
+            if self.max_age >= 0 and now - record['created'] > self.max_age \
+               and is_stale(record):
+                evict(record, 'max_age')
+            else:
+                remaining.append(record)
+
+        # Per session quotas, `remaining` is in LRU order
+        counts = dict()
+        for record in remaining:
+            name = record.get('summary', dict()).get('session_name')
+            counts[name] = counts.get(name, 0) + 1
+
+        kept = list()
+        for record in remaining:
+            name = record.get('summary', dict()).get('session_name')
+            quota = self.session_quotas.get(name, -1)
+            if quota >= 0 and counts[name] > quota and is_stale(record):
+                counts[name] -= 1
+                evict(record, 'session_quota')
+            else:
+                kept.append(record)
+
+        # Global count and size limits
+        count = len(kept)
+        total = sum(r['size'] for r in kept)
+        for record in kept:
+            over_count = self.max_count >= 0 and count > self.max_count
+            over_bytes = self.max_bytes >= 0 and total > self.max_bytes
+            if not (over_count or over_bytes):
+                break
+            if record['archive'] in protected or not is_stale(record):
+                continue
+            count -= 1
+            total -= record['size']
+            evict(record, 'max_count' if over_count else 'max_bytes')
+
+        return victims
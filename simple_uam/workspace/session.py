@@ -2,7 +2,8 @@
 from typing import List, Tuple, Dict, Optional, Union
 from pathlib import Path
 from simple_uam.util.logging import get_logger
-from simple_uam.util.system import Rsync
+from simple_uam.util.system import Rsync, Clone, Manifest, ArchiveWriter, \
+    archive_files, HOST_INFO
 from attrs import define,field
 from filelock import Timeout, FileLock
 from functools import wraps
@@ -10,12 +11,9 @@ from datetime import datetime
 from copy import deepcopy
 import traceback
 import subprocess
-import platform
 import os
-import uuid
-import socket
-import re
 import json
+import time
 
 log = get_logger(__name__)
 
@@ -23,14 +21,21 @@ def session_op(f):
     """
     Decorator for functions within the workspace that must take place within
     a session and should be added to the log.
+
+    Each call is timed and recorded in the session's `op_log`, see
+    `Session.start_op` and `Session.finish_op`.
     """
 
     @wraps(f)
     def wrapper(self, *args, **kwargs):
         # NOTE : 'self' here is a Session or child.
-        # add start log entry
-        result = f(self, *args, **kwargs)
-        # add end log entry
+        entry = self.start_op(f.__name__)
+        try:
+            result = f(self, *args, **kwargs)
+        except BaseException as err:
+            self.finish_op(entry, err=err)
+            raise
+        self.finish_op(entry, result=result)
         return result
 
     return wrapper
@@ -147,6 +152,39 @@ class Session():
     def _init_exclude_pats_def(self):
         return [".git"]
 
+    reset_strategy : str = field(
+        default='rsync',
+        kw_only=True,
+    )
+    """
+    How the workspace is reset from the reference dir, one of 'rsync',
+    'reflink', or 'hardlink'. See `WorkspaceConfig.reset_strategy`.
+    """
+
+    @reset_strategy.validator
+    def _reset_strategy_valid(self, attr, val):
+        if val != 'rsync' and val not in Clone.modes:
+            raise RuntimeError(f"Unknown workspace reset strategy '{val}'.")
+
+    reset_copy_patterns : List[str] = field(
+        factory=list,
+        kw_only=True,
+    )
+    """
+    Patterns for files that are copied rather than linked with the 'hardlink'
+    reset strategy.
+    """
+
+    @reset_copy_patterns.validator
+    def _reset_copy_patterns_valid(self, attr, val):
+        # Without any copies every file a session writes to in place would
+        # change the reference dir, and every other workspace, as well.
+        if self.reset_strategy == 'hardlink' and not val:
+            raise RuntimeError(
+                "The 'hardlink' reset strategy needs reset_copy_patterns for "
+                "the files sessions modify in place."
+            )
+
     result_exclude_patterns : List[str] = field(
         kw_only=True,
     )
@@ -158,6 +196,37 @@ class Session():
     def _result_exclude_pats_def(self):
         return [".git"]
 
+    change_tracking : str = field(
+        default='manifest',
+        kw_only=True,
+    )
+    """
+    How files changed during the session are found, either 'manifest' or
+    'rsync'. See `WorkspaceConfig.change_tracking`.
+    """
+
+    @change_tracking.validator
+    def _change_tracking_valid(self, attr, val):
+        if val not in ['manifest', 'rsync']:
+            raise RuntimeError(f"Unknown change tracking method '{val}'.")
+
+    result_writer : Optional[ArchiveWriter] = field(
+        default=None,
+        kw_only=True,
+    )
+    """
+    The writer used to create the result archive, an uncompressed zip if None.
+    """
+
+    manifest : Optional[Dict] = field(
+        default=None,
+        init=False,
+    )
+    """
+    Snapshot of the workspace's files taken after the last reset, used to
+    find changed files when change_tracking is 'manifest'.
+    """
+
     old_work_dir : Optional[Path] = field(
         default=None,
         init=False,
@@ -175,6 +244,163 @@ class Session():
     The time when the session object was created/started.
     """
 
+    start_monotonic : float = field(
+        factory=time.monotonic,
+        init=False,
+    )
+    """
+    The monotonic clock when the session object was created, op times are
+    relative to this.
+    """
+
+    op_log : List[Dict] = field(
+        factory=list,
+        init=False,
+    )
+    """
+    A record of every session op, in the order they started, with timings,
+    status, and any exception. Written to `log_file`.
+    """
+
+    _op_depth : int = field(
+        default=0,
+        init=False,
+    )
+    """ How many session ops are currently running, for nested ops. """
+
+    def start_op(self, op : str) -> Dict:
+        """
+        Records the start of a session op, used by `session_op`.
+
+        Arguments:
+          op: The name of the op.
+
+        Returns:
+          The op's log entry, to pass to `finish_op`.
+        """
+
+        entry = dict(
+            op=op,
+            depth=self._op_depth,
+            start_time=datetime.now().isoformat(),
+            start=time.monotonic() - self.start_monotonic,
+            end=None,
+            duration=None,
+            status='running',
+        )
+        self.op_log.append(entry)
+        self._op_depth += 1
+        return entry
+
+    def finish_op(self,
+                  entry : Dict,
+                  result = None,
+                  err = None,
+                  end : Optional[float] = None):
+        """
+        Records the end of a session op, used by `session_op`.
+
+        Arguments:
+          entry: The entry from `start_op`.
+          result: The op's return value, its return code is recorded if it
+            has one.
+          err: The exception the op raised, if any.
+          end: The monotonic time the op ended, defaults to now.
+        """
+
+        if end == None:
+            end = time.monotonic()
+
+        self._op_depth -= 1
+        entry['end'] = end - self.start_monotonic
+        entry['duration'] = entry['end'] - entry['start']
+
+        if err != None:
+            entry['status'] = 'error'
+            entry['exception'] = dict(
+                type=type(err).__name__,
+                value=str(err),
+            )
+        else:
+            entry['status'] = 'ok'
+            returncode = getattr(result, 'returncode', None)
+            if returncode != None:
+                entry['returncode'] = returncode
+                if returncode != 0:
+                    entry['status'] = 'failed'
+
+        log.info(
+            "Finished session op.",
+            workspace=self.number,
+            op=entry['op'],
+            status=entry['status'],
+            duration=entry['duration'],
+        )
+
+    def record_op(self,
+                  op : str,
+                  start : float,
+                  end : float,
+                  start_time : Optional[str] = None,
+                  err = None) -> Dict:
+        """
+        Records an op that ran outside the session, e.g. work done before
+        the session started, so that it shows up in the op log and timings.
+        Ops that ran before the session have a negative start.
+
+        Arguments:
+          op: The name of the op.
+          start: The monotonic time the op started.
+          end: The monotonic time the op ended.
+          start_time: The op's start as an ISO format timestamp.
+          err: The exception the op raised, if any.
+
+        Returns:
+          The op's log entry.
+        """
+
+        entry = dict(
+            op=op,
+            depth=self._op_depth,
+            start_time=start_time,
+            start=start - self.start_monotonic,
+            end=None,
+            duration=None,
+            status='running',
+        )
+
+        # Keep the log in the order ops started.
+        index = len(self.op_log)
+        while index > 0 and self.op_log[index - 1]['start'] > entry['start']:
+            index -= 1
+        self.op_log.insert(index, entry)
+
+        self._op_depth += 1
+        self.finish_op(entry, err=err, end=end)
+        return entry
+
+    def op_timings(self) -> Dict[str,Dict]:
+        """
+        Total time and call count for each top level op, along with their
+        immediate sub-ops, for the session metadata. The full record is in
+        `op_log`.
+        """
+
+        timings = dict()
+        for entry in self.op_log:
+            if entry['depth'] > 1 or entry['duration'] == None:
+                continue
+            timing = timings.setdefault(entry['op'], dict(
+                calls=0,
+                duration=0.0,
+                status='ok',
+            ))
+            timing['calls'] += 1
+            timing['duration'] += entry['duration']
+            if entry['status'] != 'ok':
+                timing['status'] = entry['status']
+        return timings
+
     def log_exception(self, *excs, exc_type=None, exc_val=None, exc_tb=None):
         """
         Adds the provided exception to the metadata of this session.
@@ -206,9 +432,9 @@ class Session():
 
         if len(excs) > 0:
             current = dict(
-                type=type(exc),
-                val=exc,
-                tb=exc.__traceback__,
+                type=type(excs[0]),
+                val=excs[0],
+                tb=excs[0].__traceback__,
             )
         elif exc_type or exc_val or exc_tb:
             current = dict(
@@ -226,7 +452,7 @@ class Session():
                 current = dict(
                     type=type(next),
                     val=next,
-                    tb=next,
+                    tb=next.__traceback__,
                 )
             else:
                 current = None
@@ -245,7 +471,7 @@ class Session():
                     exception['type'],
                     exception['val'],
                 ),
-                stack = traceback.format_stack(exception['tb']),
+                stack = traceback.format_tb(exception['tb']),
             ))
 
         ### Add to Metadata ###
@@ -287,15 +513,37 @@ class Session():
                         verbose : bool = False,
                         quiet : bool = False):
         """
-        Resets the workspace from the reference_workspace, using rsync to
-        ensure the files are in an identical state.
+        Resets the workspace from the reference_workspace, using the
+        configured reset strategy to ensure the files are in an identical
+        state.
 
         Arguments:
-           progress: show a progress bar.
-           verbose: rsync verbose output.
-           quiet: perform the copy silently.
+           progress: show a progress bar. (rsync only)
+           verbose: rsync verbose output. (rsync only)
+           quiet: perform the copy silently. (rsync only)
         """
 
+        if self.reset_strategy != 'rsync':
+
+            clone_args = dict(
+                src=self.reference_dir,
+                dst=self.work_dir,
+                mode=self.reset_strategy,
+                exclude=self.init_exclude_patterns,
+                copy_patterns=self.reset_copy_patterns,
+                delete=True,
+            )
+
+            log.info(
+                "Resetting workspace in-process.",
+                workspace=self.number,
+                **clone_args,
+            )
+
+            Clone.copy_dir(**clone_args)
+            self.snapshot_workspace()
+            return
+
         rsync_args = dict(
             src=self.reference_dir,
             dst=self.work_dir,
@@ -314,6 +562,27 @@ class Session():
         )
 
         Rsync.copy_dir(**rsync_args)
+        self.snapshot_workspace()
+
+    def snapshot_workspace(self):
+        """
+        Records the state of the freshly reset workspace, if using manifest
+        based change tracking.
+        """
+
+        if self.change_tracking != 'manifest':
+            return
+
+        self.manifest = Manifest.snapshot(
+            self.work_dir,
+            exclude=self.result_exclude_patterns,
+        )
+
+        log.info(
+            "Took snapshot of workspace.",
+            workspace=self.number,
+            num_files=len(self.manifest),
+        )
 
     @session_op
     def enter_workdir(self):
@@ -370,14 +639,7 @@ class Session():
         info['reference_dir'] = str(self.reference_dir)
         info['workspace_num'] = self.number
         info['workspace'] = str(self.work_dir)
-        info['platform']= platform.system()
-        info['platform_release']=platform.release()
-        info['platform_version']=platform.version()
-        info['architecture']=platform.machine()
-        info['hostname']=socket.gethostname()
-        info['ip_address']=socket.gethostbyname(socket.gethostname())
-        info['mac_address']=':'.join(re.findall('..', '%012x' % uuid.getnode()))
-        info['processor']=platform.processor()
+        info.update(HOST_INFO.get())
 
         return info
 
@@ -388,6 +650,7 @@ class Session():
         """
 
         self.metadata['session_info'] = self.session_info()
+        self.metadata['op_timings'] = self.op_timings()
 
         meta_path = self.work_dir / self.metadata_file
 
@@ -400,6 +663,31 @@ class Session():
         with meta_path.open('w') as out_file:
             json.dump(self.metadata, out_file, indent="  ")
 
+        self.write_log()
+
+    def write_log(self):
+        """
+        Writes the session op log to a file in the working directory. Ops
+        still running, like the `write_metadata` call that writes this, show
+        up with a 'running' status.
+        """
+
+        log_path = self.work_dir / self.log_file
+
+        log.info(
+            "Writing session log to file.",
+            log_file=str(log_path),
+            num_ops=len(self.op_log),
+        )
+
+        with log_path.open('w') as out_file:
+            json.dump(dict(
+                name=self.name,
+                workspace_num=self.number,
+                start_time=self.start_time.isoformat(),
+                ops=self.op_log,
+            ), out_file, indent="  ")
+
     @session_op
     def generate_result_archive(self):
         """
@@ -407,6 +695,27 @@ class Session():
         is.
         """
 
+        if self.change_tracking == 'manifest' and self.manifest != None:
+
+            log.info(
+                "Generating result archive for session from manifest.",
+                workspace=self.number,
+                out=str(self.result_archive),
+            )
+
+            changes = Manifest.list_changes(
+                self.work_dir,
+                self.manifest,
+                exclude=self.result_exclude_patterns,
+            )
+            archive_files(
+                self.work_dir,
+                changes,
+                self.result_archive,
+                writer=self.result_writer,
+            )
+            return
+
         rsync_args = dict(
             ref=str(self.reference_dir),
             src=str(self.work_dir),
@@ -420,7 +729,7 @@ class Session():
             **rsync_args,
         )
 
-        Rsync.archive_changes(**rsync_args)
+        Rsync.archive_changes(**rsync_args, writer=self.result_writer)
 
     @session_op
     def validate_complete(self):
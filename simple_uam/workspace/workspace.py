@@ -4,14 +4,12 @@ from attrs import define,field,converters, setters
 from filelock import Timeout, FileLock
 from functools import wraps
 from copy import deepcopy
-import tempfile
-import random
-import string
 import subprocess
 
 from simple_uam.util.logging import get_logger
 from simple_uam.util.invoke import task
 from simple_uam.util.config.workspace_config import WorkspaceConfig
+from simple_uam.util.system import Manifest
 
 from .manager import WorkspaceManager
 from .session import Session
@@ -72,6 +70,15 @@ class Workspace():
     def _config_def(self):
         return self.manager.config
 
+    wait_timeout : Optional[float] = field(
+        default=-1,
+        kw_only=True,
+    )
+    """
+    Seconds to wait for a free workspace before failing, None waits
+    indefinitely and negative uses the config's `workspace_wait_timeout`.
+    """
+
     session_class : Type[Session] = field(
         default=Session,
         kw_only=True,
@@ -105,15 +112,71 @@ class Workspace():
     """ The FileLock for the current workspace. """
 
 
-    active_temp_dir : Optional[tempfile.TemporaryDirectory] = field(
+    active_result : Optional[Path] = field(
         default=None,
         init=False,
     )
     """
-    The temporary directory the result archive is written to before it's
-    moved into the results directory.
+    The final location of the result archive in the results directory. The
+    archive is streamed to a '.partial' file next to it and renamed once
+    complete.
     """
 
+    def make_session(self,
+                     number : int,
+                     result_archive : Path,
+                     metadata : Dict) -> Session:
+        """
+        Creates a session object for a workspace, using the current config.
+
+        Arguments:
+          number: The workspace number.
+          result_archive: Where the session should write its result archive.
+          metadata: The session's initial metadata.
+        """
+
+        return self.session_class(
+            reference_dir=self.config.reference_path,
+            number=number,
+            work_dir=self.config.workspace_path(number),
+            init_exclude_patterns=self.config.exclude,
+            reset_strategy=self.config.reset_strategy,
+            reset_copy_patterns=self.config.reset_copy_patterns,
+            change_tracking=self.config.change_tracking,
+            result_exclude_patterns=self.config.result_exclude,
+            result_archive=result_archive,
+            result_writer=self.manager.result_writer,
+            metadata=metadata,
+            name=self.name,
+            metadata_file=Path(self.config.results.metadata_file),
+            log_file=Path(self.config.results.log_file),
+        )
+
+    def background_reset(self, number : int) -> Dict:
+        """
+        Resets a workspace outside of a session, for the manager's
+        background housekeeping. The caller must hold the workspace's lock.
+
+        Returns:
+          A snapshot of the freshly reset workspace.
+        """
+
+        session = self.make_session(
+            number,
+            # Never written, a reset doesn't produce a result.
+            result_archive=self.config.locks_path / "background-reset.zip",
+            metadata=dict(),
+        )
+        session.reset_workspace(progress=False, quiet=True)
+
+        if session.manifest != None:
+            return session.manifest
+
+        return Manifest.snapshot(
+            session.work_dir,
+            exclude=self.config.result_exclude,
+        )
+
     def start(self) -> Session:
         """
         Starts the session, meant to be used in a try-finally style.
@@ -139,52 +202,62 @@ class Workspace():
             raise RuntimeError(
                 "Workspace currently in session, can't start a new one.")
 
-        # Get lock if possible, fail otherwise.
-        lock_tuple = self.manager.acquire_workspace_lock(self.number)
-        if lock_tuple == None:
-            raise RuntimeError("Could not acquire Workspace lock.")
+        # Wait for a free workspace, fail if it takes too long.
+        timeout = self.wait_timeout
+        if timeout != None and timeout < 0:
+            timeout = self.config.workspace_wait_timeout
+        lock_tuple = self.manager.workspace_pool.acquire(
+            self.number,
+            timeout=timeout,
+        )
         try:
             # mark session_start
             self.active_workspace = lock_tuple[0]
             self.active_lock = lock_tuple[1]
 
-            # create temp_dir & temp_results dir name
-            self.active_temp_dir = tempfile.TemporaryDirectory()
-            uniq_str = ''.join(random.choices(
-                string.ascii_lowercase + string.digits, k=10))
-            temp_archive = Path(self.active_temp_dir.name) / f"{self.name}-{uniq_str}.zip"
+            # Pick the result location, the archive is written in place
+            self.active_result = self.manager.result_path(self.name)
+            partial_archive = self.manager.partial_result_path(self.active_result)
 
             # setup metadata (more stuff can go here I guess)
             metadata = deepcopy(self.metadata)
+            metadata['result_archive'] = self.active_result.name
 
             # create active session
-            self.active_session = self.session_class(
-                reference_dir=self.config.reference_path,
-                number=self.active_workspace,
-                work_dir=self.config.workspace_path(self.active_workspace),
-                init_exclude_patterns=self.config.exclude,
-                result_exclude_patterns=self.config.result_exclude,
-                result_archive=temp_archive,
+            self.active_session = self.make_session(
+                self.active_workspace,
+                result_archive=partial_archive,
                 metadata=metadata,
-                name=self.name,
-                metadata_file=Path(self.config.results.metadata_file),
             )
-            self.active_session.reset_workspace(
-                progress=True,
+
+            # Skip the reset if it was done in the background and the
+            # workspace hasn't been touched since.
+            manifest = self.manager.take_clean_marker(
+                self.active_workspace,
+                exclude=self.config.result_exclude,
             )
+            if manifest != None:
+                log.info(
+                    "Workspace already reset, skipping reset.",
+                    workspace=self.active_workspace,
+                )
+                if self.config.change_tracking == 'manifest':
+                    self.active_session.manifest = manifest
+            else:
+                self.active_session.reset_workspace(
+                    progress=True,
+                )
 
         except Exception:
             # Perform Cleanup
-            if self.active_temp_dir:
-                self.active_temp_dir.cleanup()
             if lock_tuple:
-                lock_tuple[1].release()
+                self.manager.workspace_pool.release(*lock_tuple)
 
             # Reset Internal State
             self.active_session = None
             self.active_workspace = None
             self.active_lock = None
-            self.active_temp_dir = None
+            self.active_result = None
 
             # Re-raise exception
             raise
@@ -205,27 +278,63 @@ class Workspace():
                 self.active_session.write_metadata()
                 self.active_session.generate_result_archive()
 
-                # Move it to the manager's results directory
+                # The archive can't contain its own timing, so only the
+                # metadata returned to the caller has it.
+                self.active_session.metadata['op_timings'] = \
+                    self.active_session.op_timings()
+
+                # Rename it to its final name in the results directory
                 self.active_session.result_archive = self.manager.add_result(
                     archive=self.active_session.result_archive,
                     prefix=self.name,
                     copy=False,
+                    out_path=self.active_result,
+                    metadata=self.active_session.metadata,
                 )
 
+                # Keep the results dir within its limits, this session's
+                # result is already stored so failures here aren't fatal.
+                if self.config.results.prune_on_finish:
+                    try:
+                        self.manager.prune_results()
+                    except Exception as err:
+                        log.exception(
+                            "Could not prune results dir.",
+                            err=err,
+                        )
+
             # Ensure we can close session
             self.active_session.validate_complete()
 
         finally:
 
             # release lock
-            self.active_lock.release()
-            self.active_temp_dir.cleanup()
+            self.manager.workspace_pool.release(
+                self.active_workspace,
+                self.active_lock,
+            )
+
+            # Clean up any incomplete archive
+            partial_archive = self.manager.partial_result_path(self.active_result)
+            partial_archive.unlink(missing_ok=True)
+
+            # Get the workspace ready for the next session while it's idle
+            if self.config.background_reset:
+                self.manager.schedule_reset(
+                    self.active_workspace,
+                    self.background_reset,
+                )
+            if self.config.background_reset_interval > 0:
+                self.manager.start_housekeeping(
+                    self.background_reset,
+                    self.config.background_reset_interval,
+                )
 
             # reset workspace state
             self.active_session = None
             self.active_workspace = None
             self.active_lock = None
-            self.active_temp_dir = None
+            self.active_result = None
 
     def __enter__(self):
         """
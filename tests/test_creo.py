@@ -0,0 +1,159 @@
+"""
+Tests for reusing and restarting the shared Creo server, against a stub TCP
+server standing in for creoson.
+"""
+
+import socketserver
+import threading
+import time
+
+import pytest
+
+from simple_uam.direct2cad.creo import CreoServer
+
+class ReusableTCPServer(socketserver.TCPServer):
+    # Tests restart the stub on the port it just closed.
+    allow_reuse_address = True
+
+class StubCreoson():
+    """ Accepts connections on a local port, like a healthy creoson. """
+
+    def __init__(self, port=0):
+        self.server = ReusableTCPServer(
+            ('127.0.0.1', port),
+            socketserver.BaseRequestHandler,
+        )
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(
+            target=self.server.serve_forever,
+            daemon=True,
+        )
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def creoson():
+    stub = StubCreoson()
+    yield stub
+    stub.close()
+
+def make_server(port, tmp_path, **kwargs):
+    return CreoServer(
+        host='127.0.0.1',
+        port=port,
+        probe='tcp',
+        connect_timeout=0.5,
+        ready_timeout=5.0,
+        poll_interval=0.05,
+        lock_dir=tmp_path / 'locks',
+        **kwargs,
+    )
+
+def test_reuses_healthy_server(creoson, tmp_path):
+    server = make_server(creoson.port, tmp_path)
+    starts = list()
+
+    for _ in range(3):
+        job = server.start_job(lambda: starts.append(1))
+        server.finish_job(job)
+
+    assert starts == []
+    assert server.stats['reuses'] == 3
+    assert server.stats['active'] == 0
+    assert list((tmp_path / 'locks' / 'jobs').glob('*.lock')) == []
+
+def test_starts_server_when_down(tmp_path):
+    stubs = list()
+    probe = StubCreoson()
+    port = probe.port
+    probe.close()
+
+    server = make_server(port, tmp_path)
+    job = server.start_job(lambda: stubs.append(StubCreoson(port)))
+    server.finish_job(job)
+
+    try:
+        assert len(stubs) == 1
+        assert server.stats['starts'] == 1
+    finally:
+        for stub in stubs:
+            stub.close()
+
+def test_failed_job_on_healthy_server_does_not_restart(creoson, tmp_path):
+    server = make_server(creoson.port, tmp_path)
+
+    job = server.start_job(lambda: None)
+    server.finish_job(job, failed=True)
+
+    assert not server.stats['needs_restart']
+
+def test_failed_job_on_dead_server_restarts(tmp_path):
+    stub = StubCreoson()
+    port = stub.port
+    server = make_server(port, tmp_path)
+
+    job = server.start_job(lambda: None)
+    stub.close()
+    server.finish_job(job, failed=True)
+    assert server.stats['needs_restart']
+
+    stubs = list()
+    job = server.start_job(lambda: stubs.append(StubCreoson(port)))
+    server.finish_job(job)
+
+    try:
+        assert len(stubs) == 1
+        assert not server.stats['needs_restart']
+    finally:
+        for stub in stubs:
+            stub.close()
+
+def test_restart_waits_for_running_jobs(creoson, tmp_path):
+    server = make_server(creoson.port, tmp_path)
+    events = list()
+
+    first = server.start_job(lambda: None)
+    server.needs_restart = True
+
+    def second():
+        job = server.start_job(lambda: events.append('restarted'))
+        server.finish_job(job)
+
+    thread = threading.Thread(target=second)
+    thread.start()
+
+    time.sleep(0.3)
+    assert events == []
+
+    events.append('first finished')
+    server.finish_job(first)
+    thread.join(5.0)
+
+    assert events == ['first finished', 'restarted']
+
+def test_restart_waits_for_jobs_in_other_processes(creoson, tmp_path):
+    # A second handle stands in for another worker process on the host.
+    other = make_server(creoson.port, tmp_path)
+    server = make_server(creoson.port, tmp_path, restart_after=0)
+    events = list()
+
+    other_job = other.start_job(lambda: None)
+
+    def restart():
+        job = server.start_job(lambda: events.append('restarted'))
+        server.finish_job(job)
+
+    thread = threading.Thread(target=restart)
+    thread.start()
+
+    time.sleep(0.3)
+    assert events == []
+
+    events.append('other finished')
+    other.finish_job(other_job)
+    thread.join(5.0)
+
+    assert events == ['other finished', 'restarted']